@@ -1,3 +1,5 @@
+import importlib
+import threading
 from abc import ABC, abstractmethod 
 
 class BaseAgent(ABC): 
@@ -6,4 +8,36 @@ class BaseAgent(ABC):
     @abstractmethod 
     def describe(self) -> str: 
         """Return a description of the agent.""" 
-        pass
\ No newline at end of file
+        pass
+
+class LazyAgent:
+    """
+    Module-level stand-in for an agent, given as "package.module:Class". The
+    module is imported and the agent built on first attribute access, so
+    importing the router costs nothing for agents a process never calls.
+    """
+
+    def __init__(self, target: str):
+        self._target = target
+        self._agent = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._agent is not None
+
+    def get(self):
+        agent = self._agent
+        if agent is None:
+            with self._lock:
+                if self._agent is None:
+                    module_name, _, class_name = self._target.partition(":")
+                    self._agent = getattr(importlib.import_module(module_name), class_name)()
+                agent = self._agent
+        return agent
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        return f"LazyAgent({self._target!r}, loaded={self.loaded})"
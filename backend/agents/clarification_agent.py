@@ -0,0 +1,104 @@
+import re
+from typing import Optional
+
+from backend.agents.base_agent import BaseAgent
+from backend.config import settings
+from backend.models.intent import IntentResult
+
+# A reply to a pending confirmation only counts as yes/no when that is all it
+# says, give or take punctuation and polite words ("Yes, please!", "no thanks").
+# Anything longer ("ok but first...", "y'all there?") gets the question again.
+_POLITE = r"please|thanks|thank you|thx|ty"
+_AFFIRMATIVE = r"yes|yep|yeah|yup|y|sure|ok|okay|confirm|confirmed|go ahead|do it|please do|proceed|approve|approved"
+_NEGATIVE = r"no|nope|nah|n|cancel|stop|don't|dont|do not|never mind|nevermind|not now"
+
+def _short_reply_re(terms: str) -> re.Pattern:
+    word = f"(?:{terms}|{_POLITE})"
+    return re.compile(f"(?:{_POLITE} )*(?:{terms})(?: {word})*")
+
+AFFIRMATIVE_RE = _short_reply_re(_AFFIRMATIVE)
+NEGATIVE_RE = _short_reply_re(_NEGATIVE)
+# Phrasings that lean on the previous turn ("what about next month?", "and my manager's?")
+FOLLOW_UP_RE = re.compile(r"^\s*((what|how) about|and|also|same|again)\b|\b(it|that|this|instead)\b", re.I)
+
+QUESTIONS = {
+    "it": "Could you tell me a bit more? Is this about signing in to your account, a device, or network access?",
+    "hr": "Could you tell me a bit more? Is this about your PTO balance, payroll, or something else?",
+}
+DEFAULT_QUESTION = (
+    "Could you tell me a bit more about what you need? For example: trouble signing in, "
+    "your PTO balance, or something else."
+)
+
+def _normalize_reply(message: str) -> str:
+    # Lowercase, punctuation to spaces (apostrophes kept for "don't"), single-spaced
+    return " ".join(re.sub(r"[^a-z0-9']+", " ", message.lower().replace("\u2019", "'")).split())
+
+class Turn(dict):
+    """How a message relates to the session it arrives in."""
+
+    @property
+    def kind(self) -> str:
+        # confirm | decline | reask | answer | follow_up
+        return self["kind"]
+
+class ClarificationAgent(BaseAgent):
+    name = "clarification"
+
+    def describe(self) -> str:
+        return "Resolves follow-ups against the conversation session and asks clarifying questions."
+
+    def interpret(self, message: str, session: Optional[dict], local_intent: Optional[IntentResult]) -> Optional[Turn]:
+        """
+        Classify a message against the previous turn without an LLM call.
+        Returns None when the message should go through the full pipeline.
+        """
+        if not session:
+            return None
+
+        pending = session.get("pending_confirmation")
+        if pending:
+            reply = _normalize_reply(message)
+            if AFFIRMATIVE_RE.fullmatch(reply):
+                return Turn(kind="confirm", runbooks=pending)
+            if NEGATIVE_RE.fullmatch(reply):
+                return Turn(kind="decline", runbooks=pending)
+            # Neither a clear yes nor a clear no: never guess with a held runbook
+            return Turn(kind="reask", runbooks=pending)
+
+        question = session.get("pending_question")
+        if question:
+            # Triage the original request together with the answer
+            return Turn(kind="answer", message=f"{question['message']}. {message}")
+
+        last_intent = session.get("intent")
+        if (
+            local_intent is None
+            and last_intent
+            and last_intent.get("intent") != "unknown"
+            and len(message.split()) <= settings.SESSION_FOLLOW_UP_MAX_WORDS
+            and FOLLOW_UP_RE.search(message)
+        ):
+            return Turn(kind="follow_up", intent=last_intent["intent"])
+        return None
+
+    def follow_up_intent(self, session: dict, message: str) -> IntentResult:
+        return IntentResult(**{**session["intent"], "raw_message": message})
+
+    def needs_clarification(self, intent: IntentResult, session: Optional[dict], turn: Optional[Turn]) -> bool:
+        # Only worth asking when the answer can be remembered, and only once per request
+        if session is None or (turn is not None and turn.kind == "answer"):
+            return False
+        return intent.intent == "unknown" or intent.confidence < settings.CLARIFICATION_MIN_CONFIDENCE
+
+    def question(self, intent: IntentResult) -> str:
+        return QUESTIONS.get(intent.domain, DEFAULT_QUESTION)
+
+    def reask_reply(self, turn: Turn) -> str:
+        return (
+            f"Before anything else: should I run {', '.join(turn['runbooks'])}? "
+            "Please reply \"yes\" to go ahead or \"no\" to cancel."
+        )
+
+    def decline_reply(self, turn: Turn) -> str:
+        return f"OK, I won't run {', '.join(turn['runbooks'])}. Let me know if you need anything else."
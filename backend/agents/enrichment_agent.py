@@ -1,6 +1,6 @@
 from backend.agents.base_agent import BaseAgent
 from backend.models.intent import IntentResult
-from backend.services.directory_service import get_user_profile
+from backend.services.profile_cache import get_cached_user_profile, get_cached_user_profile_async
 
 class EnrichmentAgent(BaseAgent):
     name = "enrichment"
@@ -9,7 +9,14 @@ class EnrichmentAgent(BaseAgent):
         return "Enriches intent with user profile and context."
 
     def enrich(self, user_id: str, intent: IntentResult) -> dict:
-        profile = get_user_profile(user_id)
+        profile = get_cached_user_profile(user_id)
+        return {
+            "user": profile,
+            "intent": intent.dict(),
+        }
+
+    async def enrich_async(self, user_id: str, intent: IntentResult) -> dict:
+        profile = await get_cached_user_profile_async(user_id)
         return {
             "user": profile,
             "intent": intent.dict(),
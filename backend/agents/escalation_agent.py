@@ -1,5 +1,5 @@
 from backend.agents.base_agent import BaseAgent 
-from backend.services.ticketing_service import create_ticket 
+from backend.services.ticketing_service import file_ticket, file_ticket_async
 
 class EscalationAgent(BaseAgent): 
     name = "escalation" 
@@ -8,11 +8,25 @@ class EscalationAgent(BaseAgent):
         return "Create tickets and hands off to human agents." 
     
     def create_ticket(self, user_id: str, message: str, context: dict, plan) -> dict: 
+        summary, details = self._build_ticket(user_id, message, context, plan)
+        # A repeat of a request that already has an open ticket is attached to it
+        filed = file_ticket(summary, details, user_id, self._intent(context), message)
+        return {**filed, "summary": summary}
+
+    async def create_ticket_async(self, user_id: str, message: str, context: dict, plan) -> dict:
+        summary, details = self._build_ticket(user_id, message, context, plan)
+        filed = await file_ticket_async(summary, details, user_id, self._intent(context), message)
+        return {**filed, "summary": summary}
+
+    def _intent(self, context: dict):
+        intent = context.get("intent")
+        return intent.get("intent") if isinstance(intent, dict) else None
+
+    def _build_ticket(self, user_id: str, message: str, context: dict, plan) -> tuple:
         summary = f"User {user_id} requested help: {message}"
         details = {
             "user": context.get("user"), 
             "intent": context.get("intent"),
             "plan": plan.dict() if hasattr(plan, "dict") else plan,
         }
-        ticket_id = create_ticket(summary, details) 
-        return {"ticket_id": ticket_id, "summary": summary}
\ No newline at end of file
+        return summary, details
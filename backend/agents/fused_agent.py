@@ -0,0 +1,95 @@
+from backend.agents.base_agent import BaseAgent
+from backend.models.intent import IntentClassification, IntentResult
+from backend.models.plan import PlanResult
+from backend.services.profile_cache import get_cached_user_profile, get_cached_user_profile_async
+from backend.config import settings
+from backend.utils.llm_client import call_llm, call_llm_async
+from backend.utils.prompt_builder import build_context_prompt
+from backend.utils.structured_output import parse_output, response_format_for
+from pydantic import BaseModel
+from typing import Optional, Tuple
+
+FUSED_SYSTEM_PROMPT = """
+You are the triage and planning agent for an internal service desk.
+
+You receive a JSON object with the user's profile and message. In one answer:
+
+1) Classify the message:
+- intent: a short snake_case label like account_access_issue, pto_balance,
+  hr_policy_question, device_issue, payroll_question, unknown
+- domain: one of "it", "hr", "finance", "facilities", "general"
+- urgency: one of "low", "normal", "high"
+- confidence: 0.0 to 1.0
+
+2) Decide which runbooks (automations) to call.
+
+Available runbooks (ids):
+- check_account_status(user_id)
+- reset_password(user_id, reason)
+- lookup_pto_balance(user_id)
+
+Rules:
+- For account_access_issue in IT:
+  - Always start with check_account_status.
+  - If account is locked or user clearly can't log in, consider reset_password.
+- For pto_balance in HR:
+  - Use lookup_pto_balance.
+- Otherwise return no actions.
+
+Output ONLY valid JSON in this format:
+{
+  "intent": {"intent": "...", "domain": "...", "urgency": "...", "confidence": 0.0},
+  "plan": {
+    "requires_human_approval": false,
+    "actions": [
+      {"runbook_id": "check_account_status", "inputs": {"user_id": "abc"}}
+    ]
+  }
+}
+"""
+
+class FusedOutput(BaseModel):
+    intent: IntentClassification
+    plan: PlanResult
+
+# Highest priority first; see PLANNER_CONTEXT_FIELDS
+FUSED_CONTEXT_FIELDS = ["user.id", "message", "user.role", "user.department", "user.location"]
+FUSED_REQUIRED_FIELDS = {"user.id", "message"}
+
+class FusedTriagePlannerAgent(BaseAgent):
+    name = "fused_triage_planner"
+
+    def describe(self) -> str:
+        return "Classifies intent and plans runbooks in a single LLM call."
+
+    def infer_and_plan(self, user_id: str, message: str) -> Optional[Tuple[IntentResult, PlanResult]]:
+        """
+        Return (intent, plan), or None if the response fails validation and the
+        caller should fall back to the two-stage triage -> planning path.
+        """
+        profile = get_cached_user_profile(user_id)
+        raw = call_llm(FUSED_SYSTEM_PROMPT, self._build_prompt(profile, message),
+                       response_format=response_format_for(FusedOutput, strict=False))
+        return self._parse(user_id, message, raw)
+
+    async def infer_and_plan_async(self, user_id: str, message: str) -> Optional[Tuple[IntentResult, PlanResult]]:
+        profile = await get_cached_user_profile_async(user_id)
+        raw = await call_llm_async(FUSED_SYSTEM_PROMPT, self._build_prompt(profile, message),
+                                   response_format=response_format_for(FusedOutput, strict=False))
+        return self._parse(user_id, message, raw)
+
+    def _build_prompt(self, profile: dict, message: str) -> str:
+        return build_context_prompt(
+            "fused",
+            FUSED_SYSTEM_PROMPT,
+            {"user": profile, "message": message},
+            FUSED_CONTEXT_FIELDS,
+            settings.LLM_PROMPT_TOKEN_BUDGET,
+            required=FUSED_REQUIRED_FIELDS,
+        ).text
+
+    def _parse(self, user_id: str, message: str, raw: str) -> Optional[Tuple[IntentResult, PlanResult]]:
+        parsed = parse_output(FusedOutput, raw, self.name)
+        if parsed is None or not parsed.intent.intent:
+            return None
+        return parsed.intent.to_result(user_id, message), parsed.plan
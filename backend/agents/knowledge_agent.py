@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+from backend.agents.base_agent import BaseAgent
+from backend.config import settings
+from backend.models.intent import IntentResult
+from backend.utils.llm_client import call_llm, call_llm_async
+from backend.utils.llm_resilience import LLMUnavailableError
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+KNOWLEDGE_SYSTEM_PROMPT = """
+You answer employee policy questions for an internal service desk.
+
+Use ONLY the numbered excerpts you are given. Cite every statement with the
+excerpt number in square brackets, e.g. [1]. Keep the answer under 120 words.
+If the excerpts do not answer the question, reply with exactly: NOT_FOUND
+"""
+NOT_FOUND = "NOT_FOUND"
+# Characters of the best excerpt quoted when answering without the LLM
+EXTRACT_CHARS = 400
+
+class KnowledgeAgent(BaseAgent):
+    name = "knowledge"
+
+    def __init__(self):
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._next_sync = 0.0
+
+    def describe(self) -> str:
+        return "Answers policy questions from the local knowledge base, with citations."
+
+    def handles(self, intent: IntentResult) -> bool:
+        return settings.KNOWLEDGE_ENABLED and intent.intent in settings.KNOWLEDGE_INTENTS
+
+    def index(self):
+        """The knowledge index, built on first use and re-synced with the docs periodically."""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    # numpy and the index files are only needed once a policy question arrives
+                    from backend.services.knowledge_index import KnowledgeIndex
+
+                    index = KnowledgeIndex.from_settings()
+                    index.sync(settings.KNOWLEDGE_DOCS_DIR)
+                    self._next_sync = time.monotonic() + settings.KNOWLEDGE_RESYNC_SECONDS
+                    self._index = index
+        elif settings.KNOWLEDGE_RESYNC_SECONDS > 0 and time.monotonic() >= self._next_sync:
+            # Whoever gets the lock re-syncs; everyone else searches the current index
+            if self._sync_lock.acquire(blocking=False):
+                try:
+                    self._next_sync = time.monotonic() + settings.KNOWLEDGE_RESYNC_SECONDS
+                    self._index.sync(settings.KNOWLEDGE_DOCS_DIR)
+                except (OSError, ValueError) as e:
+                    logger.error("Knowledge index sync failed, keeping current index: %s", e)
+                finally:
+                    self._sync_lock.release()
+        return self._index
+
+    def retrieve(self, question: str) -> List[dict]:
+        hits = self.index().search(question, settings.KNOWLEDGE_TOP_K)
+        return [hit for hit in hits if hit["score"] >= settings.KNOWLEDGE_MIN_SCORE]
+
+    def answer(self, intent: IntentResult) -> Optional[dict]:
+        """{"answer", "citations"} for the question, or None when the documents don't cover it."""
+        hits = self.retrieve(intent.raw_message)
+        if not hits:
+            return None
+        text = None
+        if settings.KNOWLEDGE_LLM_ANSWERS:
+            try:
+                text = call_llm(KNOWLEDGE_SYSTEM_PROMPT, self._build_prompt(intent.raw_message, hits))
+            except LLMUnavailableError as e:
+                logger.warning("Knowledge answer falling back to excerpt: %s", e)
+        return self._result(text, hits)
+
+    def answer_locally(self, intent: IntentResult) -> Optional[dict]:
+        """answer() without the LLM: quotes the best excerpt (used when shedding load)."""
+        hits = self.retrieve(intent.raw_message)
+        return self._result(None, hits) if hits else None
+
+    async def answer_async(self, intent: IntentResult) -> Optional[dict]:
+        # Index sync and embedding are CPU/disk work; keep them off the event loop
+        hits = await asyncio.to_thread(self.retrieve, intent.raw_message)
+        if not hits:
+            return None
+        text = None
+        if settings.KNOWLEDGE_LLM_ANSWERS:
+            try:
+                text = await call_llm_async(KNOWLEDGE_SYSTEM_PROMPT, self._build_prompt(intent.raw_message, hits))
+            except LLMUnavailableError as e:
+                logger.warning("Knowledge answer falling back to excerpt: %s", e)
+        return self._result(text, hits)
+
+    def format_reply(self, result: dict) -> str:
+        sources = "\n".join(
+            f"[{c['ref']}] {c['title']} - {c['section']} ({c['source']})" for c in result["citations"]
+        )
+        return f"{result['answer']}\n\nSources:\n{sources}"
+
+    def _build_prompt(self, question: str, hits: List[dict]) -> str:
+        excerpts = "\n\n".join(
+            f"[{i}] {hit['title']} - {hit['section']}\n{hit['text']}" for i, hit in enumerate(hits, start=1)
+        )
+        return f"Question: {question}\n\nExcerpts:\n{excerpts}"
+
+    def _result(self, text: Optional[str], hits: List[dict]) -> Optional[dict]:
+        if text is not None and text.strip() == NOT_FOUND:
+            return None
+        if not text:
+            best = hits[0]["text"]
+            excerpt = best if len(best) <= EXTRACT_CHARS else best[:EXTRACT_CHARS].rsplit(" ", 1)[0] + "..."
+            text = f'From "{hits[0]["title"]}" ({hits[0]["section"]}): {excerpt} [1]'
+        citations = [
+            {"ref": i, "source": hit["source"], "title": hit["title"], "section": hit["section"],
+             "score": round(hit["score"], 4)}
+            for i, hit in enumerate(hits, start=1)
+        ]
+        return {"answer": text.strip(), "citations": citations}
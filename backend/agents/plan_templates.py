@@ -0,0 +1,61 @@
+"""
+Declarative plans for intents whose runbook sequence is fixed.
+
+Templates live in backend/config/plan_templates.json, keyed by intent. Input
+values of the form "{intent.user_id}" or "{user.department}" are resolved
+against the enriched context; anything else is passed through verbatim.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+from backend.models.plan import PlanAction, PlanResult
+
+TEMPLATES_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "config", "plan_templates.json")
+)
+
+_PLACEHOLDER_RE = re.compile(r"^\{([a-z_]+(?:\.[a-z_]+)+)\}$")
+
+def _resolve(value: Any, context: dict) -> Any:
+    if not isinstance(value, str):
+        return value
+    match = _PLACEHOLDER_RE.match(value)
+    if not match:
+        return value
+    current: Any = context
+    for part in match.group(1).split("."):
+        if not isinstance(current, dict):
+            return None
+        current = current.get(part)
+    return current
+
+class PlanTemplateEngine:
+    def __init__(self, templates_path: str = TEMPLATES_PATH):
+        with open(templates_path, "r") as f:
+            self.templates: Dict[str, dict] = json.load(f)
+
+    def build(self, context: dict) -> Optional[PlanResult]:
+        """Return a PlanResult for a known intent, or None to defer to the LLM."""
+        intent = context.get("intent") or {}
+        template = self.templates.get(intent.get("intent"))
+        if template is None:
+            return None
+
+        domains = template.get("domains")
+        if domains and intent.get("domain") not in domains:
+            return None
+
+        actions = [
+            PlanAction(
+                runbook_id=a["runbook_id"],
+                inputs={k: _resolve(v, context) for k, v in a.get("inputs", {}).items()},
+                when=a.get("when"),
+            )
+            for a in template.get("actions", [])
+        ]
+        return PlanResult(
+            actions=actions,
+            requires_human_approval=template.get("requires_human_approval", False),
+        )
@@ -1,8 +1,11 @@
 
 from backend.agents.base_agent import BaseAgent
-from backend.models.plan import PlanResult, PlanAction
-from backend.utils.llm_client import call_llm
-import json
+from backend.agents.plan_templates import PlanTemplateEngine
+from backend.config import settings
+from backend.models.plan import PlanResult
+from backend.utils.llm_client import call_llm, call_llm_async
+from backend.utils.prompt_builder import build_context_prompt
+from backend.utils.structured_output import parse_output, response_format_for
 
 PLANNER_SYSTEM_PROMPT = """
 You are a planning agent for an internal service desk.
@@ -32,50 +35,94 @@ Output ONLY valid JSON in this format:
 }
 """
 
+# Context the planner sees, highest priority first; anything else enrichment
+# adds stays out of the prompt. Optional fields are dropped from the end when
+# the prompt exceeds LLM_PROMPT_TOKEN_BUDGET.
+PLANNER_CONTEXT_FIELDS = [
+    "intent.user_id",
+    "intent.intent",
+    "intent.domain",
+    "intent.urgency",
+    "user.role",
+    "user.department",
+    "intent.raw_message",
+    "intent.confidence",
+    "user.location",
+]
+PLANNER_REQUIRED_FIELDS = {"intent.user_id", "intent.intent", "intent.domain"}
+
 class PlannerAgent(BaseAgent):
     name = "planner"
 
     def describe(self) -> str:
-        return "Decides which runbooks to call using an LLM."
+        return "Decides which runbooks to call using plan templates, then an LLM."
+
+    def __init__(self):
+        self.templates = PlanTemplateEngine()
 
     def create_plan(self, context: dict) -> PlanResult:
-        user = context["user"]
-        intent = context["intent"]
-
-        user_prompt = json.dumps(
-            {
-                "user": user,
-                "intent": intent,
-            },
-            indent=2,
-        )
-
-        raw = call_llm(PLANNER_SYSTEM_PROMPT, user_prompt)
-
-        try:
-            data = json.loads(raw)
-        except Exception:
+        templated = self.template_plan(context)
+        if templated is not None:
+            return templated
+        raw = call_llm(PLANNER_SYSTEM_PROMPT, self._build_prompt(context),
+                       response_format=response_format_for(PlanResult, strict=False))
+        return self._parse_plan(raw)
+
+    async def create_plan_async(self, context: dict) -> PlanResult:
+        templated = self.template_plan(context)
+        if templated is not None:
+            return templated
+        raw = await call_llm_async(PLANNER_SYSTEM_PROMPT, self._build_prompt(context),
+                                   response_format=response_format_for(PlanResult, strict=False))
+        return self._parse_plan(raw)
+
+    def template_plan(self, context: dict):
+        # Known intents map to fixed runbook sequences; reserve the LLM for the rest
+        if not settings.PLAN_TEMPLATES_ENABLED:
+            return None
+        return self.templates.build(context)
+
+    def _build_prompt(self, context: dict) -> str:
+        return build_context_prompt(
+            "planner",
+            PLANNER_SYSTEM_PROMPT,
+            context,
+            PLANNER_CONTEXT_FIELDS,
+            settings.LLM_PROMPT_TOKEN_BUDGET,
+            required=PLANNER_REQUIRED_FIELDS,
+        ).text
+
+    def _parse_plan(self, raw: str) -> PlanResult:
+        plan = parse_output(PlanResult, raw, self.name)
+        if plan is None:
             # fallback: no actions
-            data = {"requires_human_approval": False, "actions": []}
-
-        actions = [
-            PlanAction(runbook_id=a["runbook_id"], inputs=a.get("inputs", {}))
-            for a in data.get("actions", [])
-        ]
-
-        return PlanResult(
-            actions=actions,
-            requires_human_approval=data.get("requires_human_approval", False),
-        )
+            plan = PlanResult(actions=[], requires_human_approval=False)
+        return plan
 
     def summarize_for_user(self, intent_result, runbook_results: list) -> str:
         # You can later also LLM-ify this if you want a nicer explanation.
         intent = intent_result.intent
 
+        held = [r.get("runbook_id") for r in runbook_results if r.get("status") == "awaiting_confirmation"]
+        if held:
+            if intent == "account_access_issue" and "reset_password" in held:
+                return "I checked your account and it's locked. I can reset your password, but I need your explicit confirmation first. Confirm to proceed."
+            return f"I'm ready to run {', '.join(held)}, but it needs your explicit confirmation first. Confirm to proceed."
+
+        queued = {r.get("runbook_id"): r.get("details", {}).get("job_id") for r in runbook_results if r.get("status") == "queued"}
+
         if intent == "account_access_issue":
+            statuses = {r.get("runbook_id"): r.get("status") for r in runbook_results}
+            if statuses.get("reset_password") == "skipped":
+                return "I checked your account and it isn't locked, so no reset was needed. Try signing in again, and reply here if it still fails."
+            if "reset_password" in queued:
+                return f"I checked your account and started a password reset (job {queued['reset_password']}). It finishes in the background; follow the instructions you receive (e.g., email or SMS) to complete your login."
             return "I checked your account and ran the appropriate recovery steps. Please follow the instructions you received (e.g., email or SMS) to complete your login."
         elif intent == "pto_balance":
             if runbook_results:
                 days = runbook_results[0].get("details", {}).get("remaining_days", "N/A")
                 return f"You currently have {days} days of PTO remaining."
+        if queued:
+            jobs = ", ".join(f"{runbook_id} (job {job_id})" for runbook_id, job_id in queued.items())
+            return f"I started {jobs}; it finishes in the background."
         return "I processed your request and logged the results."
@@ -1,27 +1,344 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AbstractSet, Dict, List, Optional, Set
+
 from backend.agents.base_agent import BaseAgent
+from backend.agents.runbook_registry import RunbookRegistry
+from backend.agents.runbook_sandbox import RunbookProcessPool
+from backend.config import settings
+from backend.config.catalog import load_runbook_catalog
 from backend.models.plan import PlanAction
-from backend.runbooks import check_account_status, reset_password, lookup_pto_balance
+from backend.services.job_queue import JobWorkers, job_queue
+from backend.utils.metrics import RUNBOOK_LATENCY
+
+# Shared by the sync and async paths so total runbook concurrency stays bounded
+_pool = ThreadPoolExecutor(max_workers=settings.RUNBOOK_MAX_WORKERS, thread_name_prefix="runbook")
 
-RUNBOOK_MAP = {
-    "check_account_status": check_account_status.run,
-    "reset_password": reset_password.run,
-    "lookup_pto_balance": lookup_pto_balance.run,
-}
+# Workers draining the background job queue, started on first use
+_job_workers: Optional[JobWorkers] = None
+_job_workers_lock = threading.Lock()
 
 class RunbookExecutorAgent(BaseAgent):
     name = "runbook_executor"
 
+    def __init__(self):
+        self.catalog = load_runbook_catalog()
+        self.registry = RunbookRegistry.from_settings(self.catalog)
+        # Runbooks marked "isolation": "process" run in a separate worker-process pool
+        self.isolated = {rid for rid, meta in self.catalog.items() if meta.get("isolation") == "process"}
+        self.process_pool = RunbookProcessPool.from_settings(
+            preload=[self.registry.target(rid) for rid in sorted(self.isolated) if rid in self.registry]
+        )
+
     def describe(self) -> str:
         return "Executes runbooks and returns structured results."
 
-    def execute(self, action: PlanAction, context: dict) -> dict:
-        fn = RUNBOOK_MAP.get(action.runbook_id)
-        if not fn:
-            return {
-                "runbook_id": action.runbook_id,
-                "status": "error",
-                "details": {"error": "Runbook not found"},
-            }
-        result = fn(action.inputs)
+    def execute(self, action: PlanAction, context: dict,
+                prior_results: Optional[Dict[str, dict]] = None,
+                held: AbstractSet[str] = frozenset()) -> dict:
+        skipped = self._check_condition(action, prior_results, held)
+        if skipped:
+            return skipped
+        rejected = self._reject(action)
+        if rejected:
+            return rejected
+        if self._runs_in_background(action):
+            return self._enqueue(action)
+        started = time.perf_counter()
+        result = self._invoke(action)
+        return self._finish(action, result, started)
+
+    async def execute_async(self, action: PlanAction, context: dict,
+                            prior_results: Optional[Dict[str, dict]] = None,
+                            held: AbstractSet[str] = frozenset()) -> dict:
+        skipped = self._check_condition(action, prior_results, held)
+        if skipped:
+            return skipped
+        rejected = self._reject(action)
+        if rejected:
+            return rejected
+        if self._runs_in_background(action):
+            return await asyncio.to_thread(self._enqueue, action)
+        started = time.perf_counter()
+        if action.runbook_id in self.isolated:
+            result = await self.process_pool.run_async(
+                self.registry.target(action.runbook_id), action.inputs, self._timeout(action)
+            )
+        else:
+            # Runbooks are plain blocking functions (imported on first use); run them off the event loop
+            result = await asyncio.get_running_loop().run_in_executor(_pool, self._invoke, action)
+        return self._finish(action, result, started)
+
+    def _reject(self, action: PlanAction) -> Optional[dict]:
+        """An error result for unknown runbooks or inputs that fail the catalog's input_schema."""
+        if action.runbook_id not in self.registry:
+            return self._not_found(action)
+        if settings.RUNBOOK_VALIDATE_INPUTS:
+            errors = self.registry.validate(action.runbook_id, action.inputs)
+            if errors:
+                return self._error(action, "Invalid inputs: " + "; ".join(errors))
+        return None
+
+    def _invoke(self, action: PlanAction) -> dict:
+        """Run the runbook (blocking): in the process pool when isolated, else in this thread."""
+        if action.runbook_id in self.isolated:
+            return self.process_pool.run(self.registry.target(action.runbook_id), action.inputs, self._timeout(action))
+        return self.registry.get(action.runbook_id)(action.inputs)
+
+    def warm_up(self) -> None:
+        """Start the process pool ahead of the first isolated runbook, if any runbook is isolated."""
+        if self.isolated:
+            self.process_pool.warm()
+
+    def stats(self) -> dict:
+        return {**self.registry.stats(), "process_pool": self.process_pool.stats()}
+
+    # Background jobs
+
+    def _runs_in_background(self, action: PlanAction) -> bool:
+        return job_queue is not None and bool(self.catalog.get(action.runbook_id, {}).get("async"))
+
+    def _enqueue(self, action: PlanAction) -> dict:
+        """
+        Hand a runbook marked "async" in the catalog to the job queue; the
+        result carries its job id. Only runbooks marked "idempotent" are
+        retried: any other runbook gets exactly one attempt.
+        """
+        meta = self.catalog.get(action.runbook_id, {})
+        job = job_queue.enqueue(
+            action.runbook_id, action.inputs, user_id=action.inputs.get("user_id"),
+            max_attempts=meta.get("max_attempts") if meta.get("idempotent") else 1,
+            visibility_timeout=meta.get("timeout_seconds"),
+        )
+        self.start_job_workers().notify()
+        return {
+            "runbook_id": action.runbook_id,
+            "status": "queued",
+            "details": {"job_id": job["job_id"]},
+        }
+
+    def run_job(self, job: dict) -> dict:
+        """
+        Job handler: exceptions are retried by the queue, returned results are
+        final. The runbook gets the job's visibility timeout; overrunning it
+        raises, so the attempt is retried or dead-lettered like any failure.
+        """
+        action = PlanAction(runbook_id=job["runbook_id"], inputs=job["inputs"])
+        rejected = self._reject(action)
+        if rejected:
+            return rejected
+        timeout = float(job["visibility_timeout"])
+        started = time.perf_counter()
+        if action.runbook_id in self.isolated:
+            result = self.process_pool.run(self.registry.target(action.runbook_id), action.inputs, timeout)
+        else:
+            future = _pool.submit(self.registry.get(action.runbook_id), action.inputs)
+            if not wait([future], timeout=timeout).done:
+                # Threads cannot be interrupted; abandon the runbook and free this worker
+                future.cancel()
+                raise TimeoutError(f"Timed out after {timeout:g}s")
+            result = future.result()
+        return self._finish(action, result, started)
+
+    def start_job_workers(self) -> Optional[JobWorkers]:
+        global _job_workers
+        if job_queue is None:
+            return None
+        if _job_workers is None:
+            with _job_workers_lock:
+                if _job_workers is None:
+                    workers = JobWorkers(job_queue, self.run_job, settings.JOB_WORKERS,
+                                         settings.JOB_POLL_INTERVAL_SECONDS, settings.JOB_HEARTBEAT_SECONDS)
+                    workers.start()
+                    _job_workers = workers
+        return _job_workers
+
+    def stop_job_workers(self) -> None:
+        if _job_workers is not None:
+            _job_workers.stop()
+
+    def execute_plan(self, actions: List[PlanAction], context: dict,
+                     held: AbstractSet[str] = frozenset()) -> List[dict]:
+        """
+        Run a plan as a DAG on the shared pool: independent actions run
+        concurrently, each bounded by its catalog timeout. The first failure
+        cancels everything not yet finished. Results come back in plan order.
+        Runbooks in `held` are not run; when their condition is met they
+        report "awaiting_confirmation" instead.
+        """
+        deps = self._dependencies(actions)
+        results: List[Optional[dict]] = [None] * len(actions)
+        by_runbook: Dict[str, dict] = {}
+        pending = set(range(len(actions)))
+        running = {}  # future -> (index, deadline)
+        failed = False
+
+        while pending or running:
+            if not failed:
+                for i in sorted(pending):
+                    if all(results[d] is not None for d in deps[i]):
+                        pending.discard(i)
+                        fut = _pool.submit(self.execute, actions[i], context, dict(by_runbook), held)
+                        # The process pool enforces isolated runbooks' timeout itself
+                        deadline = (math.inf if actions[i].runbook_id in self.isolated
+                                    else time.monotonic() + self._timeout(actions[i]))
+                        running[fut] = (i, deadline)
+            if not running:
+                break
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            timeout = None if next_deadline == math.inf else max(0.0, next_deadline - time.monotonic())
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for fut in list(running):
+                i, deadline = running[fut]
+                if fut in done:
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        result = self._error(actions[i], str(e))
+                elif deadline <= now:
+                    fut.cancel()
+                    result = self._timed_out(actions[i])
+                else:
+                    continue
+                del running[fut]
+                results[i] = result
+                by_runbook[actions[i].runbook_id] = result
+                failed = failed or result.get("status") == "error"
+
+            if failed:
+                # Threads cannot be interrupted; stop waiting on them instead
+                for fut, (i, _) in running.items():
+                    fut.cancel()
+                    results[i] = self._cancelled(actions[i])
+                running.clear()
+
+        for i in pending:
+            results[i] = self._cancelled(actions[i])
+        return results
+
+    async def execute_plan_async(self, actions: List[PlanAction], context: dict,
+                                 held: AbstractSet[str] = frozenset()) -> List[dict]:
+        """Async counterpart of execute_plan; same ordering and failure semantics."""
+        deps = self._dependencies(actions)
+        results: List[Optional[dict]] = [None] * len(actions)
+        by_runbook: Dict[str, dict] = {}
+        pending = set(range(len(actions)))
+        running: Dict[asyncio.Task, int] = {}
+        failed = False
+
+        try:
+            while pending or running:
+                if not failed:
+                    for i in sorted(pending):
+                        if all(results[d] is not None for d in deps[i]):
+                            pending.discard(i)
+                            coro = self.execute_async(actions[i], context, dict(by_runbook), held)
+                            if actions[i].runbook_id not in self.isolated:
+                                # The process pool enforces isolated runbooks' timeout itself
+                                coro = asyncio.wait_for(coro, timeout=self._timeout(actions[i]))
+                            running[asyncio.ensure_future(coro)] = i
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = running.pop(task)
+                    try:
+                        result = task.result()
+                    except asyncio.TimeoutError:
+                        result = self._timed_out(actions[i])
+                    except Exception as e:
+                        result = self._error(actions[i], str(e))
+                    results[i] = result
+                    by_runbook[actions[i].runbook_id] = result
+                    failed = failed or result.get("status") == "error"
+
+                if failed:
+                    for task, i in running.items():
+                        task.cancel()
+                        results[i] = self._cancelled(actions[i])
+                    running.clear()
+        finally:
+            # Client disconnects cancel us; don't leave orphaned tasks behind
+            for task in running:
+                task.cancel()
+
+        for i in pending:
+            results[i] = self._cancelled(actions[i])
+        return results
+
+    def _finish(self, action: PlanAction, result: dict, started: float) -> dict:
         result["runbook_id"] = action.runbook_id
+        RUNBOOK_LATENCY.labels(runbook_id=action.runbook_id, status=result.get("status", "unknown")).observe(
+            time.perf_counter() - started
+        )
         return result
+
+    def _dependencies(self, actions: List[PlanAction]) -> List[Set[int]]:
+        """
+        Edges come from the action's depends_on, its `when` condition and the
+        catalog's depends_on. Only earlier actions can be depended on, which
+        keeps every plan acyclic and preserves the planner's ordering intent.
+        """
+        deps: List[Set[int]] = []
+        for i, action in enumerate(actions):
+            wanted = set(action.depends_on)
+            wanted.update(self.catalog.get(action.runbook_id, {}).get("depends_on", []))
+            if action.when is not None:
+                wanted.add(action.when.runbook_id)
+            deps.append({j for j in range(i) if actions[j].runbook_id in wanted})
+        return deps
+
+    def _timeout(self, action: PlanAction) -> float:
+        meta = self.catalog.get(action.runbook_id, {})
+        return float(meta.get("timeout_seconds", settings.RUNBOOK_DEFAULT_TIMEOUT_SECONDS))
+
+    def _check_condition(self, action: PlanAction, prior_results: Optional[Dict[str, dict]],
+                         held: AbstractSet[str] = frozenset()) -> Optional[dict]:
+        """
+        Return a 'skipped' result when the action's `when` condition is not met,
+        or an 'awaiting_confirmation' one when it is met but the action is held.
+        """
+        if action.when is None or action.when.is_met(prior_results or {}):
+            if action.runbook_id in held:
+                return self._awaiting_confirmation(action)
+            return None
+        return {
+            "runbook_id": action.runbook_id,
+            "status": "skipped",
+            "details": {
+                "reason": f"{action.when.runbook_id}.{action.when.field} not in {action.when.one_of}",
+            },
+        }
+
+    def _awaiting_confirmation(self, action: PlanAction) -> dict:
+        return {
+            "runbook_id": action.runbook_id,
+            "status": "awaiting_confirmation",
+            "details": {"reason": "Needs explicit confirmation from the user"},
+        }
+
+    def _not_found(self, action: PlanAction) -> dict:
+        return self._error(action, "Runbook not found")
+
+    def _error(self, action: PlanAction, error: str) -> dict:
+        return {
+            "runbook_id": action.runbook_id,
+            "status": "error",
+            "details": {"error": error},
+        }
+
+    def _timed_out(self, action: PlanAction) -> dict:
+        return self._error(action, f"Timed out after {self._timeout(action):g}s")
+
+    def _cancelled(self, action: PlanAction) -> dict:
+        return {
+            "runbook_id": action.runbook_id,
+            "status": "cancelled",
+            "details": {"reason": "An earlier action in the plan failed"},
+        }
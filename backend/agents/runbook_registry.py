@@ -0,0 +1,145 @@
+"""
+Runbook registry: which code implements each runbook, loaded on first use.
+
+Implementations are found, in order of precedence, from:
+- the catalog entry's "entry" field ("package.module:function"),
+- installed packages exposing an entry point in RUNBOOK_ENTRY_POINT_GROUP
+  (name = runbook id, value = "package.module:function"),
+- modules in backend/runbooks/ (module name = runbook id, function `run`).
+Discovery only lists names; a runbook's module is imported the first time it
+runs, so unused runbooks cost nothing at startup.
+
+A catalog entry may carry an "input_schema", a JSON Schema subset checked
+before the runbook runs: type, required, properties, additionalProperties,
+and per-property type, enum, minLength, maxLength, pattern, minimum, maximum.
+"""
+import importlib
+import pkgutil
+import re
+import threading
+from importlib import metadata
+from typing import Callable, Dict, List, Optional
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RUNBOOK_PACKAGE = "backend.runbooks"
+
+_JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+    "null": type(None),
+}
+
+def _type_matches(value, expected) -> bool:
+    names = expected if isinstance(expected, list) else [expected]
+    for name in names:
+        if name in ("integer", "number") and isinstance(value, bool):
+            continue
+        if isinstance(value, _JSON_TYPES.get(name, object)):
+            return True
+    return False
+
+def validate_inputs(schema: dict, inputs) -> List[str]:
+    """Problems with `inputs` under `schema`; empty when they are valid."""
+    if not isinstance(inputs, dict):
+        return ["inputs must be an object"]
+    errors = [f"missing required input '{name}'" for name in schema.get("required", []) if name not in inputs]
+    properties = schema.get("properties", {})
+    if schema.get("additionalProperties") is False:
+        errors += [f"unexpected input '{name}'" for name in inputs if name not in properties]
+    for name, rules in properties.items():
+        if name not in inputs:
+            continue
+        value = inputs[name]
+        if "type" in rules and not _type_matches(value, rules["type"]):
+            errors.append(f"'{name}' must be of type {rules['type']}")
+            continue
+        if "enum" in rules and value not in rules["enum"]:
+            errors.append(f"'{name}' must be one of {rules['enum']}")
+        if isinstance(value, str):
+            if len(value) < rules.get("minLength", 0):
+                errors.append(f"'{name}' must be at least {rules['minLength']} characters")
+            if "maxLength" in rules and len(value) > rules["maxLength"]:
+                errors.append(f"'{name}' must be at most {rules['maxLength']} characters")
+            if "pattern" in rules and not re.search(rules["pattern"], value):
+                errors.append(f"'{name}' must match {rules['pattern']}")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if "minimum" in rules and value < rules["minimum"]:
+                errors.append(f"'{name}' must be >= {rules['minimum']}")
+            if "maximum" in rules and value > rules["maximum"]:
+                errors.append(f"'{name}' must be <= {rules['maximum']}")
+    return errors
+
+def _import_target(target: str) -> Callable[[dict], dict]:
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "run")
+
+class RunbookRegistry:
+    def __init__(self, catalog: dict, package: str = RUNBOOK_PACKAGE, entry_point_group: Optional[str] = None):
+        self.catalog = catalog
+        self.package = package
+        self.entry_point_group = entry_point_group
+        self._targets: Dict[str, str] = {}
+        self._loaded: Dict[str, Callable[[dict], dict]] = {}
+        self._lock = threading.Lock()
+        self.discover()
+
+    @classmethod
+    def from_settings(cls, catalog: dict) -> "RunbookRegistry":
+        return cls(catalog, entry_point_group=settings.RUNBOOK_ENTRY_POINT_GROUP or None)
+
+    def discover(self) -> None:
+        targets = {}
+        package = importlib.import_module(self.package)
+        for module in pkgutil.iter_modules(package.__path__):
+            if not module.name.startswith("_") and not module.ispkg:
+                targets[module.name] = f"{self.package}.{module.name}:run"
+        if self.entry_point_group:
+            for entry_point in metadata.entry_points(group=self.entry_point_group):
+                targets[entry_point.name] = entry_point.value
+        for runbook_id, meta in self.catalog.items():
+            if meta.get("entry"):
+                targets[runbook_id] = meta["entry"]
+        with self._lock:
+            # Keep already-imported runbooks whose implementation didn't move
+            self._loaded = {rid: fn for rid, fn in self._loaded.items() if targets.get(rid) == self._targets.get(rid)}
+            self._targets = targets
+
+    def __contains__(self, runbook_id: str) -> bool:
+        return runbook_id in self._targets
+
+    def ids(self) -> List[str]:
+        return sorted(self._targets)
+
+    def target(self, runbook_id: str) -> Optional[str]:
+        """The "module:function" implementing the runbook, without importing it."""
+        return self._targets.get(runbook_id)
+
+    def get(self, runbook_id: str) -> Optional[Callable[[dict], dict]]:
+        fn = self._loaded.get(runbook_id)
+        if fn is not None:
+            return fn
+        target = self._targets.get(runbook_id)
+        if target is None:
+            return None
+        with self._lock:
+            fn = self._loaded.get(runbook_id)
+            if fn is None:
+                fn = _import_target(target)
+                self._loaded[runbook_id] = fn
+                logger.info("Loaded runbook %s from %s", runbook_id, target)
+        return fn
+
+    def validate(self, runbook_id: str, inputs) -> List[str]:
+        schema = self.catalog.get(runbook_id, {}).get("input_schema")
+        return validate_inputs(schema, inputs) if schema else []
+
+    def stats(self) -> dict:
+        return {"discovered": len(self._targets), "loaded": len(self._loaded)}
@@ -0,0 +1,153 @@
+"""
+Process pool for runbooks marked "isolation": "process" in the catalog.
+
+Such runbooks run in separate worker processes, so CPU-heavy work doesn't
+hold the GIL of the API process and a crash or runaway allocation can't take
+the server down:
+- workers are spawned (not forked, the API process is multi-threaded) and
+  import the isolated runbooks' modules up front; warm() starts them ahead
+  of the first request,
+- each worker's address space is capped at RUNBOOK_PROCESS_MEMORY_MB
+  (RLIMIT_AS, where the platform supports it), so a runaway allocation
+  raises MemoryError inside the worker,
+- workers are replaced after RUNBOOK_PROCESS_MAX_TASKS runbooks,
+- a runbook that overruns its timeout, is abandoned by its (cancelled) async
+  caller, or whose worker dies recycles the whole pool (a single task can't
+  be cancelled once it runs); other runbooks in flight at that moment fail
+  and are reported as errors.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = get_logger(__name__)
+
+class RunbookProcessError(RuntimeError):
+    pass
+
+def _init_worker(memory_limit_bytes: int, preload: List[str]) -> None:
+    if memory_limit_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    for target in preload:
+        try:
+            importlib.import_module(target.partition(":")[0])
+        except ImportError:
+            pass  # reported when the runbook is actually called
+
+def _call(target: str, inputs: dict) -> dict:
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "run")(inputs)
+
+def _ready() -> bool:
+    return True
+
+class RunbookProcessPool:
+    def __init__(self, workers: int = 2, memory_limit_mb: int = 1024, max_tasks_per_child: int = 100,
+                 preload: Optional[List[str]] = None):
+        self.workers = workers
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.preload = list(preload or [])
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "timeouts": 0, "crashes": 0, "cancelled": 0, "recycles": 0}
+
+    @classmethod
+    def from_settings(cls, preload: Optional[List[str]] = None) -> "RunbookProcessPool":
+        return cls(settings.RUNBOOK_PROCESS_WORKERS, settings.RUNBOOK_PROCESS_MEMORY_MB,
+                   settings.RUNBOOK_PROCESS_MAX_TASKS, preload)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.memory_limit_mb * 1024 * 1024, self.preload),
+                        max_tasks_per_child=self.max_tasks_per_child or None,
+                    )
+                executor = self._executor
+        return executor
+
+    def warm(self) -> None:
+        """Start every worker now instead of on the first isolated runbook."""
+        started = time.perf_counter()
+        executor = self._get_executor()
+        for future in [executor.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+        logger.info("Runbook process pool warm: %d workers in %.2fs", self.workers, time.perf_counter() - started)
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._stats["recycles"] += 1
+        # ProcessPoolExecutor can't cancel a running task; stop its processes instead
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _failed(self, executor: ProcessPoolExecutor, target: str, error: BaseException, timeout: float):
+        if isinstance(error, (FutureTimeoutError, asyncio.TimeoutError)):
+            self._stats["timeouts"] += 1
+            self._recycle(executor)
+            return RunbookProcessError(f"Timed out after {timeout:g}s in the runbook process pool")
+        self._stats["crashes"] += 1
+        self._recycle(executor)
+        logger.error("Runbook process for %s died: %s", target, error)
+        return RunbookProcessError("Runbook process died (crash or memory limit)")
+
+    def run(self, target: str, inputs: dict, timeout: float) -> dict:
+        executor = self._get_executor()
+        self._stats["runs"] += 1
+        future = executor.submit(_call, target, inputs)
+        try:
+            return future.result(timeout=timeout)
+        except (FutureTimeoutError, BrokenProcessPool) as e:
+            raise self._failed(executor, target, e, timeout) from e
+
+    async def run_async(self, target: str, inputs: dict, timeout: float) -> dict:
+        """
+        Enforces `timeout` itself, so callers must not wrap this in another
+        timeout. If the caller is cancelled while the runbook is running, the
+        pool is recycled so the worker doesn't stay busy with abandoned work.
+        """
+        executor = self._get_executor()
+        self._stats["runs"] += 1
+        future = executor.submit(_call, target, inputs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, BrokenProcessPool) as e:
+            raise self._failed(executor, target, e, timeout) from e
+        except asyncio.CancelledError:
+            # Cancelling the wrapper only un-queues a task that hasn't started
+            if not future.cancel() and not future.done():
+                self._stats["cancelled"] += 1
+                self._recycle(executor)
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {**self._stats, "workers": self.workers, "running": self._executor is not None}
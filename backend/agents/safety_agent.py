@@ -1,66 +1,137 @@
 from backend.agents.base_agent import BaseAgent
+from backend.agents.safety_policy import PolicyEngine
+from backend.config import settings
 from backend.models.plan import PlanResult
-from typing import Dict, Any 
-import json 
-import os 
+from backend.services.quota_store import quota_store_from_settings
+from collections import Counter
+from typing import List, Tuple
 
 class SafetyDecision(dict):
     @property
     def block(self) -> bool:
         return self.get("block", False)
-    
-    @property 
-    def reason(self) -> str: 
+
+    @property
+    def reason(self) -> str:
         return self.get("reason", "")
 
+    @property
+    def confirm(self) -> List[str]:
+        """Runbooks that may only run after the user explicitly confirms."""
+        return self.get("confirm", [])
+
+    @property
+    def reservations(self) -> List[Tuple[str, str, str]]:
+        """(runbook_id, quota key, token) for each quota slot taken for the plan."""
+        return self.get("reservations", [])
+
+def _quota_key(user_id: str, runbook_id: str) -> str:
+    return f"{user_id}:{runbook_id}"
+
 class SafetyAgent(BaseAgent):
     name = "safety"
 
-    def __init__(self): 
-        # Load runbook catalog on init 
-        catalog_path = os.path.join(
-            os.path.dirname(__file__), 
-            "..", 
-            "config", 
-            "runbook_catalog.json"
-        )
-        catalog_path = os.path.abspath(catalog_path)
-        with open(catalog_path, "r") as f: 
-            self.runbook_catalog: Dict[str, Any] = json.load(f) 
+    def __init__(self):
+        # Catalog + rule files compiled into lookup tables, hot-reloaded on change
+        self.policies = PolicyEngine()
+        self.quotas = quota_store_from_settings()
 
     def describe(self) -> str:
         return "Applies policy rules to planned actions."
 
     def evaluate(self, plan: PlanResult, context: dict) -> SafetyDecision:
+        """
+        Check the plan against policy. An allowed plan holds one quota slot per
+        quota-limited action, reserved here so concurrent requests can't
+        overrun the limit; pass the decision to settle() once the plan ran (or
+        release() if it never does). A blocked plan holds nothing. Quota
+        stores may do blocking I/O, so async callers run this on a thread.
+        """
+        reservations = []
+        try:
+            decision = self._evaluate(plan, context, reservations)
+        except BaseException:
+            self._release(reservations)
+            raise
+        if decision.block:
+            self._release(reservations)
+        elif reservations:
+            decision["reservations"] = reservations
+        return decision
+
+    def _evaluate(self, plan: PlanResult, context: dict, reservations: list) -> SafetyDecision:
         user = context["user"]
         actions = plan.actions
 
         # block if unknown user
         if not user:
             return SafetyDecision(block=True, reason="Unknown user")
-        
-        if not actions: 
+
+        if not actions:
             return SafetyDecision(block=True, reason="No actions in plan")
-        
-        # Example policy: block if any unknown or high-risk runbook 
-        for action in actions: 
-            meta = self.runbook_catalog.get(action.runbook_id)
-            if not meta: 
+
+        if len(actions) > settings.MAX_AUTO_EXECUTE_ACTIONS:
+            return SafetyDecision(
+                block=True,
+                reason=f"Plan has {len(actions)} actions; at most {settings.MAX_AUTO_EXECUTE_ACTIONS} can run automatically",
+            )
+
+        policy = self.policies.current()
+        role_denials = policy.role_denials(user.get("role"))
+        user_id = user.get("id") or context["intent"]["user_id"]
+        confirm = []
+
+        for action in actions:
+            meta = policy.runbooks.get(action.runbook_id)
+            if not meta:
                 return SafetyDecision(
-                    block=True, 
+                    block=True,
                     reason=f"Runbook {action.runbook_id} is not registered in catalog"
                 )
-            
-            risk = meta.get("risk_level", "low") 
-            if risk == "high": 
-                # For now, block high-risk entirely (or require human approval) 
-                return SafetyDecision(
-                    block=True, 
-                    reason=f"Runbook {action.runbook_id} is high-risk and not auto-executable"
-                )
-    
-        # You can add:
-        # - role checks
-        # - rate limits
-        # - high-risk runbook restrictions
+
+            denied = policy.denied.get(action.runbook_id) or role_denials.get(action.runbook_id)
+            if denied:
+                return SafetyDecision(block=True, reason=denied)
+
+            if meta.daily_limit is not None:
+                key = _quota_key(user_id, action.runbook_id)
+                token = self.quotas.reserve(key, meta.daily_limit)
+                if token is None:
+                    return SafetyDecision(
+                        block=True,
+                        reason=f"Daily limit of {meta.daily_limit} runs reached for {action.runbook_id}",
+                    )
+                reservations.append((action.runbook_id, key, token))
+
+            if meta.requires_confirmation and settings.REQUIRE_APPROVAL_FOR_SENSITIVE:
+                confirm.append(action.runbook_id)
+
+        if confirm:
+            return SafetyDecision(
+                block=False,
+                reason=f"Allowed by policy; {', '.join(confirm)} needs explicit confirmation",
+                confirm=confirm,
+            )
         return SafetyDecision(block=False, reason="All actions allowed by policy")
+
+    def settle(self, decision: SafetyDecision, runbook_results: list) -> None:
+        """
+        Keep the quota slots of runbooks that ran or were queued and hand back
+        the rest (held for confirmation, skipped, failed, cancelled).
+        """
+        used = Counter(r.get("runbook_id") for r in runbook_results if r.get("status") in ("success", "queued"))
+        unused = []
+        for reservation in decision.reservations:
+            if used[reservation[0]] > 0:
+                used[reservation[0]] -= 1
+            else:
+                unused.append(reservation)
+        self._release(unused)
+
+    def release(self, decision: SafetyDecision) -> None:
+        """Hand back every quota slot of a plan that didn't run."""
+        self._release(decision.reservations)
+
+    def _release(self, reservations) -> None:
+        for _, key, token in reservations:
+            self.quotas.release(key, token)
@@ -0,0 +1,139 @@
+"""
+Safety policy compiled from runbook_catalog.json and safety_policies.json.
+
+Rules are resolved against the catalog once, at load time, into lookup tables:
+- runbook_id -> RunbookPolicy (risk, domain, confirmation, daily quota),
+- runbook_id -> reason, for runbooks denied to everyone (global rules and
+  per-domain rules, by runbook id or risk level),
+- role -> {runbook_id -> reason}, for role rules (by id, risk level or domain),
+so checking a plan is a single pass of dict lookups.
+
+PolicyEngine re-checks both files' mtimes every SAFETY_POLICY_RELOAD_SECONDS
+and swaps in a freshly compiled policy. Evaluations already running keep the
+policy object they started with, and a file that fails to compile leaves the
+previous policy in place.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from backend.config import settings
+from backend.config.catalog import CATALOG_PATH, load_runbook_catalog
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+POLICY_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "config", "safety_policies.json")
+)
+
+class RunbookPolicy:
+    __slots__ = ("runbook_id", "domain", "risk_level", "requires_confirmation", "daily_limit")
+
+    def __init__(self, runbook_id: str, meta: dict):
+        self.runbook_id = runbook_id
+        self.domain = meta.get("domain", "general")
+        self.risk_level = meta.get("risk_level", "low")
+        self.requires_confirmation = bool(meta.get("requires_explicit_confirmation", False))
+        limit = meta.get("max_daily_executions_per_user")
+        self.daily_limit: Optional[int] = int(limit) if limit is not None else None
+
+class CompiledPolicy:
+    def __init__(self, runbooks: Dict[str, RunbookPolicy], denied: Dict[str, str],
+                 denied_by_role: Dict[str, Dict[str, str]]):
+        self.runbooks = runbooks
+        self.denied = denied
+        self.denied_by_role = denied_by_role
+
+    def role_denials(self, role) -> Dict[str, str]:
+        return self.denied_by_role.get(str(role or "").lower(), {})
+
+def _deny_reasons(rule: dict, runbooks: Dict[str, RunbookPolicy], scope: str) -> Dict[str, str]:
+    deny_runbooks = set(rule.get("deny_runbooks", []))
+    deny_risk_levels = set(rule.get("deny_risk_levels", []))
+    deny_domains = set(rule.get("deny_domains", []))
+    reasons = {}
+    for runbook in runbooks.values():
+        if runbook.runbook_id in deny_runbooks:
+            reasons[runbook.runbook_id] = f"Runbook {runbook.runbook_id} is not allowed{scope}"
+        elif runbook.risk_level in deny_risk_levels:
+            reasons[runbook.runbook_id] = (
+                f"Runbook {runbook.runbook_id} is {runbook.risk_level}-risk and not auto-executable{scope}"
+            )
+        elif runbook.domain in deny_domains:
+            reasons[runbook.runbook_id] = (
+                f"Runbook {runbook.runbook_id} ({runbook.domain}) is not allowed{scope}"
+            )
+    return reasons
+
+def compile_policy(catalog: dict, rules: dict) -> CompiledPolicy:
+    runbooks = {runbook_id: RunbookPolicy(runbook_id, meta) for runbook_id, meta in catalog.items()}
+
+    denied = _deny_reasons(rules, runbooks, "")
+    for domain, rule in rules.get("domains", {}).items():
+        in_domain = {k: v for k, v in runbooks.items() if v.domain == domain}
+        for runbook_id, reason in _deny_reasons(rule, in_domain, f" in the {domain} domain").items():
+            denied.setdefault(runbook_id, reason)
+
+    denied_by_role = {
+        role.lower(): _deny_reasons(rule, runbooks, f" for role {role}")
+        for role, rule in rules.get("roles", {}).items()
+    }
+    return CompiledPolicy(runbooks, denied, denied_by_role)
+
+def load_policy_rules(path: str = POLICY_PATH) -> dict:
+    # The rules file is optional; the catalog alone is a valid policy
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+class PolicyEngine:
+    def __init__(self, catalog_path: str = CATALOG_PATH, rules_path: str = POLICY_PATH,
+                 reload_seconds: float = None, clock=time.monotonic):
+        self.catalog_path = catalog_path
+        self.rules_path = rules_path
+        self.reload_seconds = settings.SAFETY_POLICY_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        self.reloads = 0
+        self._clock = clock
+        self._reload_lock = threading.Lock()
+        self._mtimes = self._stat()
+        self.policy = self._compile()
+        self._next_check = clock() + self.reload_seconds
+
+    def _stat(self) -> Tuple[Optional[int], ...]:
+        return tuple(
+            os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            for path in (self.catalog_path, self.rules_path)
+        )
+
+    def _compile(self) -> CompiledPolicy:
+        return compile_policy(load_runbook_catalog(self.catalog_path), load_policy_rules(self.rules_path))
+
+    def current(self) -> CompiledPolicy:
+        """The live policy, recompiled first if a source file changed."""
+        if self.reload_seconds > 0 and self._clock() >= self._next_check:
+            # Whoever gets the lock checks; everyone else carries on with the current policy
+            if self._reload_lock.acquire(blocking=False):
+                try:
+                    self._next_check = self._clock() + self.reload_seconds
+                    self._maybe_reload()
+                finally:
+                    self._reload_lock.release()
+        return self.policy
+
+    def _maybe_reload(self) -> None:
+        mtimes = self._stat()
+        if mtimes == self._mtimes:
+            return
+        # Remember the attempt either way so a broken file is reported once per save
+        self._mtimes = mtimes
+        try:
+            self.policy = self._compile()
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error("Safety policy reload failed, keeping previous policy: %s", e)
+            return
+        self.reloads += 1
+        logger.info("Safety policy reloaded (%d runbooks)", len(self.policy.runbooks))
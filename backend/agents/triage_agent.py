@@ -1,7 +1,9 @@
 from backend.agents.base_agent import BaseAgent
-from backend.models.intent import IntentResult
-from backend.utils.llm_client import call_llm
-import json
+from backend.models.intent import IntentClassification, IntentResult
+from backend.agents.triage_fastpath import FastPathClassifier
+from backend.config import settings
+from backend.utils.llm_client import call_llm, call_llm_async
+from backend.utils.structured_output import parse_output, response_format_for
 
 TRIAGE_SYSTEM_PROMPT = """
 You are an intent classification assistant for an internal service desk.
@@ -32,29 +34,57 @@ class TriageAgent(BaseAgent):
     name = "triage"
 
     def describe(self) -> str:
-        return "Classifies user intent and domain using an LLM."
+        return "Classifies user intent and domain using a local fast path, then an LLM."
+
+    def __init__(self):
+        self.fast_path = FastPathClassifier()
 
     def infer_intent(self, user_id: str, message: str) -> IntentResult:
-        user_prompt = f"User message: {message}"
+        fast = self.classify_locally(user_id, message)
+        if fast is not None:
+            return fast
+        return self.infer_intent_llm(user_id, message)
+
+    async def infer_intent_async(self, user_id: str, message: str) -> IntentResult:
+        fast = self.classify_locally(user_id, message)
+        if fast is not None:
+            return fast
+        return await self.infer_intent_llm_async(user_id, message)
+
+    def classify_locally(self, user_id: str, message: str):
+        """Fast-path result, or None when the LLM is needed."""
+        if not settings.TRIAGE_FASTPATH_ENABLED:
+            return None
+        result, _ = self.fast_path.classify(user_id, message)
+        return result
+
+    def local_priority(self, intent, message: str) -> tuple:
+        """(urgency, domain) for admission control, from the fast-path result when there is one."""
+        if intent is not None:
+            return intent.urgency, intent.domain
+        return ("high" if self.fast_path.is_urgent(message) else "normal"), "general"
+
+    def infer_intent_llm(self, user_id: str, message: str) -> IntentResult:
+        raw = call_llm(TRIAGE_SYSTEM_PROMPT, self._build_prompt(message), allow_near_duplicate=True,
+                       response_format=response_format_for(IntentClassification))
+        return self._parse_intent(user_id, message, raw)
+
+    async def infer_intent_llm_async(self, user_id: str, message: str) -> IntentResult:
+        raw = await call_llm_async(TRIAGE_SYSTEM_PROMPT, self._build_prompt(message), allow_near_duplicate=True,
+                                   response_format=response_format_for(IntentClassification))
+        return self._parse_intent(user_id, message, raw)
+
+    def fast_path_stats(self) -> dict:
+        stats = self.fast_path.stats()
+        stats["enabled"] = settings.TRIAGE_FASTPATH_ENABLED
+        return stats
 
-        raw = call_llm(TRIAGE_SYSTEM_PROMPT, user_prompt)
+    def _build_prompt(self, message: str) -> str:
+        return f"User message: {message}"
 
-        try:
-            data = json.loads(raw)
-        except Exception:
+    def _parse_intent(self, user_id: str, message: str, raw: str) -> IntentResult:
+        parsed = parse_output(IntentClassification, raw, self.name)
+        if parsed is None:
             # fallback if the LLM misbehaves
-            data = {
-                "intent": "unknown",
-                "domain": "general",
-                "urgency": "normal",
-                "confidence": 0.3,
-            }
-
-        return IntentResult(
-            user_id=user_id,
-            raw_message=message,
-            intent=data.get("intent", "unknown"),
-            domain=data.get("domain", "general"),
-            confidence=float(data.get("confidence", 0.3)),
-            urgency=data.get("urgency", "normal"),
-        )
+            parsed = IntentClassification(intent="unknown", domain="general", urgency="normal", confidence=0.3)
+        return parsed.to_result(user_id, message)
@@ -0,0 +1,187 @@
+"""
+Local first-stage intent classifier used by TriageAgent before the LLM.
+
+Two layers, both driven by backend/config/triage_fastpath.json:
+- regex rules for unambiguous phrasings ("locked out", "how much PTO"),
+- a hashed n-gram TF-IDF nearest-exemplar model for paraphrases, scored
+  below the rules and lower still for fragments that share few words with
+  the matched exemplar ("my account").
+
+Only results at or above settings.TRIAGE_FASTPATH_THRESHOLD are used;
+everything else falls back to the LLM.
+"""
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from backend.config import settings
+from backend.models.intent import IntentResult
+
+CONFIG_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "config", "triage_fastpath.json")
+)
+
+N_FEATURES = 2 ** 18
+RULE_CONFIDENCE = 0.95
+# Softmax temperature over exemplar similarities, and the similarity at which
+# the model is considered to have "seen" the phrasing.
+SOFTMAX_TEMPERATURE = 0.1
+SIMILARITY_FLOOR = 0.6
+# The model never outranks a rule, and needs this many words in common with
+# the matched exemplar for full confidence.
+MODEL_CONFIDENCE_CAP = 0.9
+MIN_SHARED_WORDS = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("’", "'").strip()
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(_normalize(text))
+
+def _features(text: str) -> List[str]:
+    tokens = _tokens(text)
+    feats = [f"w:{t}" for t in tokens]
+    feats += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for t in tokens:
+        padded = f"<{t}>"
+        feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return feats
+
+def _hash(feature: str) -> int:
+    # crc32 is stable across processes, unlike the builtin hash()
+    return zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+
+def _term_counts(text: str) -> Dict[int, int]:
+    counts: Dict[int, int] = {}
+    for f in _features(text):
+        h = _hash(f)
+        counts[h] = counts.get(h, 0) + 1
+    return counts
+
+class FastPathClassifier:
+    def __init__(self, config_path: str = CONFIG_PATH):
+        with open(config_path, "r") as f:
+            config = json.load(f)
+
+        self.intents: Dict[str, dict] = config.get("intents", {})
+        self.urgent_patterns = [re.compile(p) for p in config.get("urgent_patterns", [])]
+        self.rules: List[Tuple[str, re.Pattern]] = [
+            (intent, re.compile(p))
+            for intent, meta in self.intents.items()
+            for p in meta.get("patterns", [])
+        ]
+
+        examples = [
+            (intent, text)
+            for intent, meta in self.intents.items()
+            for text in meta.get("examples", [])
+        ]
+        docs = [_term_counts(text) for _, text in examples]
+
+        # Smoothed IDF over the exemplar set
+        df: Dict[int, int] = {}
+        for doc in docs:
+            for h in doc:
+                df[h] = df.get(h, 0) + 1
+        n_docs = len(docs)
+        self.idf = {h: math.log((1 + n_docs) / (1 + c)) + 1.0 for h, c in df.items()}
+        self.default_idf = math.log(1 + n_docs) + 1.0
+
+        self.exemplars: List[Tuple[str, Dict[int, float], FrozenSet[str]]] = [
+            (intent, self._vectorize(doc), frozenset(_tokens(text))) for (intent, text), doc in zip(examples, docs)
+        ]
+
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "rule_hits": 0, "model_hits": 0, "llm_fallbacks": 0}
+
+    def _vectorize(self, counts: Dict[int, int]) -> Dict[int, float]:
+        vec = {
+            h: (1.0 + math.log(c)) * self.idf.get(h, self.default_idf)
+            for h, c in counts.items()
+        }
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {h: v / norm for h, v in vec.items()}
+
+    def _match_rules(self, text: str) -> Optional[str]:
+        matched = {intent for intent, pattern in self.rules if pattern.search(text)}
+        # Conflicting rules are ambiguous; let the model (or the LLM) decide
+        return matched.pop() if len(matched) == 1 else None
+
+    def _score_model(self, text: str) -> Tuple[Optional[str], float]:
+        query = self._vectorize(_term_counts(text))
+        best: Dict[str, float] = {}
+        best_words: Dict[str, FrozenSet[str]] = {}
+        for intent, vec, words in self.exemplars:
+            sim = sum(w * vec.get(h, 0.0) for h, w in query.items())
+            if sim > best.get(intent, -1.0):
+                best[intent] = sim
+                best_words[intent] = words
+        if not best:
+            return None, 0.0
+
+        top_intent = max(best, key=best.get)
+        top_sim = best[top_intent]
+        # Softmax over per-intent similarity gives the share of evidence for the
+        # winner; scaling by similarity strength keeps unseen phrasings low, and
+        # by shared words keeps fragments that happen to sit inside one exemplar low.
+        exps = {i: math.exp((s - top_sim) / SOFTMAX_TEMPERATURE) for i, s in best.items()}
+        prob = exps[top_intent] / sum(exps.values())
+        strength = min(1.0, max(top_sim, 0.0) / SIMILARITY_FLOOR)
+        shared = len(set(_tokens(text)) & best_words[top_intent])
+        coverage = min(1.0, shared / MIN_SHARED_WORDS)
+        return top_intent, min(MODEL_CONFIDENCE_CAP, prob * strength * coverage)
+
+    def is_urgent(self, message: str) -> bool:
+        """Whether the message says it's urgent ("asap", "right now"...), whatever the intent."""
+        text = _normalize(message)
+        return any(p.search(text) for p in self.urgent_patterns)
+
+    def _urgency(self, intent: str, text: str) -> str:
+        if self.is_urgent(text):
+            return "high"
+        return self.intents[intent].get("urgency", "normal")
+
+    def classify(self, user_id: str, message: str) -> Tuple[Optional[IntentResult], float]:
+        """
+        Return (IntentResult, confidence). The result is None when the fast path
+        is not confident enough and the caller should fall back to the LLM.
+        """
+        text = _normalize(message)
+
+        intent = self._match_rules(text)
+        confidence = RULE_CONFIDENCE if intent else 0.0
+        source = "rule_hits"
+        if intent is None:
+            intent, confidence = self._score_model(text)
+            source = "model_hits"
+
+        accepted = intent is not None and confidence >= settings.TRIAGE_FASTPATH_THRESHOLD
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters[source if accepted else "llm_fallbacks"] += 1
+
+        if not accepted:
+            return None, confidence
+
+        return IntentResult(
+            user_id=user_id,
+            raw_message=message,
+            intent=intent,
+            domain=self.intents[intent].get("domain", "general"),
+            confidence=round(confidence, 3),
+            urgency=self._urgency(intent, text),
+        ), confidence
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters["rule_hits"] + counters["model_hits"]
+        counters["fast_path_hits"] = hits
+        counters["hit_rate"] = hits / counters["requests"] if counters["requests"] else 0.0
+        return counters
@@ -0,0 +1,11 @@
+import json
+import os
+from typing import Any, Dict
+
+CATALOG_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "runbook_catalog.json")
+)
+
+def load_runbook_catalog(path: str = CATALOG_PATH) -> Dict[str, Any]:
+    with open(path, "r") as f:
+        return json.load(f)
@@ -19,14 +19,181 @@ GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 # Service Configuration
 TICKETING_SYSTEM_URL = os.getenv('TICKETING_SYSTEM_URL', 'http://localhost:9000')
 DIRECTORY_SERVICE_URL = os.getenv('DIRECTORY_SERVICE_URL', 'http://localhost:9001')
+# "fake" keeps the built-in stub data; "http" calls the URLs above
+DIRECTORY_BACKEND = os.getenv('DIRECTORY_BACKEND', 'fake')
+# "local" keeps tickets in the built-in ticket store below; "http" calls the URL above
+TICKETING_BACKEND = os.getenv('TICKETING_BACKEND', 'local')
+# Built-in ticket store: "sqlite" (persistent, shared by workers on one host) or "memory"
+TICKET_STORE_BACKEND = os.getenv('TICKET_STORE_BACKEND', 'sqlite')
+TICKET_STORE_SQLITE_PATH = os.getenv('TICKET_STORE_SQLITE_PATH', 'tickets.db')
+# Repeat escalations attach to the user's open ticket for the same intent when the
+# message matches within the window: same normalized text, or content-token (stopwords
+# dropped) Jaccard >= threshold with at least TICKET_DEDUP_MIN_OVERLAP content tokens shared
+TICKET_DEDUP_ENABLED = os.getenv('TICKET_DEDUP_ENABLED', 'true').lower() == 'true'
+TICKET_DEDUP_THRESHOLD = float(os.getenv('TICKET_DEDUP_THRESHOLD', '0.75'))
+TICKET_DEDUP_MIN_OVERLAP = int(os.getenv('TICKET_DEDUP_MIN_OVERLAP', '2'))
+TICKET_DEDUP_WINDOW_SECONDS = float(os.getenv('TICKET_DEDUP_WINDOW_SECONDS', '86400'))
+
+# User profile cache in front of the directory service
+PROFILE_CACHE_ENABLED = os.getenv('PROFILE_CACHE_ENABLED', 'true').lower() == 'true'
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv('PROFILE_CACHE_MAX_ENTRIES', '10000'))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv('PROFILE_CACHE_TTL_SECONDS', '300'))
+
+# Pooled HTTP client shared by backend service clients
+SERVICE_HTTP2 = os.getenv('SERVICE_HTTP2', 'true').lower() == 'true'
+SERVICE_TIMEOUT_SECONDS = float(os.getenv('SERVICE_TIMEOUT_SECONDS', '10'))
+SERVICE_CONNECT_TIMEOUT_SECONDS = float(os.getenv('SERVICE_CONNECT_TIMEOUT_SECONDS', '3'))
+SERVICE_MAX_CONNECTIONS = int(os.getenv('SERVICE_MAX_CONNECTIONS', '100'))
+SERVICE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('SERVICE_MAX_KEEPALIVE_CONNECTIONS', '20'))
+SERVICE_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('SERVICE_KEEPALIVE_EXPIRY_SECONDS', '30'))
+SERVICE_MAX_RETRIES = int(os.getenv('SERVICE_MAX_RETRIES', '3'))
+SERVICE_RETRY_BASE_BACKOFF_SECONDS = float(os.getenv('SERVICE_RETRY_BASE_BACKOFF_SECONDS', '0.1'))
+SERVICE_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv('SERVICE_RETRY_MAX_BACKOFF_SECONDS', '2'))
+
+# Startup: warm agents, LLM clients, process pool and knowledge index in the lifespan hook;
+# STARTUP_PRECONNECT also opens connections to the LLM deployments and http backends
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'true').lower() == 'true'
+STARTUP_PRECONNECT = os.getenv('STARTUP_PRECONNECT', 'false').lower() == 'true'
+
+# Admission control in front of the chat pipeline (see backend/orchestrator/admission.py).
+# Per-urgency values are "high:..,normal:..,low:.."; domain weights e.g. "it:2,hr:1" (others 1)
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', '32'))  # pipeline runs in flight
+ADMISSION_URGENCY_WEIGHTS = os.getenv('ADMISSION_URGENCY_WEIGHTS', 'high:8,normal:3,low:1')
+ADMISSION_DOMAIN_WEIGHTS = os.getenv('ADMISSION_DOMAIN_WEIGHTS', '')
+ADMISSION_QUEUE_LIMITS = os.getenv('ADMISSION_QUEUE_LIMITS', 'high:256,normal:128,low:64')
+ADMISSION_MAX_WAIT_SECONDS = os.getenv('ADMISSION_MAX_WAIT_SECONDS', 'high:15,normal:8,low:4')
+# Per user: runs in flight (more wait their turn) and requests waiting (more are rejected)
+ADMISSION_USER_MAX_CONCURRENCY = int(os.getenv('ADMISSION_USER_MAX_CONCURRENCY', '4'))
+ADMISSION_USER_MAX_QUEUED = int(os.getenv('ADMISSION_USER_MAX_QUEUED', '8'))
+# Separate budget for /chat/batch replays: runs in flight across all batches (no per-user
+# limits or wait budgets; records wait for a slot instead of being shed)
+ADMISSION_BATCH_MAX_CONCURRENCY = int(os.getenv('ADMISSION_BATCH_MAX_CONCURRENCY', '16'))
+# Shed requests get "reject" (HTTP 503/429 with Retry-After) or "degrade" (a rule-based reply)
+ADMISSION_SHED_RESPONSE = os.getenv('ADMISSION_SHED_RESPONSE', 'reject')
 
 # Application Settings
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 
+# Attach per-step duration_ms to activity_log entries
+ACTIVITY_LOG_TIMINGS = os.getenv('ACTIVITY_LOG_TIMINGS', 'true').lower() == 'true'
+
+# Triage fast path (local classifier before the LLM)
+TRIAGE_FASTPATH_ENABLED = os.getenv('TRIAGE_FASTPATH_ENABLED', 'true').lower() == 'true'
+TRIAGE_FASTPATH_THRESHOLD = float(os.getenv('TRIAGE_FASTPATH_THRESHOLD', '0.85'))
+
+# Fused mode: one LLM call returns both triage and plan (falls back to two stages)
+FUSED_TRIAGE_PLANNING = os.getenv('FUSED_TRIAGE_PLANNING', 'false').lower() == 'true'
+
+# Planner: use declarative plan templates (config/plan_templates.json) for known intents
+PLAN_TEMPLATES_ENABLED = os.getenv('PLAN_TEMPLATES_ENABLED', 'true').lower() == 'true'
+
+# Runbook execution: shared worker pool and default per-runbook timeout
+RUNBOOK_MAX_WORKERS = int(os.getenv('RUNBOOK_MAX_WORKERS', '16'))
+RUNBOOK_DEFAULT_TIMEOUT_SECONDS = float(os.getenv('RUNBOOK_DEFAULT_TIMEOUT_SECONDS', '30'))
+# Runbooks are discovered in backend/runbooks/ and this entry-point group (empty = off)
+RUNBOOK_ENTRY_POINT_GROUP = os.getenv('RUNBOOK_ENTRY_POINT_GROUP', 'smartdesk.runbooks')
+# Check inputs against each catalog entry's input_schema before running
+RUNBOOK_VALIDATE_INPUTS = os.getenv('RUNBOOK_VALIDATE_INPUTS', 'true').lower() == 'true'
+# Worker processes for runbooks marked "isolation": "process" in the catalog
+RUNBOOK_PROCESS_WORKERS = int(os.getenv('RUNBOOK_PROCESS_WORKERS', '2'))
+RUNBOOK_PROCESS_MEMORY_MB = int(os.getenv('RUNBOOK_PROCESS_MEMORY_MB', '1024'))  # 0 = no limit
+RUNBOOK_PROCESS_MAX_TASKS = int(os.getenv('RUNBOOK_PROCESS_MAX_TASKS', '100'))  # replace workers after N runs
+# Background jobs for runbooks marked "async" in runbook_catalog.json
+# (off = they run inline like the rest). ":memory:" keeps the queue in-process only
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'true').lower() == 'true'
+JOB_QUEUE_SQLITE_PATH = os.getenv('JOB_QUEUE_SQLITE_PATH', 'jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv('JOB_POLL_INTERVAL_SECONDS', '1'))
+# How often running jobs' leases are renewed; keep well below the shortest timeout_seconds
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '3'))
+# Defaults when the catalog entry has no max_attempts / timeout_seconds
+# (max_attempts only applies to runbooks marked "idempotent"; others run once)
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv('JOB_VISIBILITY_TIMEOUT_SECONDS', '60'))
+# Retry n waits JOB_RETRY_BACKOFF_SECONDS * 2^(n-1)
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv('JOB_RETRY_BACKOFF_SECONDS', '2'))
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', str(7 * 86400)))
+
+# LLM response cache (triage / planner calls run at temperature=0)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2048'))
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', '3600'))
+LLM_CACHE_SQLITE_PATH = os.getenv('LLM_CACHE_SQLITE_PATH', '')  # empty = memory only
+LLM_CACHE_NEAR_DUPLICATE_THRESHOLD = float(os.getenv('LLM_CACHE_NEAR_DUPLICATE_THRESHOLD', '0'))  # 0 = off
+
+# LLM client resilience. LLM_DEPLOYMENTS is a JSON list of
+# {"name", "endpoint", "deployment", "api_key", "api_version", "weight", "rpm", "tpm"};
+# empty = the single AZURE_OPENAI_* deployment above
+LLM_DEPLOYMENTS = os.getenv('LLM_DEPLOYMENTS', '')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '32'))  # 0 = unlimited
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BASE_BACKOFF_SECONDS = float(os.getenv('LLM_RETRY_BASE_BACKOFF_SECONDS', '0.5'))
+LLM_RETRY_MAX_WAIT_SECONDS = float(os.getenv('LLM_RETRY_MAX_WAIT_SECONDS', '20'))
+# Default per-deployment quotas (Azure RPM/TPM); 0 = unlimited
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '0'))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '0'))
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv('LLM_EXPECTED_COMPLETION_TOKENS', '300'))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30'))
+# Output format requested from the LLM: json_schema (structured outputs),
+# json_object (plain JSON mode) or none
+LLM_RESPONSE_FORMAT = os.getenv('LLM_RESPONSE_FORMAT', 'json_schema')
+# Per-call input budget (system + user prompt) for context-carrying prompts
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv('LLM_PROMPT_TOKEN_BUDGET', '1500'))
+
+# Conversation sessions (opt-in per request via session_id): "memory" or "sqlite"
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', '1800'))
+SESSION_MAX_ENTRIES = int(os.getenv('SESSION_MAX_ENTRIES', '10000'))
+SESSION_SQLITE_PATH = os.getenv('SESSION_SQLITE_PATH', 'sessions.db')
+# Short messages like "what about next month?" reuse the session's intent
+SESSION_FOLLOW_UP_MAX_WORDS = int(os.getenv('SESSION_FOLLOW_UP_MAX_WORDS', '8'))
+# Below this triage confidence, a session turn gets a clarifying question first
+CLARIFICATION_MIN_CONFIDENCE = float(os.getenv('CLARIFICATION_MIN_CONFIDENCE', '0.5'))
+
+# Knowledge base answering policy questions (see backend/services/knowledge_index.py)
+KNOWLEDGE_ENABLED = os.getenv('KNOWLEDGE_ENABLED', 'true').lower() == 'true'
+KNOWLEDGE_INTENTS = [i.strip() for i in os.getenv('KNOWLEDGE_INTENTS', 'hr_policy_question').split(',') if i.strip()]
+KNOWLEDGE_DOCS_DIR = os.getenv('KNOWLEDGE_DOCS_DIR', str(project_root / "backend" / "knowledge_base"))
+KNOWLEDGE_INDEX_DIR = os.getenv('KNOWLEDGE_INDEX_DIR', 'knowledge_index')
+# "hashing" (local, CPU-only) or "azure_openai" (KNOWLEDGE_EMBEDDING_DEPLOYMENT)
+KNOWLEDGE_EMBEDDER = os.getenv('KNOWLEDGE_EMBEDDER', 'hashing')
+KNOWLEDGE_EMBEDDING_DEPLOYMENT = os.getenv('KNOWLEDGE_EMBEDDING_DEPLOYMENT', 'text-embedding-3-small')
+KNOWLEDGE_EMBEDDING_DIM = int(os.getenv('KNOWLEDGE_EMBEDDING_DIM', '512'))
+KNOWLEDGE_CHUNK_WORDS = int(os.getenv('KNOWLEDGE_CHUNK_WORDS', '200'))
+KNOWLEDGE_CHUNK_OVERLAP_WORDS = int(os.getenv('KNOWLEDGE_CHUNK_OVERLAP_WORDS', '40'))
+KNOWLEDGE_TOP_K = int(os.getenv('KNOWLEDGE_TOP_K', '3'))
+KNOWLEDGE_MIN_SCORE = float(os.getenv('KNOWLEDGE_MIN_SCORE', '0.2'))
+# Compose answers with the LLM from the retrieved excerpts; false = quote the best excerpt
+KNOWLEDGE_LLM_ANSWERS = os.getenv('KNOWLEDGE_LLM_ANSWERS', 'true').lower() == 'true'
+# How often the docs directory is checked for changes (0 = only at first use)
+KNOWLEDGE_RESYNC_SECONDS = float(os.getenv('KNOWLEDGE_RESYNC_SECONDS', '60'))
+
 # Safety & Compliance
 MAX_AUTO_EXECUTE_ACTIONS = int(os.getenv('MAX_AUTO_EXECUTE_ACTIONS', '3'))
 REQUIRE_APPROVAL_FOR_SENSITIVE = os.getenv('REQUIRE_APPROVAL_FOR_SENSITIVE', 'true').lower() == 'true'
+# How often the safety policy files are checked for changes (0 = never reload)
+SAFETY_POLICY_RELOAD_SECONDS = float(os.getenv('SAFETY_POLICY_RELOAD_SECONDS', '2'))
+# Per-user runbook quota counters: "memory", "sqlite" or "redis"
+SAFETY_QUOTA_BACKEND = os.getenv('SAFETY_QUOTA_BACKEND', 'memory')
+SAFETY_QUOTA_WINDOW_SECONDS = float(os.getenv('SAFETY_QUOTA_WINDOW_SECONDS', '86400'))
+SAFETY_QUOTA_SQLITE_PATH = os.getenv('SAFETY_QUOTA_SQLITE_PATH', 'safety_quotas.db')
+SAFETY_QUOTA_REDIS_URL = os.getenv('SAFETY_QUOTA_REDIS_URL', 'redis://localhost:6379/0')
+
+# Audit log of pipeline runs (batched, append-only JSONL segments + SQLite index)
+AUDIT_LOG_ENABLED = os.getenv('AUDIT_LOG_ENABLED', 'true').lower() == 'true'
+AUDIT_LOG_DIR = os.getenv('AUDIT_LOG_DIR', 'audit_logs')
+AUDIT_BUFFER_SIZE = int(os.getenv('AUDIT_BUFFER_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '256'))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv('AUDIT_FLUSH_INTERVAL_SECONDS', '0.5'))
+AUDIT_SEGMENT_MAX_BYTES = int(os.getenv('AUDIT_SEGMENT_MAX_BYTES', str(64 * 1024 * 1024)))
+AUDIT_SEGMENT_MAX_SECONDS = float(os.getenv('AUDIT_SEGMENT_MAX_SECONDS', '3600'))
+AUDIT_FSYNC = os.getenv('AUDIT_FSYNC', 'true').lower() == 'true'
+# How long a request waits for buffer space before its record is dropped
+AUDIT_BLOCK_TIMEOUT_SECONDS = float(os.getenv('AUDIT_BLOCK_TIMEOUT_SECONDS', '2'))
 
 def validate_config():
     """Validate that required configuration is present."""
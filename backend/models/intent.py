@@ -1,4 +1,5 @@
-from pydantic import BaseModel 
+from pydantic import BaseModel, ConfigDict
+from typing import Literal
 
 class IntentResult(BaseModel): 
     user_id: str 
@@ -8,4 +9,21 @@ class IntentResult(BaseModel):
     confidence: float
     urgency: str 
 
-    
\ No newline at end of file
+class IntentClassification(BaseModel):
+    """What the LLM returns for triage; IntentResult adds the user and message."""
+    model_config = ConfigDict(extra="forbid")
+
+    intent: str
+    domain: Literal["it", "hr", "finance", "facilities", "general"]
+    urgency: Literal["low", "normal", "high"]
+    confidence: float
+
+    def to_result(self, user_id: str, raw_message: str) -> IntentResult:
+        return IntentResult(
+            user_id=user_id,
+            raw_message=raw_message,
+            intent=self.intent,
+            domain=self.domain,
+            confidence=min(max(self.confidence, 0.0), 1.0),
+            urgency=self.urgency,
+        )
@@ -1,11 +1,26 @@
 from pydantic import BaseModel 
-from typing import List, Dict, Any 
+from typing import List, Dict, Any, Optional 
+
+class ActionCondition(BaseModel):
+    """Run an action only if an earlier runbook's result matches."""
+    runbook_id: str
+    field: str  # dotted path into that runbook's result, e.g. "details.account_status"
+    one_of: List[Any]
+
+    def is_met(self, results_by_runbook: Dict[str, dict]) -> bool:
+        value: Any = results_by_runbook.get(self.runbook_id)
+        for part in self.field.split("."):
+            if not isinstance(value, dict):
+                return False
+            value = value.get(part)
+        return value in self.one_of
 
 class PlanAction(BaseModel): 
     runbook_id: str 
     inputs: Dict[str, Any] 
+    when: Optional[ActionCondition] = None
+    depends_on: List[str] = []  # runbook_ids of earlier actions that must finish first
 
 class PlanResult(BaseModel): 
     actions: List[PlanAction] 
     requires_human_approval: bool = False 
-    
\ No newline at end of file
@@ -0,0 +1,343 @@
+"""
+Admission control in front of the chat pipeline.
+
+A pipeline run holds the scarce capacity for its whole length: LLM calls
+(bounded by LLM_MAX_CONCURRENCY and the deployments' quotas) and runbook
+workers. At most ADMISSION_MAX_CONCURRENCY runs are admitted at once; the
+rest wait in bounded per-urgency queues and are admitted in weighted-fair
+order:
+- each (urgency, domain) pair is a flow weighted by its urgency weight times
+  its domain weight. Backlogged flows are served in proportion to their
+  weights (start-time fair queueing), so under load high urgency goes first
+  but low urgency is never starved,
+- a user has at most ADMISSION_USER_MAX_CONCURRENCY runs in flight; their
+  other requests wait without holding up anyone else's,
+- urgency and domain come from the local triage fast path, since the LLM
+  triage is itself part of the work being scheduled. Messages it doesn't
+  recognize are "normal" ("high" if they say it's urgent) and "general".
+
+A request is shed (AdmissionRejected) instead of queued when its urgency's
+queue is full, when its user already has ADMISSION_USER_MAX_QUEUED requests
+waiting, or when its predicted wait (requests ahead of it x recent run time /
+slots) exceeds its urgency's wait budget. A queued request that waits out its
+whole budget is shed then. retry_after estimates when the queue will have
+drained.
+
+/chat/batch replays go through a second controller with their own budget
+(ADMISSION_BATCH_MAX_CONCURRENCY runs) instead: a replay is many records
+from few users, already bounded by its own concurrency, so the per-user
+limits and wait budgets meant for interactive traffic would only shed it.
+Batch records wait for a slot as long as it takes and are never shed.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+from backend.config import settings
+from backend.utils.metrics import ADMISSIONS, ADMISSION_WAIT
+
+URGENCIES = ("high", "normal", "low")
+DEFAULT_URGENCY_WEIGHTS = {"high": 8.0, "normal": 3.0, "low": 1.0}
+DEFAULT_QUEUE_LIMITS = {"high": 256, "normal": 128, "low": 64}
+DEFAULT_MAX_WAIT_SECONDS = {"high": 15.0, "normal": 8.0, "low": 4.0}
+# Weight of the latest run in the moving average used to predict waits
+RUN_TIME_ALPHA = 0.2
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"high:8,normal:3" -> {"high": 8.0, "normal": 3.0}."""
+    weights = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, value = part.partition(":")
+            weights[name.strip()] = float(value)
+    return weights
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, reason: str, urgency: str, domain: str, retry_after: int):
+        super().__init__(f"Too many requests ({reason}); retry in {retry_after}s")
+        self.reason = reason
+        self.urgency = urgency
+        self.domain = domain
+        self.retry_after = retry_after
+
+    @property
+    def user_limited(self) -> bool:
+        """Shed because of the user's own backlog rather than overall load."""
+        return self.reason == "user_queue_full"
+
+    def details(self) -> dict:
+        return {"shed": self.reason, "urgency": self.urgency, "domain": self.domain,
+                "retry_after_seconds": self.retry_after}
+
+class _Waiter:
+    __slots__ = ("user_id", "urgency", "domain", "enqueued", "start", "granted", "granted_at", "cancelled",
+                 "event", "loop", "future")
+
+    def __init__(self, user_id: str, urgency: str, domain: str, enqueued: float):
+        self.user_id = user_id
+        self.urgency = urgency
+        self.domain = domain
+        self.enqueued = enqueued
+        self.start = 0.0
+        self.granted = False
+        self.granted_at = 0.0
+        self.cancelled = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+class Admission:
+    """A held slot; release() (or leaving the `with` block) hands it to the next request."""
+
+    def __init__(self, controller: "AdmissionController", waiter: _Waiter):
+        self._controller = controller
+        self._waiter = waiter
+        self._released = False
+        self.urgency = waiter.urgency
+        self.domain = waiter.domain
+        self.waited = waiter.granted_at - waiter.enqueued
+
+    def details(self) -> dict:
+        return {"urgency": self.urgency, "domain": self.domain, "queued_ms": round(self.waited * 1000, 3)}
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self._waiter)
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = 32, urgency_weights: Optional[Dict[str, float]] = None,
+                 domain_weights: Optional[Dict[str, float]] = None,
+                 queue_limits: Optional[Dict[str, float]] = None,
+                 max_wait_seconds: Optional[Dict[str, float]] = None,
+                 user_max_concurrency: int = 4, user_max_queued: int = 8, clock=time.monotonic):
+        self.max_concurrency = max_concurrency  # 0 = unlimited
+        self.urgency_weights = {**DEFAULT_URGENCY_WEIGHTS, **(urgency_weights or {})}
+        self.domain_weights = dict(domain_weights or {})
+        self.queue_limits = {**DEFAULT_QUEUE_LIMITS, **(queue_limits or {})}  # 0 = unlimited
+        self.max_wait_seconds = {**DEFAULT_MAX_WAIT_SECONDS, **(max_wait_seconds or {})}  # 0 = no budget
+        self.user_max_concurrency = user_max_concurrency  # 0 = unlimited
+        self.user_max_queued = user_max_queued  # 0 = unlimited
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (finish tag, seq, waiter); cancelled waiters are dropped when popped
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._flow_finish: Dict[tuple, float] = {}
+        self._running = 0
+        self._queued = {urgency: 0 for urgency in URGENCIES}
+        self._user_running: Dict[str, int] = {}
+        self._user_queued: Dict[str, int] = {}
+        self._run_time: Optional[float] = None
+        self._stats = {"admitted": 0, "shed_queue_full": 0, "shed_user_queue_full": 0,
+                       "shed_wait_budget": 0, "shed_timeout": 0}
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            settings.ADMISSION_MAX_CONCURRENCY,
+            parse_weights(settings.ADMISSION_URGENCY_WEIGHTS),
+            parse_weights(settings.ADMISSION_DOMAIN_WEIGHTS),
+            {k: int(v) for k, v in parse_weights(settings.ADMISSION_QUEUE_LIMITS).items()},
+            parse_weights(settings.ADMISSION_MAX_WAIT_SECONDS),
+            settings.ADMISSION_USER_MAX_CONCURRENCY,
+            settings.ADMISSION_USER_MAX_QUEUED,
+        )
+
+    @classmethod
+    def for_batch(cls) -> "AdmissionController":
+        """Batch replay budget: fair queueing only, no per-user limits, queue limits or wait budgets."""
+        unlimited = {urgency: 0 for urgency in URGENCIES}
+        return cls(
+            settings.ADMISSION_BATCH_MAX_CONCURRENCY,
+            parse_weights(settings.ADMISSION_URGENCY_WEIGHTS),
+            parse_weights(settings.ADMISSION_DOMAIN_WEIGHTS),
+            unlimited,
+            unlimited,
+            user_max_concurrency=0,
+            user_max_queued=0,
+        )
+
+    # All underscore methods below expect self._lock to be held
+
+    def _max_wait(self, urgency: str) -> Optional[float]:
+        return self.max_wait_seconds[urgency] or None
+
+    def _has_slot(self) -> bool:
+        return self.max_concurrency <= 0 or self._running < self.max_concurrency
+
+    def _user_has_slot(self, user_id: str) -> bool:
+        return self.user_max_concurrency <= 0 or self._user_running.get(user_id, 0) < self.user_max_concurrency
+
+    def _weight(self, urgency: str, domain: str) -> float:
+        return max(self.urgency_weights.get(urgency, 1.0) * self.domain_weights.get(domain, 1.0), 1e-6)
+
+    def _predicted_wait(self, tag: float) -> Optional[float]:
+        if self._run_time is None or self.max_concurrency <= 0:
+            return None
+        ahead = sum(1 for entry in self._heap if entry[0] <= tag and not entry[2].cancelled)
+        return (ahead + 1) * self._run_time / self.max_concurrency
+
+    def _retry_after(self, urgency: str) -> int:
+        if self._run_time is None or self.max_concurrency <= 0:
+            seconds = self.max_wait_seconds[urgency] or 1
+        else:
+            seconds = (sum(self._queued.values()) + 1) * self._run_time / self.max_concurrency
+        return max(1, math.ceil(seconds))
+
+    def _reject(self, waiter: _Waiter, reason: str) -> AdmissionRejected:
+        self._stats[f"shed_{reason}"] += 1
+        ADMISSIONS.labels(urgency=waiter.urgency, result=reason).inc()
+        return AdmissionRejected(reason, waiter.urgency, waiter.domain, self._retry_after(waiter.urgency))
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        urgency = waiter.urgency
+        if 0 < self.queue_limits[urgency] <= self._queued[urgency]:
+            raise self._reject(waiter, "queue_full")
+        if 0 < self.user_max_queued <= self._user_queued.get(waiter.user_id, 0):
+            raise self._reject(waiter, "user_queue_full")
+        flow = (urgency, waiter.domain)
+        # A flow that went idle restarts at the current virtual time instead of banking credit
+        waiter.start = max(self._virtual_time, self._flow_finish.get(flow, 0.0))
+        tag = waiter.start + 1.0 / self._weight(urgency, waiter.domain)
+        budget = self._max_wait(urgency)
+        if budget is not None and not self._has_slot():
+            predicted = self._predicted_wait(tag)
+            if predicted is not None and predicted > budget:
+                raise self._reject(waiter, "wait_budget")
+        self._flow_finish[flow] = tag
+        heapq.heappush(self._heap, (tag, next(self._seq), waiter))
+        self._queued[urgency] += 1
+        self._user_queued[waiter.user_id] = self._user_queued.get(waiter.user_id, 0) + 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        deferred = []
+        while self._heap and self._has_slot():
+            entry = heapq.heappop(self._heap)
+            waiter = entry[2]
+            if waiter.cancelled:
+                continue
+            if not self._user_has_slot(waiter.user_id):
+                deferred.append(entry)
+                continue
+            self._virtual_time = max(self._virtual_time, waiter.start)
+            self._unqueue(waiter)
+            waiter.granted = True
+            waiter.granted_at = self._clock()
+            self._running += 1
+            self._user_running[waiter.user_id] = self._user_running.get(waiter.user_id, 0) + 1
+            if waiter.event is not None:
+                waiter.event.set()
+            elif waiter.loop is not None:
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+    def _unqueue(self, waiter: _Waiter) -> None:
+        self._queued[waiter.urgency] -= 1
+        left = self._user_queued[waiter.user_id] - 1
+        if left:
+            self._user_queued[waiter.user_id] = left
+        else:
+            del self._user_queued[waiter.user_id]
+
+    def _release_locked(self, waiter: _Waiter) -> None:
+        self._running -= 1
+        left = self._user_running[waiter.user_id] - 1
+        if left:
+            self._user_running[waiter.user_id] = left
+        else:
+            del self._user_running[waiter.user_id]
+        run_time = self._clock() - waiter.granted_at
+        self._run_time = run_time if self._run_time is None else (
+            RUN_TIME_ALPHA * run_time + (1 - RUN_TIME_ALPHA) * self._run_time)
+        self._dispatch()
+
+    def _release(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._release_locked(waiter)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """The caller stopped waiting (cancelled); give back whatever it holds."""
+        with self._lock:
+            if waiter.granted:
+                self._release_locked(waiter)
+            elif not waiter.cancelled:
+                waiter.cancelled = True
+                self._unqueue(waiter)
+
+    def _new_waiter(self, user_id: str, urgency: str, domain: str) -> _Waiter:
+        return _Waiter(user_id, urgency if urgency in URGENCIES else "normal", domain or "general", self._clock())
+
+    def _admitted(self, waiter: _Waiter) -> Admission:
+        with self._lock:
+            if not waiter.granted:
+                waiter.cancelled = True
+                self._unqueue(waiter)
+                raise self._reject(waiter, "timeout")
+            self._stats["admitted"] += 1
+        admission = Admission(self, waiter)
+        ADMISSIONS.labels(urgency=waiter.urgency, result="admitted").inc()
+        ADMISSION_WAIT.labels(urgency=waiter.urgency).observe(admission.waited)
+        return admission
+
+    def admit(self, user_id: str, urgency: str, domain: str) -> Admission:
+        """Block until admitted; raises AdmissionRejected when shed."""
+        waiter = self._new_waiter(user_id, urgency, domain)
+        waiter.event = threading.Event()
+        with self._lock:
+            self._enqueue(waiter)
+        if not waiter.event.is_set():
+            waiter.event.wait(self._max_wait(waiter.urgency))
+        return self._admitted(waiter)
+
+    async def admit_async(self, user_id: str, urgency: str, domain: str) -> Admission:
+        """Wait until admitted without blocking the event loop; raises AdmissionRejected when shed."""
+        waiter = self._new_waiter(user_id, urgency, domain)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        with self._lock:
+            self._enqueue(waiter)
+        if not waiter.granted:
+            try:
+                await asyncio.wait_for(waiter.future, self._max_wait(waiter.urgency))
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        return self._admitted(waiter)
+
+    def stats(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            waiting = [entry[2] for entry in self._heap if not entry[2].cancelled]
+            return {
+                "capacity": self.max_concurrency,
+                "running": self._running,
+                "queued": sum(self._queued.values()),
+                **{f"queued_{urgency}": n for urgency, n in self._queued.items()},
+                "oldest_wait_ms": round(max((now - w.enqueued for w in waiting), default=0.0) * 1000, 1),
+                "avg_run_ms": round((self._run_time or 0.0) * 1000, 1),
+                **self._stats,
+            }
+
+# None when ADMISSION_ENABLED is false
+admission_controller = AdmissionController.from_settings() if settings.ADMISSION_ENABLED else None
+batch_admission_controller = AdmissionController.for_batch() if settings.ADMISSION_ENABLED else None
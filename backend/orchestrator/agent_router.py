@@ -1,70 +1,463 @@
-from backend.agents.triage_agent import TriageAgent
-from backend.agents.enrichment_agent import EnrichmentAgent
-from backend.agents.planner_agent import PlannerAgent
-from backend.agents.safety_agent import SafetyAgent
-from backend.agents.runbook_executor_agent import RunbookExecutorAgent
-from backend.agents.escalation_agent import EscalationAgent
+import asyncio
+import time
+from typing import Optional
+
+from backend.agents.base_agent import LazyAgent
 from backend.models.intent import IntentResult
 from backend.models.plan import PlanResult
+from backend.config import settings
+from backend.orchestrator.admission import AdmissionRejected, admission_controller, batch_admission_controller
+from backend.services.audit_log_service import record_run, record_run_async
+from backend.services.session_store import session_key, session_store
+from backend.utils.llm_client import track_usage
+from backend.utils.metrics import CHAT_REQUESTS, ESCALATIONS, LLM_REQUEST_TOKENS, SAFETY_BLOCKS, STEP_LATENCY
 
 
-triage_agent = TriageAgent()
-enrichment_agent = EnrichmentAgent()
-planner_agent = PlannerAgent()
-safety_agent = SafetyAgent()
-runbook_executor = RunbookExecutorAgent()
-escalation_agent = EscalationAgent()
-
-def handle_chat(user_id: str, message: str):
-    activity_log = []
-
-    # 1) Triage
-    intent: IntentResult = triage_agent.infer_intent(user_id, message)
-    activity_log.append({"step": "triage", "result": intent.dict()})
-
-    # 2) Enrichment (user profile, history...)
-    enriched_context = enrichment_agent.enrich(user_id, intent)
-    activity_log.append({"step": "enrichment", "result": enriched_context})
-
-    # 3) Planning (which runbooks, which checks)
-    plan: PlanResult = planner_agent.create_plan(enriched_context)
-    activity_log.append({"step": "planning", "result": plan.dict()})
-
-    # If planner already says "needs human", skip automation 
-    if plan.requires_human_approval: 
-        ticket = escalation_agent.create_ticket(user_id, message, enriched_context, plan)
-        activity_log.append({"step": "escalation", "result": ticket})
-        reply = (
-            "This request requires a human agent. "
-            f"I created a ticket for you: {ticket.get('ticket_id')}"
-        )
-        return reply, activity_log
+# Agents are imported and built on first use (or by warm_up_agents at startup)
+triage_agent = LazyAgent("backend.agents.triage_agent:TriageAgent")
+enrichment_agent = LazyAgent("backend.agents.enrichment_agent:EnrichmentAgent")
+planner_agent = LazyAgent("backend.agents.planner_agent:PlannerAgent")
+safety_agent = LazyAgent("backend.agents.safety_agent:SafetyAgent")
+runbook_executor = LazyAgent("backend.agents.runbook_executor_agent:RunbookExecutorAgent")
+escalation_agent = LazyAgent("backend.agents.escalation_agent:EscalationAgent")
+fused_agent = LazyAgent("backend.agents.fused_agent:FusedTriagePlannerAgent")
+clarification_agent = LazyAgent("backend.agents.clarification_agent:ClarificationAgent")
+knowledge_agent = LazyAgent("backend.agents.knowledge_agent:KnowledgeAgent")
+AGENTS = {
+    "triage": triage_agent,
+    "enrichment": enrichment_agent,
+    "planner": planner_agent,
+    "safety": safety_agent,
+    "runbook_executor": runbook_executor,
+    "escalation": escalation_agent,
+    "fused": fused_agent,
+    "clarification": clarification_agent,
+    "knowledge": knowledge_agent,
+}
+
+def warm_up_agents() -> dict:
+    """Build every agent now; returns seconds spent per agent (import + construction)."""
+    timings = {}
+    for name, agent in AGENTS.items():
+        started = time.perf_counter()
+        agent.get()
+        timings[name] = round(time.perf_counter() - started, 4)
+    return timings
+
+class _StepClock:
+    """
+    Times each pipeline stage as the interval since the previous step was
+    recorded, and attributes the LLM calls/tokens made in between to that step.
+    """
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        self.usage = track_usage()
+        self._seen = dict(self.usage)
+
+    def entry(self, name: str, result) -> dict:
+        now = time.perf_counter()
+        elapsed, self._last = now - self._last, now
+        STEP_LATENCY.labels(step=name).observe(elapsed)
+        entry = {"step": name, "result": result}
+        if settings.ACTIVITY_LOG_TIMINGS:
+            entry["duration_ms"] = round(elapsed * 1000, 3)
+        if self.usage["calls"] != self._seen["calls"]:
+            entry["llm_usage"] = {key: self.usage[key] - self._seen[key] for key in self.usage}
+            self._seen = dict(self.usage)
+        return entry
+
+def _count_outcome(outcome: str, usage: dict) -> None:
+    LLM_REQUEST_TOKENS.labels(direction="prompt").observe(usage["prompt_tokens"])
+    LLM_REQUEST_TOKENS.labels(direction="completion").observe(usage["completion_tokens"])
+    CHAT_REQUESTS.labels(outcome=outcome).inc()
+    if outcome == "safety_blocked":
+        SAFETY_BLOCKS.inc()
+    if outcome in ("human_approval", "safety_blocked"):
+        ESCALATIONS.labels(reason=outcome).inc()
+
+def _ticket_phrase(ticket: dict, created: str) -> str:
+    if ticket.get("follow_up"):
+        return f"I added this to your open ticket: {ticket.get('ticket_id')}"
+    return f"{created}: {ticket.get('ticket_id')}"
+
+def _human_approval_reply(ticket: dict) -> str:
+    return (
+        "This request requires a human agent. "
+        + _ticket_phrase(ticket, "I created a ticket for you")
+    )
+
+def _safety_block_reply(ticket: dict, safety_decision) -> str:
+    return (
+        "I couldn't safely automate this. "
+        + _ticket_phrase(ticket, "I created a ticket for a human to review")
+        + f" (Reason: {safety_decision.reason})"
+    )
+
+def _awaiting_confirmation(runbook_results: list) -> list:
+    return [r["runbook_id"] for r in runbook_results if r.get("status") == "awaiting_confirmation"]
+
+def _safety_entry(safety_decision) -> dict:
+    entry = {"block": safety_decision.block, "reason": safety_decision.reason}
+    if safety_decision.confirm:
+        entry["confirm"] = safety_decision.confirm
+    return entry
+
+def _shed_reply(error: AdmissionRejected) -> str:
+    return (
+        "I'm handling an unusually high number of requests right now and couldn't get to yours. "
+        f"Please try again in about {error.retry_after} second{'s' if error.retry_after != 1 else ''}."
+    )
+
+def _shed(error: AdmissionRejected, clock: _StepClock, activity_log: list) -> None:
+    """Log a shed request; re-raises unless ADMISSION_SHED_RESPONSE is "degrade"."""
+    activity_log.append(clock.entry("admission", error.details()))
+    _count_outcome("shed", clock.usage)
+    if settings.ADMISSION_SHED_RESPONSE != "degrade":
+        raise error
+
+def _degraded_reply(error: AdmissionRejected, knowledge: Optional[dict], clock: _StepClock, activity_log: list) -> str:
+    # Rule-based only: a policy question the knowledge base covers gets its best excerpt quoted
+    if knowledge is None:
+        return _shed_reply(error)
+    activity_log.append(clock.entry("knowledge", knowledge))
+    return knowledge_agent.format_reply(knowledge)
+
+def _wants_knowledge(intent: Optional[IntentResult]) -> bool:
+    return intent is not None and knowledge_agent.handles(intent)
+
+def _run_status(reply: Optional[str], activity_log: list) -> str:
+    if activity_log and activity_log[0]["step"] == "admission" and "shed" in activity_log[0]["result"]:
+        return "shed"
+    return "completed" if reply is not None else "incomplete"
+
+def _load_session(user_id: str, session_id: Optional[str]):
+    # Sessions are opt-in: without a session id every message stands alone
+    if not session_id:
+        return None, None
+    key = session_key(user_id, session_id)
+    return key, session_store.get(key) or {}
+
+def _save_session(key: Optional[str], session: Optional[dict], **state) -> None:
+    if key is None:
+        return
+    session.update(state)
+    session["turns"] = session.get("turns", 0) + 1
+    session_store.save(key, session)
+
+def _remember(key, session, intent: IntentResult, context: dict, plan: PlanResult,
+              runbook_results: list = (), pending: list = None) -> None:
+    _save_session(key, session, intent=intent.dict(), context=context, plan=plan.dict(),
+                  runbook_results=list(runbook_results), pending_confirmation=pending or None,
+                  pending_question=None)
+
+class _Io:
+    """
+    A backend call the pipeline needs made: `sync(*args)` on the sync path,
+    `await async_(*args)` on the async one (or the sync function on a worker
+    thread when it has no async twin).
+    """
 
-    # 4) Safety check
-    safety_decision = safety_agent.evaluate(plan, enriched_context)
-    activity_log.append({"step": "safety", "result": {"block": safety_decision.block, "reason": safety_decision.reason}})
-
-    if safety_decision.block:
-        # Escalate immediately
-        ticket = escalation_agent.create_ticket(user_id, message, enriched_context, plan)
-        activity_log.append({"step": "escalation", "result": ticket})
-        reply = (
-            "I couldn't safely automate this. "
-            f"I created a ticket for a human to review: {ticket.get('ticket_id')}"
-            f" (Reason: {safety_decision.reason})"
-        )
+    __slots__ = ("sync", "async_", "args")
+
+    def __init__(self, sync, async_, *args):
+        self.sync = sync
+        self.async_ = async_
+        self.args = args
+
+def _drive(pipeline):
+    """
+    Run a _pipeline generator on this thread, yielding its events. A failed
+    call is raised inside the pipeline, so it can clean up after itself.
+    """
+    try:
+        send, value = pipeline.send, None
+        while True:
+            try:
+                item = send(value)
+            except StopIteration:
+                return
+            if not isinstance(item, _Io):
+                send, value = pipeline.send, None
+                yield item
+                continue
+            try:
+                send, value = pipeline.send, item.sync(*item.args)
+            except BaseException as e:
+                send, value = pipeline.throw, e
+    finally:
+        pipeline.close()
+
+async def _drive_async(pipeline):
+    """Run a _pipeline generator without blocking the event loop; see _drive."""
+    try:
+        send, value = pipeline.send, None
+        while True:
+            try:
+                item = send(value)
+            except StopIteration:
+                return
+            if not isinstance(item, _Io):
+                send, value = pipeline.send, None
+                yield item
+                continue
+            try:
+                if item.async_ is not None:
+                    value = await item.async_(*item.args)
+                else:
+                    value = await asyncio.to_thread(item.sync, *item.args)
+                send = pipeline.send
+            except BaseException as e:
+                # Including cancellation (client disconnects)
+                send, value = pipeline.throw, e
+    finally:
+        pipeline.close()
+
+def _escalation(user_id: str, message: str, context: dict, plan: PlanResult) -> _Io:
+    return _Io(escalation_agent.create_ticket, escalation_agent.create_ticket_async, user_id, message, context, plan)
+
+def handle_chat(user_id: str, message: str, session_id: Optional[str] = None):
+    """
+    Run the full pipeline. Runbooks the safety policy marks as needing explicit
+    confirmation are held (reported as "awaiting_confirmation"); only a "yes"
+    in the same session runs them, so a caller can't confirm on the user's
+    behalf. Every run is appended to the audit log.
+
+    With a session_id, the turn is resolved against the previous one first:
+    "yes" runs the held runbooks without re-planning, a short follow-up reuses
+    the last intent and profile, and an unclear request gets a clarifying
+    question whose answer is triaged together with the original message.
+
+    With admission control on, the run first waits for a slot (see
+    orchestrator.admission) and raises AdmissionRejected when it is shed,
+    unless ADMISSION_SHED_RESPONSE is "degrade".
+    """
+    reply, activity_log = None, []
+    try:
+        clock = _StepClock()
+        intent = triage_agent.classify_locally(user_id, message)
+        admission = None
+        if admission_controller is not None:
+            try:
+                admission = admission_controller.admit(user_id, *triage_agent.local_priority(intent, message))
+            except AdmissionRejected as e:
+                _shed(e, clock, activity_log)
+                knowledge = knowledge_agent.answer_locally(intent) if _wants_knowledge(intent) else None
+                reply = _degraded_reply(e, knowledge, clock, activity_log)
+                return reply, activity_log
+            activity_log.append(clock.entry("admission", admission.details()))
+        try:
+            for event in _drive(_pipeline(user_id, message, session_id, clock, intent)):
+                if event["event"] == "step":
+                    activity_log.append(event["data"])
+                else:
+                    reply = event["data"]["reply"]
+        finally:
+            if admission is not None:
+                admission.release()
         return reply, activity_log
+    finally:
+        record_run(user_id, message, reply, activity_log, _run_status(reply, activity_log))
+
+async def stream_chat_async(user_id: str, message: str, session_id: Optional[str] = None, batch: bool = False):
+    """
+    Async pipeline as an event stream: yields {"event": "step", "data": <activity
+    log entry>} as each stage finishes, then {"event": "reply", "data": {"reply": ...}}.
+    The reply also lists "confirmation_required" runbooks when some were held
+    (see handle_chat, also for sessions). LLM, directory and ticketing calls never
+    block the event loop. The run is audited once it ends, including runs that
+    fail or are abandoned.
+
+    With admission control on, the first event is the "admission" step, so
+    callers can await it to learn whether the run was shed (AdmissionRejected)
+    before they start responding. `batch` runs are admitted against the
+    separate batch replay budget instead.
+    """
+    reply, activity_log = None, []
+    try:
+        clock = _StepClock()
+        intent = triage_agent.classify_locally(user_id, message)
+        admission = None
+        controller = batch_admission_controller if batch else admission_controller
+        if controller is not None:
+            try:
+                admission = await controller.admit_async(user_id, *triage_agent.local_priority(intent, message))
+            except AdmissionRejected as e:
+                _shed(e, clock, activity_log)
+                knowledge = None
+                if _wants_knowledge(intent):
+                    knowledge = await asyncio.to_thread(knowledge_agent.answer_locally, intent)
+                reply = _degraded_reply(e, knowledge, clock, activity_log)
+                for entry in activity_log:
+                    yield {"event": "step", "data": entry}
+                yield {"event": "reply", "data": {"reply": reply}}
+                return
+            activity_log.append(clock.entry("admission", admission.details()))
+            yield {"event": "step", "data": activity_log[0]}
+        try:
+            async for event in _drive_async(_pipeline(user_id, message, session_id, clock, intent)):
+                if event["event"] == "step":
+                    activity_log.append(event["data"])
+                else:
+                    reply = event["data"]["reply"]
+                yield event
+        finally:
+            if admission is not None:
+                admission.release()
+    finally:
+        await record_run_async(user_id, message, reply, activity_log, _run_status(reply, activity_log))
+
+def _pipeline(user_id: str, message: str, session_id: Optional[str],
+              clock: _StepClock, intent: Optional[IntentResult]):
+    """
+    The pipeline stages, written once for both paths: yields "step" and
+    "reply" events, plus _Io requests whose result the driver sends back.
+    `intent` is the caller's fast-path result, also used for admission.
+    """
+    def step(name: str, result) -> dict:
+        return {"event": "step", "data": clock.entry(name, result)}
+
+    def final(reply: str, **extra) -> dict:
+        return {"event": "reply", "data": {"reply": reply, **extra}}
+
+    key, session = _load_session(user_id, session_id)
+
+    # 0) Resolve the message against the session (local rules, no LLM)
+    turn = clarification_agent.interpret(message, session, intent)
+    if turn is not None:
+        yield step("clarification", dict(turn))
+        if turn.kind == "decline":
+            _save_session(key, session, pending_confirmation=None)
+            _count_outcome("declined", clock.usage)
+            yield final(clarification_agent.decline_reply(turn))
+            return
+        if turn.kind == "reask":
+            # The runbooks stay held until the user clearly says yes or no
+            _save_session(key, session)
+            _count_outcome("awaiting_confirmation", clock.usage)
+            yield final(clarification_agent.reask_reply(turn), confirmation_required=turn["runbooks"])
+            return
+        if turn.kind == "answer":
+            message = turn["message"]
+            intent = triage_agent.classify_locally(user_id, message)
+
+    if turn is not None and turn.kind == "confirm":
+        # The user confirmed held runbooks: re-run the stored plan in its stored context
+        intent = IntentResult(**session["intent"])
+        enriched_context = session["context"]
+        plan = PlanResult(**session["plan"])
+        confirmed = frozenset(turn["runbooks"])
+    else:
+        # 1) Triage: the session's intent for follow-ups, else local fast path,
+        # else one fused triage+planning LLM call when enabled, else the triage LLM call
+        fused, confirmed = None, frozenset()
+        follow_up = turn is not None and turn.kind == "follow_up"
+        if follow_up:
+            intent = clarification_agent.follow_up_intent(session, message)
+        if intent is None and settings.FUSED_TRIAGE_PLANNING:
+            fused = yield _Io(fused_agent.infer_and_plan, fused_agent.infer_and_plan_async, user_id, message)
+        if fused is not None:
+            intent = fused[0]
+        elif intent is None:
+            intent = yield _Io(triage_agent.infer_intent_llm, triage_agent.infer_intent_llm_async, user_id, message)
+        yield step("triage", intent.dict())
+
+        if clarification_agent.needs_clarification(intent, session, turn):
+            reply = clarification_agent.question(intent)
+            yield step("clarification", {"kind": "question", "question": reply})
+            _save_session(key, session, intent=intent.dict(), pending_question={"message": message},
+                          pending_confirmation=None)
+            _count_outcome("clarification", clock.usage)
+            yield final(reply)
+            return
+
+        # Policy questions the knowledge base covers are answered directly
+        if knowledge_agent.handles(intent):
+            knowledge = yield _Io(knowledge_agent.answer, knowledge_agent.answer_async, intent)
+            if knowledge is not None:
+                yield step("knowledge", knowledge)
+                _save_session(key, session, intent=intent.dict(), pending_confirmation=None, pending_question=None)
+                _count_outcome("knowledge_answer", clock.usage)
+                yield final(knowledge_agent.format_reply(knowledge))
+                return
+
+        # 2) Enrichment (user profile, history...); follow-ups reuse the session's
+        if follow_up:
+            enriched_context = {**session["context"], "intent": intent.dict()}
+        else:
+            enriched_context = yield _Io(enrichment_agent.enrich, enrichment_agent.enrich_async, user_id, intent)
+        yield step("enrichment", enriched_context)
+
+        # 3) Planning (which runbooks, which checks)
+        if fused is not None:
+            plan: PlanResult = planner_agent.template_plan(enriched_context) or fused[1]
+        else:
+            plan = yield _Io(planner_agent.create_plan, planner_agent.create_plan_async, enriched_context)
+        yield step("planning", plan.dict())
+
+        # If planner already says "needs human", skip automation
+        if plan.requires_human_approval:
+            ticket = yield _escalation(user_id, message, enriched_context, plan)
+            yield step("escalation", ticket)
+            _remember(key, session, intent, enriched_context, plan)
+            _count_outcome("human_approval", clock.usage)
+            yield final(_human_approval_reply(ticket))
+            return
+
+    # 4) Safety check (compiled policy lookups plus quota reservations)
+    safety_decision = yield _Io(safety_agent.evaluate, None, plan, enriched_context)
+    settled = False
+    try:
+        yield step("safety", _safety_entry(safety_decision))
 
-    # 5) Execute runbooks
-    runbook_results = []
-    for action in plan.actions:
-        result = runbook_executor.execute(action, enriched_context)
-        runbook_results.append(result)
+        if safety_decision.block:
+            # Escalate immediately
+            ticket = yield _escalation(user_id, message, enriched_context, plan)
+            yield step("escalation", ticket)
+            _remember(key, session, intent, enriched_context, plan)
+            _count_outcome("safety_blocked", clock.usage)
+            yield final(_safety_block_reply(ticket, safety_decision))
+            return
 
-    activity_log.append({"step": "runbook_execution", "details": runbook_results})
-    activity_log[-1]["result"] = activity_log[-1].pop("details")
+        # 5) Execute runbooks (independent actions run concurrently).
+        # Only what the session was holding for the user's "yes" is released
+        held = frozenset(safety_decision.confirm) - confirmed
+        runbook_results = yield _Io(runbook_executor.execute_plan, runbook_executor.execute_plan_async,
+                                    plan.actions, enriched_context, held)
+        # Keep the quota of runbooks that ran; hand back the rest
+        yield _Io(safety_agent.settle, None, safety_decision, runbook_results)
+        settled = True
+        yield step("runbook_execution", runbook_results)
+    except GeneratorExit:
+        # The consumer went away; no more calls can be made through the driver
+        if not settled:
+            safety_agent.release(safety_decision)
+        raise
+    except BaseException:
+        if not settled:
+            yield _Io(safety_agent.release, None, safety_decision)
+        raise
 
-    # 6) Final reply to user (simple version for now)
+    # 6) Final reply to user
     reply = planner_agent.summarize_for_user(intent, runbook_results)
+    awaiting = _awaiting_confirmation(runbook_results)
+    _remember(key, session, intent, enriched_context, plan, runbook_results, awaiting)
+    if awaiting:
+        _count_outcome("awaiting_confirmation", clock.usage)
+        yield final(reply, confirmation_required=awaiting)
+        return
+    _count_outcome("automated", clock.usage)
+    yield final(reply)
 
+async def handle_chat_async(user_id: str, message: str, session_id: Optional[str] = None, batch: bool = False):
+    """
+    Async twin of handle_chat used by the API: drains stream_chat_async into
+    the same (reply, activity_log) shape.
+    """
+    reply, activity_log = "", []
+    async for event in stream_chat_async(user_id, message, session_id, batch):
+        if event["event"] == "step":
+            activity_log.append(event["data"])
+        else:
+            reply = event["data"]["reply"]
     return reply, activity_log
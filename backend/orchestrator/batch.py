@@ -0,0 +1,124 @@
+"""
+Bulk replay of chat records through the async pipeline.
+
+Input is JSONL, one {"user_id": ..., "message": ...} object per line. Output is
+JSONL, one result per input record, written as soon as that record finishes
+(so in completion order; use "index" to join back to the input). At most
+`concurrency` records are in flight and input is read lazily, so memory stays
+flat regardless of file size. Identical triage/planner LLM calls within the
+batch are shared through the LLM cache and in-flight request coalescing.
+
+Usage:
+    python -m backend.orchestrator.batch tickets.jsonl -o results.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, Union
+
+from backend.orchestrator.agent_router import handle_chat_async
+
+DEFAULT_CONCURRENCY = 8
+
+async def _aiter(records: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
+
+def parse_line(line: Union[str, bytes]) -> dict:
+    """Parse one JSONL record; returns {"error": ...} for bad input instead of raising."""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return {"error": f"invalid JSON: {e}"}
+    if not isinstance(record, dict) or not record.get("user_id") or not record.get("message"):
+        return {"error": "record must be an object with 'user_id' and 'message'"}
+    return record
+
+async def _run_one(index: int, record: dict, include_activity_log: bool) -> dict:
+    if "error" in record:
+        return {"index": index, "error": record["error"]}
+
+    started = time.perf_counter()
+    result = {"index": index, "user_id": record["user_id"], "message": record["message"]}
+    try:
+        # Replays are admitted against their own budget, not the interactive per-user limits
+        reply, activity_log = await handle_chat_async(
+            record["user_id"], record["message"], record.get("session_id"), batch=True,
+        )
+    except Exception as e:
+        result["error"] = str(e)
+    else:
+        result["reply"] = reply
+        # A list in run order: a step can appear twice (clarification, when the answer is still unclear)
+        result["timings_ms"] = [[step["step"], step.get("duration_ms")] for step in activity_log]
+        if include_activity_log:
+            result["activity_log"] = activity_log
+    result["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+async def run_batch(records: Union[Iterable[dict], AsyncIterable[dict]],
+                    concurrency: int = DEFAULT_CONCURRENCY,
+                    include_activity_log: bool = True) -> AsyncIterator[dict]:
+    """
+    Yield one result per record, with at most `concurrency` records in flight.
+    Records still running when the consumer stops (or is cancelled) are cancelled.
+    """
+    in_flight = set()
+    index = 0
+    try:
+        async for record in _aiter(records):
+            if len(in_flight) >= concurrency:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            in_flight.add(asyncio.ensure_future(_run_one(index, record, include_activity_log)))
+            index += 1
+
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # A client that disconnects mid-stream cancels us; don't leave orphaned runs behind
+        for task in in_flight:
+            task.cancel()
+
+async def _replay_file(input_path: str, output, concurrency: int, include_activity_log: bool) -> dict:
+    totals = {"records": 0, "errors": 0}
+    started = time.perf_counter()
+    with open(input_path, "r", encoding="utf-8") as f:
+        records = (parse_line(line) for line in f if line.strip())
+        async for result in run_batch(records, concurrency, include_activity_log):
+            totals["records"] += 1
+            totals["errors"] += "error" in result
+            output.write(json.dumps(result, default=str) + "\n")
+            output.flush()
+    totals["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL file of chat records through the pipeline")
+    parser.add_argument("input", help="JSONL file of {user_id, message} records")
+    parser.add_argument("--output", "-o", help="Output JSONL path (default: stdout)")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--no-activity-log", action="store_true", help="Only write reply and timings")
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        totals = asyncio.run(
+            _replay_file(args.input, output, max(1, args.concurrency), not args.no_activity_log)
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(totals), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,52 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import tempfile
+from typing import Optional
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from backend.orchestrator.agent_router import handle_chat
+from backend.orchestrator.agent_router import handle_chat_async, runbook_executor, stream_chat_async, triage_agent
+from backend.orchestrator import startup
+from backend.orchestrator.admission import AdmissionRejected, admission_controller, batch_admission_controller
+from backend.orchestrator.batch import DEFAULT_CONCURRENCY, parse_line, run_batch
 from backend.config import settings
+from backend.utils import llm_client
+from backend.utils.llm_client import cache_stats, pool_stats
+from backend.utils.logger import get_logger
+from backend.utils import metrics
+from backend.services import http_client
+from backend.services.profile_cache import invalidate_user_profile, profile_cache
+from backend.services.audit_log_service import audit_log, audit_stats
+from backend.services.job_queue import FINISHED as JOB_FINISHED, STATUSES as JOB_STATUSES, job_queue
+from backend.services.session_store import session_store
+from backend.services.ticketing_service import get_ticket, list_tickets, update_ticket_status
+
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pay import/connection costs before the first request instead of during it
+    if settings.STARTUP_WARMUP:
+        await startup.warm_up()
+    # Pick up jobs left queued by a previous run
+    runbook_executor.start_job_workers()
+    yield
+    runbook_executor.stop_job_workers()
+    runbook_executor.process_pool.shutdown()
+    # Release pooled keep-alive connections to backend services and the LLM
+    await http_client.aclose_clients()
+    await llm_client.aclose()
+    # Drain buffered audit records to disk
+    if audit_log is not None:
+        audit_log.close()
 
-app = FastAPI(title="SmartDesk")
+app = FastAPI(title="SmartDesk", lifespan=lifespan)
+
+# /chat/batch uploads larger than this are spooled to disk
+BATCH_SPOOL_MEMORY_BYTES = 1024 * 1024
 
 # Allow local frontend (file:// or localhost) to call the API during demos
 app.add_middleware(
@@ -24,11 +66,55 @@ app.add_middleware(
 class ChatRequest(BaseModel): 
     user_id: str
     message: str
+    # Groups messages into a conversation so follow-ups reuse earlier turns
+    session_id: Optional[str] = None
+
+class TicketStatusUpdate(BaseModel):
+    status: str
 
 class ChatResponse(BaseModel): 
     reply: str 
     activity_log: list
 
+metrics.registry.register_collector(
+    # Lambdas so registering doesn't build the (lazily constructed) agents
+    metrics.stats_collector("triage_fast_path", "Triage fast-path classifier", lambda: triage_agent.fast_path_stats())
+)
+metrics.registry.register_collector(
+    metrics.stats_collector("llm_cache", "LLM response cache", cache_stats)
+)
+metrics.registry.register_collector(
+    metrics.stats_collector("llm_pool", "LLM deployment pool", pool_stats)
+)
+metrics.registry.register_collector(
+    metrics.stats_collector("profile_cache", "User profile cache", profile_cache.stats)
+)
+metrics.registry.register_collector(
+    metrics.stats_collector("audit_log", "Audit log writer", audit_stats)
+)
+metrics.registry.register_collector(
+    metrics.stats_collector("sessions", "Conversation session store", session_store.stats)
+)
+metrics.registry.register_collector(
+    metrics.stats_collector("runbook_process_pool", "Isolated runbook process pool",
+                            lambda: runbook_executor.process_pool.stats())
+)
+if admission_controller is not None:
+    metrics.registry.register_collector(
+        metrics.stats_collector("admission", "Chat admission control", admission_controller.stats)
+    )
+    metrics.registry.register_collector(
+        metrics.stats_collector("batch_admission", "Batch replay admission control",
+                                batch_admission_controller.stats)
+    )
+if job_queue is not None:
+    metrics.registry.register_collector(
+        metrics.stats_collector("runbook_jobs", "Background runbook job queue", job_queue.stats)
+    )
+
+# How often /jobs/{id}/events checks for a status change
+JOB_EVENTS_POLL_SECONDS = 0.5
+
 @app.get("/health")
 def health_check(): 
     return {
@@ -37,7 +123,218 @@ def health_check():
         "azure_configured": bool(settings.AZURE_OPENAI_ENDPOINT)
     }
 
+@app.get("/stats")
+def stats():
+    return {
+        "triage_fast_path": triage_agent.fast_path_stats(),
+        "llm_cache": cache_stats(),
+        "llm_pool": pool_stats(),
+        "profile_cache": profile_cache.stats(),
+        "audit_log": audit_stats(),
+        "sessions": session_store.stats(),
+        "jobs": job_queue.stats() if job_queue is not None else None,
+        "runbooks": runbook_executor.stats(),
+        "startup": startup.last_report,
+        "admission": admission_controller.stats() if admission_controller is not None else None,
+        "batch_admission": batch_admission_controller.stats() if batch_admission_controller is not None else None,
+    }
+
+@app.delete("/cache/profiles/{user_id}")
+def invalidate_profile(user_id: str):
+    """Invalidation hook for directory change notifications."""
+    return {"user_id": user_id, "invalidated": invalidate_user_profile(user_id)}
+
+@app.get("/tickets")
+def tickets(
+    user_id: str = None,
+    status: str = None,
+    q: str = Query(None, description="Substring of the ticket summary"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+):
+    """Tickets in the built-in store, newest first, paginated by cursor."""
+    try:
+        page, next_cursor = list_tickets(user_id, status, q, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"tickets": page, "next_cursor": next_cursor}
+
+@app.get("/tickets/{ticket_id}")
+def ticket(ticket_id: str):
+    found = get_ticket(ticket_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return found
+
+@app.patch("/tickets/{ticket_id}")
+def update_ticket(ticket_id: str, update: TicketStatusUpdate):
+    """Move a ticket along; only "open" tickets collect follow-ups from repeat requests."""
+    try:
+        updated = update_ticket_status(ticket_id, update.status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return {"ticket_id": ticket_id, "status": update.status}
+
+def _job_queue():
+    if job_queue is None:
+        raise HTTPException(status_code=404, detail="Background jobs are disabled")
+    return job_queue
+
+@app.get("/jobs")
+def jobs(
+    status: str = None,
+    runbook_id: str = None,
+    user_id: str = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Background runbook jobs, newest first; status=dead lists the dead-letter queue."""
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status {status!r}")
+    return {"jobs": _job_queue().list(status, runbook_id, user_id, limit)}
+
+@app.get("/jobs/{job_id}")
+def job(job_id: str):
+    found = _job_queue().get(job_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return found
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-sent events: one "status" event per change (status or attempt),
+    ending with the finished job.
+    """
+    queue = _job_queue()
+    if await asyncio.to_thread(queue.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def sse():
+        last = None
+        while True:
+            current = await asyncio.to_thread(queue.get, job_id)
+            if current is None:
+                return
+            if (current["status"], current["attempts"]) != last:
+                last = (current["status"], current["attempts"])
+                yield f"event: status\ndata: {json.dumps(current, default=str)}\n\n"
+            if current["status"] in JOB_FINISHED:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/retry")
+def retry_job(job_id: str):
+    """Requeue a dead or failed job with a fresh set of attempts."""
+    queue = _job_queue()
+    if queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not queue.requeue(job_id):
+        raise HTTPException(status_code=409, detail="Only dead or failed jobs can be retried")
+    runbook_executor.start_job_workers().notify()
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/audit/runs")
+def audit_runs(
+    user_id: str = None,
+    ticket_id: str = None,
+    since: float = Query(None, description="Unix timestamp, inclusive"),
+    until: float = Query(None, description="Unix timestamp, exclusive"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Audited pipeline runs, newest first. Runs still buffered are flushed first."""
+    if audit_log is None:
+        raise HTTPException(status_code=404, detail="Audit log is disabled")
+    audit_log.flush()
+    return {"runs": audit_log.query(user_id, ticket_id, since, until, limit)}
+
+@app.get("/audit/runs/{run_id}")
+def audit_run(run_id: str):
+    if audit_log is None:
+        raise HTTPException(status_code=404, detail="Audit log is disabled")
+    audit_log.flush()
+    run = audit_log.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+def _shed_response(error: AdmissionRejected) -> HTTPException:
+    # 429 when the user's own backlog is full, 503 when the service is overloaded
+    return HTTPException(
+        status_code=429 if error.user_limited else 503,
+        detail=error.details(),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest): 
-    reply, activity_log = handle_chat(req.user_id, req.message) 
-    return ChatResponse(reply=reply, activity_log=activity_log)
\ No newline at end of file
+    try:
+        reply, activity_log = await handle_chat_async(req.user_id, req.message, req.session_id)
+    except AdmissionRejected as e:
+        raise _shed_response(e)
+    return ChatResponse(reply=reply, activity_log=activity_log)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Same pipeline as /chat, streamed as NDJSON: one {"event": "step"} line per
+    activity-log step as it completes, then a final {"event": "reply"} line.
+    A request shed by admission control gets a plain 503/429 before streaming starts.
+    """
+    events = stream_chat_async(req.user_id, req.message, req.session_id)
+    first = None
+    if admission_controller is not None:
+        # The first event is the admission decision
+        try:
+            first = await events.__anext__()
+        except AdmissionRejected as e:
+            raise _shed_response(e)
+
+    async def ndjson():
+        try:
+            if first is not None:
+                yield json.dumps(first, default=str) + "\n"
+            async for event in events:
+                yield json.dumps(event, default=str) + "\n"
+        except Exception:
+            # Headers are already sent; report the failure in-band, details stay in the log
+            logger.exception("Streaming chat for %s failed", req.user_id)
+            yield json.dumps({"event": "error", "data": {"error": "Internal error while handling the request"}}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(
+    request: Request,
+    concurrency: int = Query(DEFAULT_CONCURRENCY, ge=1, le=256),
+    include_activity_log: bool = True,
+):
+    """
+    Bulk replay: the request body is JSONL of {user_id, message} records and the
+    response streams one JSONL result per record as it completes.
+
+    The upload is spooled to a temporary file before the response starts (the
+    ASGI receive channel can't be read once a streaming response is running),
+    so memory stays flat for arbitrarily large uploads.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_MEMORY_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+
+    async def ndjson():
+        try:
+            records = (parse_line(line) for line in spool if line.strip())
+            async for result in run_batch(records, concurrency, include_activity_log):
+                yield json.dumps(result, default=str) + "\n"
+        finally:
+            spool.close()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
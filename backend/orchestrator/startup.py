@@ -0,0 +1,188 @@
+"""
+Startup warm-up and cold-start profiling.
+
+warm_up() runs from the app's lifespan when STARTUP_WARMUP is on. It does,
+concurrently, the work the first requests would otherwise pay for:
+- agents: import and build every agent (catalog, safety policy, fast path),
+- llm: build the deployment pool and its SDK clients (importing openai);
+  with STARTUP_PRECONNECT, also open a connection to each deployment,
+- backends: with STARTUP_PRECONNECT, open pooled connections to the
+  directory / ticketing services that use the "http" backend,
+- runbook_process_pool: spawn the isolated-runbook workers, if any,
+- knowledge_index: open (or build) the knowledge index.
+A failing task is logged and reported; it never stops the app from starting.
+
+Cold-start report, in a fresh interpreter so nothing is already imported:
+    python -m backend.orchestrator.startup [--top 25] [--json]
+It combines `python -X importtime` (self and cumulative import time per
+module, grouped by package) with the per-task warm-up timings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+APP_MODULE = "backend.orchestrator.main"
+
+# Results of the last warm_up() in this process, for /stats
+last_report: Optional[dict] = None
+
+def _backend_urls() -> List[str]:
+    urls = []
+    if settings.DIRECTORY_BACKEND == "http":
+        urls.append(settings.DIRECTORY_SERVICE_URL)
+    if settings.TICKETING_BACKEND == "http":
+        urls.append(settings.TICKETING_SYSTEM_URL)
+    return urls
+
+async def _timed(name: str, coro) -> tuple:
+    started = time.perf_counter()
+    try:
+        await coro
+        result = {"ok": True}
+    except Exception as e:
+        logger.warning("Warm-up task %s failed: %s", name, e)
+        result = {"ok": False, "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return name, result
+
+async def warm_up(connect: Optional[bool] = None) -> dict:
+    """Run the warm-up tasks concurrently; returns {task: {"ok", "seconds"[, "error"]}}."""
+    global last_report
+    from backend.orchestrator import agent_router
+    from backend.services import http_client
+    from backend.utils import llm_client
+
+    connect = settings.STARTUP_PRECONNECT if connect is None else connect
+    started = time.perf_counter()
+    tasks = {"agents": asyncio.to_thread(agent_router.warm_up_agents)}
+    if settings.AZURE_OPENAI_ENDPOINT or settings.LLM_DEPLOYMENTS or llm_client.pool is not None:
+        tasks["llm"] = llm_client.warm_up(connect)
+    if connect and _backend_urls():
+        tasks["backends"] = http_client.warm_up(_backend_urls())
+    if any(meta.get("isolation") == "process" for meta in agent_router.runbook_executor.catalog.values()):
+        tasks["runbook_process_pool"] = asyncio.to_thread(agent_router.runbook_executor.warm_up)
+    if settings.KNOWLEDGE_ENABLED:
+        tasks["knowledge_index"] = asyncio.to_thread(agent_router.knowledge_agent.index)
+
+    results = dict(await asyncio.gather(*(_timed(name, coro) for name, coro in tasks.items())))
+    report = {"seconds": round(time.perf_counter() - started, 4), "tasks": results}
+    logger.info("Startup warm-up finished in %.3fs: %s", report["seconds"],
+                ", ".join(f"{name} {r['seconds']:.3f}s{'' if r['ok'] else ' (failed)'}" for name, r in results.items()))
+    last_report = report
+    return report
+
+# Cold-start report
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """Rows of `-X importtime` output as {module, self_us, cumulative_us, depth}."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+            })
+        except ValueError:
+            continue
+    return rows
+
+def _group(module: str) -> str:
+    # Our own modules by subpackage (backend.agents, ...), everything else by top-level package
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] == "backend" else parts[0]
+
+def summarize_imports(rows: List[dict], top: int) -> dict:
+    by_group: Dict[str, int] = defaultdict(int)
+    for row in rows:
+        by_group[_group(row["module"])] += row["self_us"]
+    total_us = sum(row["self_us"] for row in rows)
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(rows),
+        "by_package_ms": {
+            group: round(us / 1000, 1)
+            for group, us in sorted(by_group.items(), key=lambda item: -item[1])[:top]
+        },
+        "slowest_modules_ms": [
+            {"module": row["module"], "self_ms": round(row["self_us"] / 1000, 1),
+             "cumulative_ms": round(row["cumulative_us"] / 1000, 1)}
+            for row in sorted(rows, key=lambda r: -r["cumulative_us"])[:top]
+        ],
+    }
+
+_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter() - started
+from backend.orchestrator import startup
+print(json.dumps({{"import_seconds": round(imported, 4), "warm_up": asyncio.run(startup.warm_up(connect=False))}}))
+"""
+
+def cold_start_report(module: str = APP_MODULE, top: int = 25) -> dict:
+    """Import `module` and run the warm-up in a fresh interpreter, timing both."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"Probe process failed:\n{proc.stderr[-2000:]}")
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "process_wall_seconds": round(wall, 3),
+        "import_seconds": probe["import_seconds"],
+        "imports": summarize_imports(parse_importtime(proc.stderr), top),
+        "warm_up": probe["warm_up"],
+    }
+
+def _print_report(report: dict) -> None:
+    imports = report["imports"]
+    print(f"{report['module']}: imported in {report['import_seconds'] * 1000:.0f} ms "
+          f"({imports['modules']} modules), process wall time {report['process_wall_seconds']:.2f}s")
+    print("\nImport time by package (self, including imports made by the warm-up):")
+    for group, ms in imports["by_package_ms"].items():
+        print(f"  {group:<40} {ms:>8.1f} ms")
+    print("\nSlowest imports (cumulative):")
+    for row in imports["slowest_modules_ms"]:
+        print(f"  {row['module']:<60} {row['cumulative_ms']:>8.1f} ms")
+    warm = report["warm_up"]
+    print(f"\nWarm-up: {warm['seconds'] * 1000:.0f} ms (tasks run concurrently)")
+    for name, task in warm["tasks"].items():
+        status = "" if task["ok"] else f"  FAILED: {task['error']}"
+        print(f"  {name:<40} {task['seconds'] * 1000:>8.1f} ms{status}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Break down cold-start import and init cost")
+    parser.add_argument("--module", default=APP_MODULE, help="Module to import (default: the API app)")
+    parser.add_argument("--top", type=int, default=25, help="Rows per table")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    report = cold_start_report(args.module, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+if __name__ == "__main__":
+    main()
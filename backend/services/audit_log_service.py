@@ -0,0 +1,346 @@
+"""
+Durable, append-only audit log of pipeline runs.
+
+The request path only appends to a bounded in-memory buffer. A background
+writer drains it in batches to segmented JSONL files under AUDIT_LOG_DIR
+(one fsync per batch), starting a new segment when the current one exceeds
+AUDIT_SEGMENT_MAX_BYTES or AUDIT_SEGMENT_MAX_SECONDS. Segments are never
+rewritten; a batch that fails part-way is cut off again (the segment is
+truncated back to where the batch started) before it is retried in a new
+segment, so a retry leaves neither a torn line nor a duplicate behind.
+
+Backpressure: when the buffer is full, callers wait up to
+AUDIT_BLOCK_TIMEOUT_SECONDS for the writer to make room (async callers wait
+off the event loop); records that still don't fit are dropped and counted.
+
+A small SQLite index (run_id, ts, user_id, ticket_id -> segment, offset,
+length) sits next to the segments, so runs can be fetched by user, ticket or
+time range without scanning the files. It can be rebuilt from the segments.
+"""
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SEGMENT_PREFIX = "audit-"
+INDEX_FILE = "index.sqlite3"
+
+def build_run_record(user_id: str, message: str, reply: Optional[str], activity_log: list,
+                     status: str = "completed") -> dict:
+    ticket_id = None
+    for step in activity_log:
+        if step.get("step") == "escalation" and isinstance(step.get("result"), dict):
+            ticket_id = step["result"].get("ticket_id")
+    now = time.time()
+    return {
+        "run_id": str(uuid.uuid4()),
+        "ts": now,
+        "time": datetime.fromtimestamp(now, tz=timezone.utc).isoformat(),
+        "user_id": user_id,
+        "ticket_id": ticket_id,
+        "status": status,
+        "message": message,
+        "reply": reply,
+        "activity_log": activity_log,
+    }
+
+class AuditLog:
+    def __init__(self, directory: str, buffer_size: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.5, segment_max_bytes: int = 64 * 1024 * 1024,
+                 segment_max_seconds: float = 3600, fsync: bool = True, block_timeout: float = 2.0):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.fsync = fsync
+        self.block_timeout = block_timeout
+
+        self._buffer: Deque[dict] = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # one drainer at a time (writer thread or flush())
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self._segment = None
+        self._segment_name = ""
+        self._segment_opened = 0.0
+        self._segment_seq = 0
+        self._index: Optional[sqlite3.Connection] = None
+        self._index_lock = threading.Lock()
+        self._stats = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0, "segments": 0, "blocked": 0}
+
+    @classmethod
+    def from_settings(cls) -> Optional["AuditLog"]:
+        if not settings.AUDIT_LOG_ENABLED:
+            return None
+        return cls(
+            directory=settings.AUDIT_LOG_DIR,
+            buffer_size=settings.AUDIT_BUFFER_SIZE,
+            batch_size=settings.AUDIT_BATCH_SIZE,
+            flush_interval=settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+            segment_max_bytes=settings.AUDIT_SEGMENT_MAX_BYTES,
+            segment_max_seconds=settings.AUDIT_SEGMENT_MAX_SECONDS,
+            fsync=settings.AUDIT_FSYNC,
+            block_timeout=settings.AUDIT_BLOCK_TIMEOUT_SECONDS,
+        )
+
+    # Producer side
+
+    def _try_append(self, record: dict) -> bool:
+        with self._cond:
+            if len(self._buffer) >= self.buffer_size:
+                return False
+            self._buffer.append(record)
+            self._stats["recorded"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def record(self, record: dict) -> bool:
+        """Queue a record; blocks up to block_timeout when the buffer is full."""
+        self._ensure_writer()
+        if self._try_append(record):
+            return True
+        deadline = time.monotonic() + self.block_timeout
+        with self._cond:
+            self._stats["blocked"] += 1
+            self._cond.notify_all()
+            while len(self._buffer) >= self.buffer_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    self._stats["dropped"] += 1
+                    logger.error("Audit buffer full; dropped run %s", record.get("run_id"))
+                    return False
+                self._cond.wait(remaining)
+            self._buffer.append(record)
+            self._stats["recorded"] += 1
+            return True
+
+    async def record_async(self, record: dict) -> bool:
+        self._ensure_writer()
+        if self._try_append(record):
+            return True
+        # Full: wait for room on a worker thread, never on the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.record, record)
+
+    # Writer side
+
+    def _ensure_writer(self) -> None:
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None and not self._closed:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                if self._closed and not self._buffer:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Keep the writer alive; the batch stays buffered and is retried
+                logger.exception("Audit log flush failed")
+                time.sleep(self.flush_interval)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of records written."""
+        written = 0
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    batch = [self._buffer[i] for i in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    return written
+                self._write_batch(batch)
+                with self._cond:
+                    for _ in batch:
+                        self._buffer.popleft()
+                    self._stats["written"] += len(batch)
+                    self._stats["batches"] += 1
+                    self._cond.notify_all()  # wake producers waiting for room
+                written += len(batch)
+
+    def _write_batch(self, batch: List[dict]) -> None:
+        self._maybe_rotate()
+        start = offset = self._segment.tell()
+        rows = []
+        chunks = []
+        for record in batch:
+            line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+            chunks.append(line)
+            rows.append((record["run_id"], record["ts"], record.get("user_id"), record.get("ticket_id"),
+                         self._segment_name, offset, len(line)))
+            offset += len(line)
+        try:
+            self._segment.write(b"".join(chunks))
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            with self._index_lock:
+                index = self._get_index()
+                index.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                index.commit()
+        except BaseException:
+            self._cut_segment(start)
+            raise
+
+    def _cut_segment(self, size: int) -> None:
+        """Truncate the current segment to `size` bytes and retire it, after a failed batch."""
+        segment, self._segment = self._segment, None  # the retry starts a new segment
+        try:
+            segment.close()  # also drops whatever part of the batch is still buffered
+        except OSError:
+            pass
+        try:
+            os.truncate(os.path.join(self.directory, self._segment_name), size)
+        except OSError:
+            logger.exception("Could not truncate audit segment %s after a failed write", self._segment_name)
+
+    def _maybe_rotate(self) -> None:
+        if self._segment is not None:
+            too_big = self._segment.tell() >= self.segment_max_bytes
+            too_old = time.time() - self._segment_opened >= self.segment_max_seconds
+            if not (too_big or too_old):
+                return
+            self._segment.close()
+        # Always start a fresh segment; existing files are never appended to
+        self._segment_opened = time.time()
+        self._segment_seq += 1
+        stamp = datetime.fromtimestamp(self._segment_opened, tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._segment_name = f"{SEGMENT_PREFIX}{stamp}-{os.getpid()}-{self._segment_seq:04d}.jsonl"
+        self._segment = open(os.path.join(self.directory, self._segment_name), "ab")
+        self._stats["segments"] += 1
+
+    def _get_index(self) -> sqlite3.Connection:
+        if self._index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._index = sqlite3.connect(os.path.join(self.directory, INDEX_FILE), check_same_thread=False)
+            self._index.execute("PRAGMA journal_mode=WAL")
+            self._index.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id TEXT PRIMARY KEY, ts REAL NOT NULL, user_id TEXT, ticket_id TEXT,"
+                " segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL)"
+            )
+            self._index.execute("CREATE INDEX IF NOT EXISTS runs_user_ts ON runs (user_id, ts)")
+            self._index.execute("CREATE INDEX IF NOT EXISTS runs_ticket ON runs (ticket_id)")
+            self._index.execute("CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts)")
+        return self._index
+
+    def rebuild_index(self) -> int:
+        """
+        Re-index every segment on disk (e.g. after losing the index file).
+        Unreadable lines (a torn write from a crash) are skipped.
+        """
+        count = 0
+        with self._index_lock:
+            index = self._get_index()
+            for name in sorted(os.listdir(self.directory)):
+                if not (name.startswith(SEGMENT_PREFIX) and name.endswith(".jsonl")):
+                    continue
+                offset = 0
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    for line in f:
+                        start, offset = offset, offset + len(line)
+                        try:
+                            record = json.loads(line)
+                            row = (record["run_id"], record["ts"], record.get("user_id"), record.get("ticket_id"),
+                                   name, start, len(line))
+                        except (ValueError, KeyError, TypeError):
+                            logger.warning("Skipping unreadable audit line at %s:%d", name, start)
+                            continue
+                        index.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                        count += 1
+            index.commit()
+        return count
+
+    # Queries
+
+    def query(self, user_id: Optional[str] = None, ticket_id: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, limit: int = 100) -> List[dict]:
+        """Runs matching every given filter, newest first. Only flushed runs are visible."""
+        clauses, params = [], []
+        for column, value in (("user_id", user_id), ("ticket_id", ticket_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._index_lock:
+            rows = self._get_index().execute(
+                f"SELECT segment, offset, length FROM runs {where} ORDER BY ts DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [self._read(*row) for row in rows]
+
+    def get(self, run_id: str) -> Optional[dict]:
+        with self._index_lock:
+            row = self._get_index().execute(
+                "SELECT segment, offset, length FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return self._read(*row) if row else None
+
+    def _read(self, segment: str, offset: int, length: int) -> dict:
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the writer after draining the buffer (call on shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["buffered"] = len(self._buffer)
+        stats["buffer_size"] = self.buffer_size
+        return stats
+
+audit_log = AuditLog.from_settings()
+if audit_log is not None:
+    # Scripts and workers without the API lifespan still drain on exit
+    atexit.register(audit_log.close)
+
+def record_run(user_id: str, message: str, reply: Optional[str], activity_log: list,
+               status: str = "completed") -> None:
+    if audit_log is not None:
+        audit_log.record(build_run_record(user_id, message, reply, activity_log, status))
+
+async def record_run_async(user_id: str, message: str, reply: Optional[str], activity_log: list,
+                           status: str = "completed") -> None:
+    if audit_log is not None:
+        await audit_log.record_async(build_run_record(user_id, message, reply, activity_log, status))
+
+def audit_stats() -> dict:
+    return audit_log.stats() if audit_log is not None else {"enabled": False}
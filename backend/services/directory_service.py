@@ -1,4 +1,12 @@
-def get_user_profile(user_id: str) -> dict: 
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import httpx
+
+from backend.config import settings
+from backend.services import http_client
+
+def _fake_profile(user_id: str) -> dict:
     # For now, return a fake user 
     return {
         "id": user_id, 
@@ -6,4 +14,55 @@ def get_user_profile(user_id: str) -> dict:
         "department": "Engineering", 
         "location": "US", 
         "role": "Employee",
-    }
\ No newline at end of file
+    }
+
+def _use_http() -> bool:
+    return settings.DIRECTORY_BACKEND == "http"
+
+def _user_url(user_id: str) -> str:
+    return f"{settings.DIRECTORY_SERVICE_URL}/users/{quote(user_id, safe='')}"
+
+def _bulk_url() -> str:
+    return f"{settings.DIRECTORY_SERVICE_URL}/users/bulk"
+
+def _index_profiles(payload: dict) -> Dict[str, dict]:
+    return {user["id"]: user for user in payload.get("users", [])}
+
+def _is_not_found(error: httpx.HTTPStatusError) -> bool:
+    return error.response.status_code == 404
+
+def get_user_profile(user_id: str) -> Optional[dict]:
+    """The user's profile, or None if the directory doesn't know the user."""
+    if not _use_http():
+        return _fake_profile(user_id)
+    try:
+        return http_client.request("GET", _user_url(user_id)).json()
+    except httpx.HTTPStatusError as e:
+        if _is_not_found(e):
+            return None
+        raise
+
+async def get_user_profile_async(user_id: str) -> Optional[dict]:
+    if not _use_http():
+        return _fake_profile(user_id)
+    try:
+        response = await http_client.request_async("GET", _user_url(user_id))
+    except httpx.HTTPStatusError as e:
+        if _is_not_found(e):
+            return None
+        raise
+    return response.json()
+
+def get_user_profiles(user_ids: List[str]) -> Dict[str, dict]:
+    """Fetch many profiles in one round-trip. Unknown ids are absent from the result."""
+    ids = list(dict.fromkeys(user_ids))
+    if not _use_http():
+        return {user_id: _fake_profile(user_id) for user_id in ids}
+    return _index_profiles(http_client.request("POST", _bulk_url(), json={"ids": ids}).json())
+
+async def get_user_profiles_async(user_ids: List[str]) -> Dict[str, dict]:
+    ids = list(dict.fromkeys(user_ids))
+    if not _use_http():
+        return {user_id: _fake_profile(user_id) for user_id in ids}
+    response = await http_client.request_async("POST", _bulk_url(), json={"ids": ids})
+    return _index_profiles(response.json())
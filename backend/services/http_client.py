@@ -0,0 +1,136 @@
+"""
+Shared, pooled HTTP clients for backend services (directory, ticketing, ...).
+
+One sync and one async httpx client per process keep connections alive across
+requests, so we pay TCP/TLS setup once per connection instead of per call.
+HTTP/2 is used when the optional `h2` package is installed. Requests are
+retried on connection errors, 429 and 5xx with jittered exponential backoff,
+honoring Retry-After when the server sends it.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+def _client_kwargs() -> dict:
+    return {
+        "http2": settings.SERVICE_HTTP2 and _HTTP2_AVAILABLE,
+        "timeout": httpx.Timeout(settings.SERVICE_TIMEOUT_SECONDS, connect=settings.SERVICE_CONNECT_TIMEOUT_SECONDS),
+        "limits": httpx.Limits(
+            max_connections=settings.SERVICE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SERVICE_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.SERVICE_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    }
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_client_kwargs())
+    return _client
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_client_kwargs())
+    return _async_client
+
+async def warm_up(urls) -> None:
+    """
+    Open pooled connections to the given backend base URLs before the first
+    request. Any HTTP response counts, since only the connection matters.
+    """
+    client = get_async_client()
+    results = await asyncio.gather(*(client.head(url) for url in urls), return_exceptions=True)
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            logger.warning("Backend warm-up for %s failed: %s", url, result)
+
+async def aclose_clients() -> None:
+    """Close pooled clients (call on application shutdown)."""
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
+
+def _backoff_seconds(attempt: int, response: Optional[httpx.Response]) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.SERVICE_RETRY_MAX_BACKOFF_SECONDS)
+            except ValueError:
+                pass  # HTTP-date form; fall through to computed backoff
+    # Full jitter: uniform in [0, base * 2^attempt], capped
+    cap = min(settings.SERVICE_RETRY_MAX_BACKOFF_SECONDS,
+              settings.SERVICE_RETRY_BASE_BACKOFF_SECONDS * (2 ** attempt))
+    return random.uniform(0, cap)
+
+def _is_final(attempt: int, response: Optional[httpx.Response]) -> bool:
+    retryable = response is None or response.status_code in RETRY_STATUS_CODES
+    return not retryable or attempt >= settings.SERVICE_MAX_RETRIES
+
+def request(method: str, url: str, **kwargs) -> httpx.Response:
+    client = get_client()
+    attempt = 0
+    while True:
+        response, error = None, None
+        try:
+            response = client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            error = e
+        if _is_final(attempt, response):
+            if error is not None:
+                raise error
+            response.raise_for_status()
+            return response
+        delay = _backoff_seconds(attempt, response)
+        logger.warning("Retrying %s %s in %.2fs (attempt %d): %s", method, url, delay, attempt + 1,
+                       error or response.status_code)
+        time.sleep(delay)
+        attempt += 1
+
+async def request_async(method: str, url: str, **kwargs) -> httpx.Response:
+    client = get_async_client()
+    attempt = 0
+    while True:
+        response, error = None, None
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            error = e
+        if _is_final(attempt, response):
+            if error is not None:
+                raise error
+            response.raise_for_status()
+            return response
+        delay = _backoff_seconds(attempt, response)
+        logger.warning("Retrying %s %s in %.2fs (attempt %d): %s", method, url, delay, attempt + 1,
+                       error or response.status_code)
+        await asyncio.sleep(delay)
+        attempt += 1
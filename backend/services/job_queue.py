@@ -0,0 +1,377 @@
+"""
+Durable job queue for runbooks that run outside the request.
+
+Jobs live in one SQLite table (JOB_QUEUE_SQLITE_PATH; ":memory:" keeps them
+in-process only), so queued work survives restarts and worker processes on
+the same host share the queue. Claiming is a single IMMEDIATE transaction,
+so each job goes to exactly one worker at a time.
+
+Lifecycle:
+    queued -> running -> succeeded | failed
+                      -> queued (retry, exponential backoff) -> ... -> dead
+
+- A claim leases the job for its visibility timeout, which is also the
+  attempt's deadline: the handler must give up (raise) once claim time plus
+  visibility timeout has passed. Until then the worker renews the lease, so a
+  slow handler is never run a second time alongside itself. If the worker
+  stops renewing (crash, killed process, deadline passed), the lease expires
+  and the job is retried like any other failure.
+- Completion is only accepted from the attempt that holds the lease, so a
+  worker that overran its lease can't overwrite a newer attempt's result.
+- A handler that raises is retried up to max_attempts and then dead-lettered
+  (enqueue with max_attempts=1 for work that must not be repeated).
+  A handler that returns a result is final: "failed" if the result's status
+  is "error", "succeeded" otherwise.
+- Dead and failed jobs stay queryable and can be requeued by hand.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+from backend.utils.metrics import JOBS
+
+logger = get_logger(__name__)
+
+STATUSES = ("queued", "running", "succeeded", "failed", "dead")
+FINISHED = ("succeeded", "failed", "dead")
+
+_COLUMNS = (
+    "job_id", "runbook_id", "user_id", "inputs", "status", "attempts", "max_attempts",
+    "visibility_timeout", "available_at", "lease_expires_at", "result", "error",
+    "created_at", "updated_at", "finished_at",
+)
+
+def _row_to_job(row) -> dict:
+    job = dict(zip(_COLUMNS, row))
+    job["inputs"] = json.loads(job["inputs"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+class SQLiteJobQueue:
+    # Delete finished jobs past the retention period once every this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, max_attempts: int = 3, visibility_timeout: float = 60.0,
+                 retry_backoff: float = 2.0, retention_seconds: float = 7 * 86400, clock=time.time):
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.retry_backoff = retry_backoff
+        self.retention_seconds = retention_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, runbook_id TEXT NOT NULL, user_id TEXT, inputs TEXT NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+            " visibility_timeout REAL NOT NULL, available_at REAL NOT NULL, lease_expires_at REAL,"
+            " result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_available ON jobs (status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_lease ON jobs (status, lease_expires_at)")
+
+    @classmethod
+    def from_settings(cls) -> "SQLiteJobQueue":
+        return cls(
+            settings.JOB_QUEUE_SQLITE_PATH,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+            retry_backoff=settings.JOB_RETRY_BACKOFF_SECONDS,
+            retention_seconds=settings.JOB_RETENTION_SECONDS,
+        )
+
+    def enqueue(self, runbook_id: str, inputs: dict, user_id: Optional[str] = None,
+                max_attempts: Optional[int] = None, visibility_timeout: Optional[float] = None) -> dict:
+        now = self._clock()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, runbook_id, user_id, inputs, status, max_attempts, visibility_timeout,"
+                " available_at, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, runbook_id, user_id, json.dumps(inputs, default=str),
+                 max_attempts or self.max_attempts, visibility_timeout or self.visibility_timeout, now, now, now),
+            )
+            self._after_write(now)
+        JOBS.labels(runbook_id=runbook_id, event="enqueued").inc()
+        return {"job_id": job_id, "runbook_id": runbook_id, "status": "queued"}
+
+    def claim(self) -> Optional[dict]:
+        """Lease the next due job, or None when nothing is due."""
+        now = self._clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_leases(now)
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'queued' AND available_at <= ?"
+                    " ORDER BY available_at LIMIT 1", (now,)
+                ).fetchone()
+                job = None
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1,"
+                        " lease_expires_at = ? + visibility_timeout, updated_at = ? WHERE job_id = ?",
+                        (now, now, row[0]),
+                    )
+                    job = self._get(row[0])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def extend_leases(self, jobs: List[dict]) -> List[dict]:
+        """
+        Push the lease of each claimed attempt out by its visibility timeout;
+        returns the jobs whose lease had already been lost.
+        """
+        now = self._clock()
+        lost = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for job in jobs:
+                    updated = self._conn.execute(
+                        "UPDATE jobs SET lease_expires_at = ? + visibility_timeout"
+                        " WHERE job_id = ? AND status = 'running' AND attempts = ?",
+                        (now, job["job_id"], job["attempts"]),
+                    ).rowcount
+                    if not updated:
+                        lost.append(job)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return lost
+
+    def _expire_leases(self, now: float) -> None:
+        expired = self._conn.execute(
+            "SELECT job_id, runbook_id, attempts, max_attempts FROM jobs"
+            " WHERE status = 'running' AND lease_expires_at <= ?", (now,)
+        ).fetchall()
+        for job_id, runbook_id, attempts, max_attempts in expired:
+            logger.warning("Job %s (%s) lease expired on attempt %d", job_id, runbook_id, attempts)
+            self._retry_or_bury(job_id, runbook_id, attempts, max_attempts, "Visibility timeout expired", now)
+
+    def _retry_or_bury(self, job_id: str, runbook_id: str, attempts: int, max_attempts: int,
+                       error: str, now: float) -> str:
+        if attempts >= max_attempts:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'dead', error = ?, lease_expires_at = NULL, updated_at = ?,"
+                " finished_at = ? WHERE job_id = ?", (error, now, now, job_id),
+            )
+            JOBS.labels(runbook_id=runbook_id, event="dead").inc()
+            return "dead"
+        delay = self.retry_backoff * (2 ** (attempts - 1))
+        self._conn.execute(
+            "UPDATE jobs SET status = 'queued', error = ?, lease_expires_at = NULL, available_at = ?,"
+            " updated_at = ? WHERE job_id = ?", (error, now + delay, now, job_id),
+        )
+        JOBS.labels(runbook_id=runbook_id, event="retried").inc()
+        return "queued"
+
+    def complete(self, job: dict, result: dict) -> bool:
+        """Record the result of the attempt `job` was claimed as; False if that lease was lost."""
+        now = self._clock()
+        status = "failed" if result.get("status") == "error" else "succeeded"
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, lease_expires_at = NULL, updated_at = ?, finished_at = ?"
+                " WHERE job_id = ? AND status = 'running' AND attempts = ?",
+                (status, json.dumps(result, default=str), now, now, job["job_id"], job["attempts"]),
+            ).rowcount
+            self._after_write(now)
+        if updated:
+            JOBS.labels(runbook_id=job["runbook_id"], event=status).inc()
+        return bool(updated)
+
+    def fail(self, job: dict, error: str) -> Optional[str]:
+        """Retry or dead-letter the attempt `job` was claimed as; returns the new status."""
+        now = self._clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT max_attempts FROM jobs WHERE job_id = ? AND status = 'running' AND attempts = ?",
+                    (job["job_id"], job["attempts"]),
+                ).fetchone()
+                status = None
+                if row:
+                    status = self._retry_or_bury(job["job_id"], job["runbook_id"], job["attempts"], row[0], error, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._after_write(now)
+        return status
+
+    def requeue(self, job_id: str) -> bool:
+        """Give a dead or failed job a fresh set of attempts."""
+        now = self._clock()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, result = NULL, available_at = ?,"
+                " updated_at = ?, finished_at = NULL WHERE job_id = ? AND status IN ('dead', 'failed')",
+                (now, now, job_id),
+            ).rowcount
+        return bool(updated)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._get(job_id)
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, runbook_id: Optional[str] = None,
+             user_id: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Newest first."""
+        clauses, params = [], []
+        for column, value in (("status", status), ("runbook_id", runbook_id), ("user_id", user_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs{where} ORDER BY created_at DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def _after_write(self, now: float) -> None:
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'dead') AND finished_at <= ?",
+                (now - self.retention_seconds,),
+            )
+
+    def stats(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(available_at) FROM jobs WHERE status = 'queued' AND available_at <= ?", (now,)
+            ).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        stats["oldest_due_seconds"] = round(now - oldest, 3) if oldest is not None else 0.0
+        return stats
+
+class JobWorkers:
+    """
+    Threads that claim jobs and run `handler(job) -> result dict`. Idle workers
+    poll every poll_interval; notify() wakes them as soon as a job is enqueued
+    in this process. One more thread renews the leases of running jobs every
+    heartbeat_interval, which must stay well below the shortest visibility
+    timeout, until their deadline (claim time plus visibility timeout). The
+    handler is expected to raise once that deadline has passed.
+    """
+
+    def __init__(self, queue: SQLiteJobQueue, handler: Callable[[dict], dict], workers: int = 4,
+                 poll_interval: float = 1.0, heartbeat_interval: float = 3.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Jobs whose handler is running and their monotonic deadline, by job_id
+        self._running: Dict[str, Tuple[dict, float]] = {}
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._wake:
+            if self._threads:
+                return
+            self._stopping = False
+            self._stopped.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self) -> None:
+        with self._wake:
+            self._wake.notify()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._wake:
+            self._stopping = True
+            self._stopped.set()
+            self._wake.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                logger.error("Job claim failed: %s", e)
+                job = None
+            if job is None:
+                with self._wake:
+                    if not self._stopping:
+                        self._wake.wait(self.poll_interval)
+                continue
+            with self._running_lock:
+                self._running[job["job_id"]] = (job, time.monotonic() + job["visibility_timeout"])
+            try:
+                result = self.handler(job)
+            except Exception as e:
+                # If the failure can't be recorded, the lease expires and the job is retried from there
+                try:
+                    status = self.queue.fail(job, f"{type(e).__name__}: {e}")
+                except sqlite3.Error as db_error:
+                    logger.error("Job %s failure could not be recorded: %s", job["job_id"], db_error)
+                    continue
+                logger.warning("Job %s (%s) attempt %d raised, now %s: %s",
+                               job["job_id"], job["runbook_id"], job["attempts"], status, e)
+                continue
+            finally:
+                with self._running_lock:
+                    self._running.pop(job["job_id"], None)
+            try:
+                completed = self.queue.complete(job, result)
+            except sqlite3.Error as e:
+                logger.error("Job %s result could not be recorded: %s", job["job_id"], e)
+                continue
+            if not completed:
+                logger.warning("Job %s finished after its lease expired; result discarded", job["job_id"])
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            now = time.monotonic()
+            with self._running_lock:
+                # Past its deadline a job keeps only what is left of its lease
+                jobs = [job for job, deadline in self._running.values() if deadline > now]
+            if not jobs:
+                continue
+            try:
+                lost = self.queue.extend_leases(jobs)
+            except sqlite3.Error as e:
+                logger.error("Job lease renewal failed: %s", e)
+                continue
+            for job in lost:
+                logger.warning("Job %s (%s) lost its lease while still running", job["job_id"], job["runbook_id"])
+
+job_queue = SQLiteJobQueue.from_settings() if settings.JOBS_ENABLED else None
@@ -0,0 +1,296 @@
+"""
+On-disk vector index over a directory of policy documents (.md / .txt).
+
+Layout under KNOWLEDGE_INDEX_DIR:
+- vectors.f32   float32 matrix, one row per chunk, opened with np.memmap so
+                the OS page cache holds it and restarts don't reload it,
+- chunks.jsonl  one line per row: source file, title, section, text,
+- manifest.json embedder signature, row count, dead rows, and per-document
+                size/mtime/sha256 with the rows it owns.
+
+sync() is incremental: unchanged files (same size and mtime, or same hash)
+are skipped; changed or new files are chunked, embedded and appended, and
+their previous rows become dead. Dead rows are masked out of search and
+compacted away once they exceed COMPACT_DEAD_FRACTION of the matrix.
+
+search() is an exact, vectorized brute-force scan (one matrix-vector
+product plus argpartition), which stays in the low milliseconds for tens of
+thousands of chunks without an approximate index to tune.
+
+Build ahead of time with:
+    python -m backend.services.knowledge_index [--rebuild]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.config import settings
+from backend.utils.embeddings import embedder_from_settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DOC_EXTENSIONS = (".md", ".txt")
+COMPACT_DEAD_FRACTION = 0.3
+# Rows added per growth step of vectors.f32 (at least doubles)
+MIN_CAPACITY = 1024
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+
+def chunk_document(text: str, fallback_title: str, chunk_words: int, overlap_words: int) -> List[dict]:
+    """
+    Split a document into overlapping word windows that never cross a
+    markdown heading, so each chunk can be cited by its section.
+    """
+    title, sections, heading, lines = fallback_title, [], "", []
+    for line in text.splitlines():
+        match = _HEADING_RE.match(line.strip())
+        if match:
+            if lines:
+                sections.append((heading, lines))
+            if match.group(1) == "#" and title == fallback_title:
+                title = match.group(2).strip()
+            heading, lines = match.group(2).strip(), []
+        else:
+            lines.append(line)
+    if lines:
+        sections.append((heading, lines))
+
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+    for heading, section_lines in sections:
+        words = " ".join(section_lines).split()
+        for start in range(0, len(words), step):
+            window = words[start:start + chunk_words]
+            if window:
+                chunks.append({"title": title, "section": heading or title, "text": " ".join(window)})
+            if start + chunk_words >= len(words):
+                break
+    return chunks
+
+class KnowledgeIndex:
+    def __init__(self, index_dir: str, embedder=None, chunk_words: int = 200, overlap_words: int = 40):
+        self.index_dir = index_dir
+        self.embedder = embedder or embedder_from_settings()
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_settings(cls) -> "KnowledgeIndex":
+        return cls(settings.KNOWLEDGE_INDEX_DIR, chunk_words=settings.KNOWLEDGE_CHUNK_WORDS,
+                   overlap_words=settings.KNOWLEDGE_CHUNK_OVERLAP_WORDS)
+
+    # Storage
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _reset(self) -> None:
+        self.manifest = {"signature": self.embedder.signature, "dim": None, "rows": 0, "dead": [], "docs": {}}
+        self.chunks: List[dict] = []
+        self._vectors: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        for name in ("vectors.f32", "chunks.jsonl", "manifest.json"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def _load(self) -> None:
+        try:
+            with open(self._path("manifest.json"), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is None or manifest.get("signature") != self.embedder.signature:
+            # Missing, unreadable or built by a different embedder: start over
+            self._reset()
+            return
+        self.manifest = manifest
+        with open(self._path("chunks.jsonl"), "r", encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f][: manifest["rows"]]
+        self._vectors = self._open_vectors(manifest["dim"]) if manifest["dim"] else None
+        self._alive = np.ones(manifest["rows"], dtype=bool)
+        self._alive[manifest["dead"]] = False
+
+    def _open_vectors(self, dim: int) -> np.memmap:
+        return np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+").reshape(-1, dim)
+
+    def _ensure_capacity(self, dim: int, rows: int) -> None:
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(MIN_CAPACITY, capacity * 2, rows)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.truncate(new_capacity * dim * 4)
+        self._vectors = self._open_vectors(dim)
+
+    def _save_manifest(self) -> None:
+        tmp = self._path("manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self._path("manifest.json"))
+
+    # Building
+
+    def _scan(self, docs_dir: str) -> Dict[str, str]:
+        found = {}
+        for root, _, files in os.walk(docs_dir):
+            for name in files:
+                if name.lower().endswith(DOC_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    found[os.path.relpath(path, docs_dir).replace(os.sep, "/")] = path
+        return found
+
+    def sync(self, docs_dir: str) -> dict:
+        """Bring the index in line with docs_dir; returns what changed."""
+        with self._lock:
+            return self._sync(docs_dir)
+
+    def _sync(self, docs_dir: str) -> dict:
+        started = time.perf_counter()
+        docs = self.manifest["docs"]
+        found = self._scan(docs_dir) if os.path.isdir(docs_dir) else {}
+        changes = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "chunks_embedded": 0}
+        dead = set(self.manifest["dead"])
+
+        for source in list(docs):
+            if source not in found:
+                dead.update(docs.pop(source)["rows"])
+                changes["removed"] += 1
+
+        pending = []
+        for source, path in sorted(found.items()):
+            stat = os.stat(path)
+            entry = docs.get(source)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                changes["unchanged"] += 1
+                continue
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if entry and entry["sha256"] == sha:
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)  # touched, not edited
+                changes["unchanged"] += 1
+                continue
+            if entry:
+                dead.update(entry["rows"])
+            changes["updated" if entry else "added"] += 1
+            title = os.path.splitext(os.path.basename(source))[0].replace("_", " ").replace("-", " ").title()
+            chunks = chunk_document(text, title, self.chunk_words, self.overlap_words)
+            pending.append((source, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha}, chunks))
+
+        texts = [f"{c['title']} - {c['section']}\n{c['text']}" for _, _, chunks in pending for c in chunks]
+        if texts:
+            vectors = self.embedder.embed(texts)
+            dim = vectors.shape[1]
+            if self.manifest["dim"] not in (None, dim):
+                raise ValueError(f"Embedder returned {dim}-d vectors for a {self.manifest['dim']}-d index")
+            self.manifest["dim"] = dim
+            row = self.manifest["rows"]
+            self._ensure_capacity(dim, row + len(texts))
+            self._vectors[row:row + len(texts)] = vectors
+            self._vectors.flush()
+            with open(self._path("chunks.jsonl"), "a", encoding="utf-8") as f:
+                for source, entry, chunks in pending:
+                    entry["rows"] = list(range(row, row + len(chunks)))
+                    docs[source] = entry
+                    for chunk in chunks:
+                        record = {"row": row, "source": source, **chunk}
+                        f.write(json.dumps(record) + "\n")
+                        self.chunks.append(record)
+                        row += 1
+            self.manifest["rows"] = row
+            changes["chunks_embedded"] = len(texts)
+        else:
+            for source, entry, _ in pending:
+                entry["rows"] = []
+                docs[source] = entry
+
+        self.manifest["dead"] = sorted(dead)
+        self._alive = np.ones(self.manifest["rows"], dtype=bool)
+        self._alive[self.manifest["dead"]] = False
+        self._save_manifest()
+        if self.manifest["rows"] and len(dead) > COMPACT_DEAD_FRACTION * self.manifest["rows"]:
+            self._compact()
+        changes["rows"] = int(self._alive.sum())
+        changes["seconds"] = round(time.perf_counter() - started, 3)
+        if any(changes[k] for k in ("added", "updated", "removed")):
+            logger.info("Knowledge index synced: %s", changes)
+        return changes
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self._alive)
+        dim = self.manifest["dim"]
+        vectors = np.array(self._vectors[keep])
+        remap = {int(old): new for new, old in enumerate(keep)}
+        chunks = []
+        for old in keep:
+            chunk = dict(self.chunks[old])
+            chunk["row"] = remap[int(old)]
+            chunks.append(chunk)
+        self._vectors = None
+        os.remove(self._path("vectors.f32"))
+        self._ensure_capacity(dim, len(keep))
+        self._vectors[:len(keep)] = vectors
+        self._vectors.flush()
+        tmp = self._path("chunks.jsonl.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk) + "\n")
+        os.replace(tmp, self._path("chunks.jsonl"))
+        for entry in self.manifest["docs"].values():
+            entry["rows"] = [remap[r] for r in entry["rows"]]
+        self.chunks = chunks
+        self.manifest.update(rows=len(keep), dead=[])
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._save_manifest()
+
+    # Querying
+
+    def search(self, query: str, k: int = 3) -> List[dict]:
+        """Top-k live chunks by cosine similarity, best first."""
+        with self._lock:
+            rows = self.manifest["rows"]
+            if not rows or self._vectors is None:
+                return []
+            vectors, alive, chunks = self._vectors[:rows], self._alive, self.chunks
+        query_vector = self.embedder.embed([query])[0]
+        scores = vectors @ query_vector
+        scores[~alive] = -np.inf
+        k = min(k, rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**chunks[i], "score": float(scores[i])} for i in top if np.isfinite(scores[i])]
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.manifest["docs"]),
+            "rows": self.manifest["rows"],
+            "live_rows": int(self._alive.sum()),
+            "dim": self.manifest["dim"] or 0,
+        }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or update the knowledge index")
+    parser.add_argument("--docs", default=settings.KNOWLEDGE_DOCS_DIR, help="Directory of .md/.txt documents")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing index first")
+    args = parser.parse_args()
+    index = KnowledgeIndex.from_settings()
+    if args.rebuild:
+        index._reset()
+    print(json.dumps(index.sync(args.docs)))
+
+if __name__ == "__main__":
+    main()
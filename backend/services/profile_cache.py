@@ -0,0 +1,114 @@
+"""
+TTL cache in front of the directory service with request coalescing.
+
+Concurrent misses for the same user_id share a single backend call (per thread
+pool for the sync path, per event loop for the async path), so a burst from one
+user or a batch replay can't stampede the directory. Failed lookups and users
+the directory doesn't know (None) are not cached.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from backend.config import settings
+from backend.services.directory_service import get_user_profile, get_user_profile_async
+from backend.utils.cache import TTLCache
+
+class ProfileCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_async: Dict[str, asyncio.Task] = {}
+        self._coalesced = 0
+        self._backend_calls = 0
+
+    def get(self, user_id: str) -> Optional[dict]:
+        profile = self.cache.get(user_id)
+        if profile is not None:
+            return profile
+
+        with self._lock:
+            future = self._inflight.get(user_id)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[user_id] = future
+                self._backend_calls += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            profile = get_user_profile(user_id)
+            if profile is not None:
+                self.cache.set(user_id, profile)
+            future.set_result(profile)
+            return profile
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(user_id, None)
+
+    async def get_async(self, user_id: str) -> Optional[dict]:
+        profile = self.cache.get(user_id)
+        if profile is not None:
+            return profile
+
+        task = self._inflight_async.get(user_id)
+        if task is None:
+            self._backend_calls += 1
+            task = asyncio.ensure_future(self._fetch_async(user_id))
+            self._inflight_async[user_id] = task
+            task.add_done_callback(lambda _: self._inflight_async.pop(user_id, None))
+        else:
+            self._coalesced += 1
+        # shield: a cancelled caller must not cancel the lookup others wait on
+        return await asyncio.shield(task)
+
+    async def _fetch_async(self, user_id: str) -> Optional[dict]:
+        profile = await get_user_profile_async(user_id)
+        if profile is not None:
+            self.cache.set(user_id, profile)
+        return profile
+
+    def invalidate(self, user_id: str) -> bool:
+        """Drop one user's cached profile, e.g. after a directory change event."""
+        return self.cache.invalidate(user_id)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["coalesced"] = self._coalesced
+        stats["backend_calls"] = self._backend_calls
+        return stats
+
+profile_cache = ProfileCache(
+    max_entries=settings.PROFILE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PROFILE_CACHE_TTL_SECONDS,
+)
+
+# Callers get a shallow copy so they can't mutate the cached entry
+
+def _copy(profile: Optional[dict]) -> Optional[dict]:
+    return dict(profile) if profile is not None else None
+
+def get_cached_user_profile(user_id: str) -> Optional[dict]:
+    if not settings.PROFILE_CACHE_ENABLED:
+        return get_user_profile(user_id)
+    return _copy(profile_cache.get(user_id))
+
+async def get_cached_user_profile_async(user_id: str) -> Optional[dict]:
+    if not settings.PROFILE_CACHE_ENABLED:
+        return await get_user_profile_async(user_id)
+    return _copy(await profile_cache.get_async(user_id))
+
+def invalidate_user_profile(user_id: str) -> bool:
+    return profile_cache.invalidate(user_id)
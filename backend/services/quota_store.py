@@ -0,0 +1,173 @@
+"""
+Sliding-window execution counters backing per-user runbook quotas.
+
+Each execution holds a slot under a key such as "<user_id>:<runbook_id>":
+reserve() takes one only if fewer than `limit` are held inside the window,
+as a single atomic step, so concurrent requests can't all pass the check and
+overrun the quota. A slot whose runbook ends up not running is handed back
+with release(). Backends:
+- memory (default): a deque of (timestamp, token) per key, pruned on access,
+- sqlite: one indexed table, shared by worker processes on the same host
+  (check-and-insert in one IMMEDIATE transaction),
+- redis: one sorted set per key, shared across hosts (check-and-add in one
+  Lua script; needs the optional `redis` package, any Redis-protocol server
+  with scripting works).
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from backend.config import settings
+
+def _token() -> str:
+    return uuid.uuid4().hex
+
+class MemoryQuotaStore:
+    def __init__(self, window_seconds: float, clock=time.time):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._events: Dict[str, Deque[Tuple[float, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, key: str, now: float) -> Deque[Tuple[float, str]]:
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+        cutoff = now - self.window_seconds
+        while events and events[0][0] <= cutoff:
+            events.popleft()
+        if not events:
+            del self._events[key]
+        return events
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._prune(key, self._clock()))
+
+    def reserve(self, key: str, limit: int) -> Optional[str]:
+        """Take a slot if fewer than `limit` are held; returns its token, or None when the quota is used up."""
+        now = self._clock()
+        with self._lock:
+            if len(self._prune(key, now)) >= limit:
+                return None
+            token = _token()
+            self._events.setdefault(key, deque()).append((now, token))
+        return token
+
+    def release(self, key: str, token: str) -> None:
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                return
+            for event in events:
+                if event[1] == token:
+                    events.remove(event)
+                    break
+            if not events:
+                del self._events[key]
+
+class SQLiteQuotaStore:
+    # Delete rows older than the window once every this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, window_seconds: float, clock=time.time):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota_events (key TEXT NOT NULL, ts REAL NOT NULL, token TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS quota_events_key_ts ON quota_events (key, ts)")
+
+    def count(self, key: str) -> int:
+        cutoff = self._clock() - self.window_seconds
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM quota_events WHERE key = ? AND ts > ?", (key, cutoff)
+            ).fetchone()
+        return row[0]
+
+    def reserve(self, key: str, limit: int) -> Optional[str]:
+        now = self._clock()
+        token = _token()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so other processes can't
+            # count the same free slot between our SELECT and INSERT
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                used = self._conn.execute(
+                    "SELECT COUNT(*) FROM quota_events WHERE key = ? AND ts > ?", (key, now - self.window_seconds)
+                ).fetchone()[0]
+                if used < limit:
+                    self._conn.execute("INSERT INTO quota_events (key, ts, token) VALUES (?, ?, ?)", (key, now, token))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if used >= limit:
+                return None
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._conn.execute("DELETE FROM quota_events WHERE ts <= ?", (now - self.window_seconds,))
+        return token
+
+    def release(self, key: str, token: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM quota_events WHERE key = ? AND token = ?", (key, token))
+
+# KEYS[1] = sorted set; ARGV = cutoff, limit, now, token, ttl seconds
+_RESERVE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+class RedisQuotaStore:
+    def __init__(self, url: str, window_seconds: float, prefix: str = "quota:", clock=time.time):
+        import redis  # optional dependency, only needed for this backend
+
+        self.window_seconds = window_seconds
+        self.prefix = prefix
+        self._clock = clock
+        self._redis = redis.Redis.from_url(url)
+        self._reserve = self._redis.register_script(_RESERVE_SCRIPT)
+
+    def count(self, key: str) -> int:
+        name = self.prefix + key
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(name, 0, self._clock() - self.window_seconds)
+        pipe.zcard(name)
+        return int(pipe.execute()[1])
+
+    def reserve(self, key: str, limit: int) -> Optional[str]:
+        now = self._clock()
+        token = _token()
+        taken = self._reserve(
+            keys=[self.prefix + key],
+            args=[now - self.window_seconds, limit, now, token, int(self.window_seconds) + 1],
+        )
+        return token if int(taken) else None
+
+    def release(self, key: str, token: str) -> None:
+        self._redis.zrem(self.prefix + key, token)
+
+def quota_store_from_settings():
+    backend = settings.SAFETY_QUOTA_BACKEND
+    window = settings.SAFETY_QUOTA_WINDOW_SECONDS
+    if backend == "sqlite":
+        return SQLiteQuotaStore(settings.SAFETY_QUOTA_SQLITE_PATH, window)
+    if backend == "redis":
+        return RedisQuotaStore(settings.SAFETY_QUOTA_REDIS_URL, window)
+    return MemoryQuotaStore(window)
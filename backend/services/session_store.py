@@ -0,0 +1,95 @@
+"""
+Conversation state between chat turns, keyed by "<user_id>:<session_id>".
+
+A session holds what the last turn worked out (intent, enriched context,
+plan, runbook results) plus anything it left open: runbooks awaiting the
+user's confirmation, or a clarifying question awaiting an answer. Follow-up
+turns read it to skip stages instead of recomputing them.
+
+Backends:
+- memory (default): LRU + TTL (SESSION_MAX_ENTRIES, SESSION_TTL_SECONDS),
+- sqlite: one table of JSON blobs, kept across restarts and shared by
+  worker processes on the same host.
+Every save() refreshes the TTL.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from backend.config import settings
+from backend.utils.cache import TTLCache
+
+def session_key(user_id: str, session_id: str) -> str:
+    # Scoped by user so one user can't pick up another's session id
+    return f"{user_id}:{session_id}"
+
+class MemorySessionStore:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def get(self, key: str) -> Optional[dict]:
+        session = self.cache.get(key)
+        # Callers mutate what they get back; don't hand out the stored dict
+        return json.loads(json.dumps(session)) if session is not None else None
+
+    def save(self, key: str, session: dict) -> None:
+        self.cache.set(key, json.loads(json.dumps(session, default=str)))
+
+    def delete(self, key: str) -> bool:
+        return self.cache.invalidate(key)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+class SQLiteSessionStore:
+    # Delete expired sessions once every this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "misses": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " key TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            self._stats["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def save(self, key: str, session: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(session, default=str), now + self.ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,)).rowcount > 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+def session_store_from_settings():
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(settings.SESSION_SQLITE_PATH, settings.SESSION_TTL_SECONDS)
+    return MemorySessionStore(settings.SESSION_MAX_ENTRIES, settings.SESSION_TTL_SECONDS)
+
+session_store = session_store_from_settings()
@@ -0,0 +1,74 @@
+"""
+Local stand-in for the directory and ticketing backends.
+
+Serves the endpoints the HTTP service clients call, so they can be exercised
+(keep-alive, retries, bulk lookups) without the real systems:
+
+    uvicorn backend.services.standin_server:app --port 9001
+
+then run the API with DIRECTORY_BACKEND=http TICKETING_BACKEND=http and both
+DIRECTORY_SERVICE_URL / TICKETING_SYSTEM_URL pointing at it. Set
+STANDIN_LATENCY_MS to add per-request latency and STANDIN_FAILURE_RATE
+(0..1) to answer a fraction of requests with 503 + Retry-After.
+"""
+import asyncio
+import os
+import random
+import uuid
+from typing import Dict, List
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+LATENCY_MS = float(os.getenv("STANDIN_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.getenv("STANDIN_FAILURE_RATE", "0"))
+
+app = FastAPI(title="SmartDesk backend stand-in")
+
+_tickets: Dict[str, dict] = {}
+_idempotency: Dict[str, str] = {}
+
+@app.middleware("http")
+async def inject_latency_and_failures(request: Request, call_next):
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        return JSONResponse({"error": "injected failure"}, status_code=503, headers={"Retry-After": "0.05"})
+    return await call_next(request)
+
+def _profile(user_id: str) -> dict:
+    return {
+        "id": user_id,
+        "name": "Test User",
+        "department": "Engineering",
+        "location": "US",
+        "role": "Employee",
+    }
+
+class BulkUsersRequest(BaseModel):
+    ids: List[str]
+
+class TicketRequest(BaseModel):
+    summary: str
+    details: dict
+
+@app.get("/users/{user_id}")
+def get_user(user_id: str):
+    if user_id.startswith("missing"):
+        raise HTTPException(status_code=404, detail="User not found")
+    return _profile(user_id)
+
+@app.post("/users/bulk")
+def get_users(req: BulkUsersRequest):
+    return {"users": [_profile(user_id) for user_id in req.ids if not user_id.startswith("missing")]}
+
+@app.post("/tickets")
+def create_ticket(req: TicketRequest, idempotency_key: str = Header(default="")):
+    if idempotency_key and idempotency_key in _idempotency:
+        return {"ticket_id": _idempotency[idempotency_key]}
+    ticket_id = str(uuid.uuid4())
+    _tickets[ticket_id] = req.dict()
+    if idempotency_key:
+        _idempotency[idempotency_key] = ticket_id
+    return {"ticket_id": ticket_id}
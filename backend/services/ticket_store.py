@@ -0,0 +1,332 @@
+"""
+Ticket repository for the built-in (non-HTTP) ticketing backend.
+
+Backends:
+- sqlite (default): one WAL-mode table indexed on (user_id, created_at),
+  (status, created_at), created_at and, for duplicate detection,
+  (user_id, intent, status, created_at); shared by worker processes on the
+  same host and kept across restarts,
+- memory: a dict, for tests and throwaway demos.
+
+Listing is newest first and paginated with an opaque cursor encoding the
+(created_at, ticket_id) of the last row returned, so each page is an index
+range scan rather than an OFFSET over everything before it.
+
+Duplicate lookup only ever looks at one user's recent open tickets for one
+intent (an index range of a handful of rows), so it stays flat however many
+tickets are open overall. Within that range a ticket matches on the exact
+normalized-message fingerprint, or on Jaccard similarity of the messages'
+content tokens (stopwords and help-desk filler such as "need" or "please"
+dropped) when they also share a minimum number of them. Filler alone would
+otherwise make "access to the finance share" look like "access to the hr
+share".
+"""
+import base64
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from backend.config import settings
+
+STATUSES = ("open", "in_progress", "resolved", "closed")
+
+# Most recent open tickets compared per (user, intent) duplicate lookup
+DUPLICATE_SCAN_LIMIT = 50
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Ignored when comparing messages. Negations ("not", "can't", ...) are kept:
+# they change what is being reported.
+STOPWORDS = frozenset("""
+a about after again all also am an and any anyone are as at be been before being but by can
+could did do does doing for from get getting got had has have having hello help hey hi how i
+i'd i'll i'm i've if in into is it it's its just me my need needs of on or our please so some
+someone still thank thanks that the their them then there this to too up us want was we were
+what when where which while who why will with would you your
+""".split())
+
+def message_tokens(message: str) -> FrozenSet[str]:
+    return frozenset(_TOKEN_RE.findall((message or "").lower()))
+
+def content_tokens(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    return tokens - STOPWORDS
+
+def message_fingerprint(tokens: FrozenSet[str]) -> str:
+    # Order-, case- and punctuation-insensitive
+    return hashlib.sha1(" ".join(sorted(tokens)).encode("utf-8")).hexdigest()[:16]
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def new_ticket(summary: str, details: dict, user_id: Optional[str] = None, status: str = "open",
+               intent: Optional[str] = None, message: Optional[str] = None) -> dict:
+    tokens = message_tokens(message)
+    return {
+        "ticket_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "summary": summary,
+        "details": details,
+        "status": status,
+        "created_at": time.time(),
+        "intent": intent,
+        "fingerprint": message_fingerprint(tokens) if tokens else None,
+        "tokens": " ".join(sorted(tokens)),
+        "follow_ups": 0,
+    }
+
+def encode_cursor(ticket: dict) -> str:
+    raw = json.dumps([ticket["created_at"], ticket["ticket_id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(created_at), str(ticket_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def _page(tickets: List[dict], limit: int) -> Tuple[List[dict], Optional[str]]:
+    # Callers fetch limit + 1 rows to learn whether another page exists
+    if len(tickets) > limit:
+        tickets = tickets[:limit]
+        return tickets, encode_cursor(tickets[-1])
+    return tickets, None
+
+def best_match(candidates: Iterable[Tuple[str, Optional[str], str]], fingerprint: Optional[str],
+               tokens: FrozenSet[str], threshold: float, min_overlap: int) -> Optional[str]:
+    """
+    Pick the duplicate among (ticket_id, fingerprint, tokens) candidates,
+    newest first. Besides an identical fingerprint, a candidate must share at
+    least `min_overlap` content tokens and reach `threshold` content-token
+    Jaccard similarity.
+    """
+    content = content_tokens(tokens)
+    best_id, best_score = None, 0.0
+    for ticket_id, candidate_fingerprint, candidate_tokens in candidates:
+        if fingerprint is not None and candidate_fingerprint == fingerprint:
+            return ticket_id
+        candidate = content_tokens(frozenset(candidate_tokens.split()))
+        if len(content & candidate) < min_overlap:
+            continue
+        score = jaccard(content, candidate)
+        if score > best_score:
+            best_id, best_score = ticket_id, score
+    return best_id if best_score >= threshold else None
+
+class MemoryTicketStore:
+    def __init__(self):
+        self._tickets: Dict[str, dict] = {}
+        self._follow_ups: Dict[str, List[dict]] = {}
+        # (user_id, intent) -> ticket ids in creation order, for duplicate lookup
+        self._by_scope: Dict[Tuple[Optional[str], Optional[str]], List[str]] = {}
+        self._lock = threading.Lock()
+
+    def create_many(self, tickets: Iterable[dict]) -> None:
+        with self._lock:
+            for ticket in tickets:
+                self._tickets[ticket["ticket_id"]] = ticket
+                self._by_scope.setdefault((ticket["user_id"], ticket["intent"]), []).append(ticket["ticket_id"])
+
+    def create(self, ticket: dict) -> None:
+        self.create_many([ticket])
+
+    def get(self, ticket_id: str) -> Optional[dict]:
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                return None
+            return {**ticket, "follow_up_messages": list(self._follow_ups.get(ticket_id, []))}
+
+    def update_status(self, ticket_id: str, status: str) -> bool:
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                return False
+            ticket["status"] = status
+            return True
+
+    def find_duplicate(self, user_id: str, intent: str, fingerprint: Optional[str], tokens: FrozenSet[str],
+                       since: float, threshold: float, min_overlap: int) -> Optional[str]:
+        with self._lock:
+            candidates = []
+            for ticket_id in reversed(self._by_scope.get((user_id, intent), [])):
+                ticket = self._tickets[ticket_id]
+                if ticket["created_at"] < since or len(candidates) >= DUPLICATE_SCAN_LIMIT:
+                    break
+                if ticket["status"] == "open":
+                    candidates.append((ticket_id, ticket["fingerprint"], ticket["tokens"]))
+        return best_match(candidates, fingerprint, tokens, threshold, min_overlap)
+
+    def add_follow_ups(self, follow_ups: Iterable[Tuple[str, str, float]]) -> None:
+        with self._lock:
+            for ticket_id, message, created_at in follow_ups:
+                self._follow_ups.setdefault(ticket_id, []).append({"message": message, "created_at": created_at})
+                self._tickets[ticket_id]["follow_ups"] += 1
+
+    def list(self, user_id: Optional[str] = None, status: Optional[str] = None, query: Optional[str] = None,
+             limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            tickets = list(self._tickets.values())
+        tickets.sort(key=lambda t: (t["created_at"], t["ticket_id"]), reverse=True)
+        needle = query.lower() if query else None
+        matches = []
+        for ticket in tickets:
+            if after is not None and (ticket["created_at"], ticket["ticket_id"]) >= after:
+                continue
+            if user_id is not None and ticket["user_id"] != user_id:
+                continue
+            if status is not None and ticket["status"] != status:
+                continue
+            if needle is not None and needle not in ticket["summary"].lower():
+                continue
+            matches.append(ticket)
+            if len(matches) > limit:
+                break
+        return _page(matches, limit)
+
+class SQLiteTicketStore:
+    _COLUMNS = "ticket_id, user_id, summary, details, status, created_at, intent, fingerprint, tokens, follow_ups"
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits don't fsync, so an insert costs microseconds
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            " ticket_id TEXT PRIMARY KEY, user_id TEXT, summary TEXT NOT NULL, details TEXT NOT NULL,"
+            " status TEXT NOT NULL, created_at REAL NOT NULL, intent TEXT, fingerprint TEXT,"
+            " tokens TEXT NOT NULL DEFAULT '', follow_ups INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ticket_follow_ups ("
+            " ticket_id TEXT NOT NULL, message TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tickets_user_created ON tickets (user_id, created_at, ticket_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tickets_status_created ON tickets (status, created_at, ticket_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tickets_created ON tickets (created_at, ticket_id)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tickets_dedup ON tickets (user_id, intent, status, created_at)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ticket_follow_ups_ticket ON ticket_follow_ups (ticket_id)")
+
+    @staticmethod
+    def _row(ticket: dict) -> tuple:
+        return (ticket["ticket_id"], ticket["user_id"], ticket["summary"],
+                json.dumps(ticket["details"], default=str), ticket["status"], ticket["created_at"],
+                ticket.get("intent"), ticket.get("fingerprint"), ticket.get("tokens", ""), ticket.get("follow_ups", 0))
+
+    @staticmethod
+    def _ticket(row: tuple) -> dict:
+        ticket_id, user_id, summary, details, status, created_at, intent, fingerprint, tokens, follow_ups = row
+        return {"ticket_id": ticket_id, "user_id": user_id, "summary": summary,
+                "details": json.loads(details), "status": status, "created_at": created_at,
+                "intent": intent, "fingerprint": fingerprint, "tokens": tokens, "follow_ups": follow_ups}
+
+    def create_many(self, tickets: Iterable[dict]) -> None:
+        rows = [self._row(ticket) for ticket in tickets]
+        if not rows:
+            return
+        with self._lock:
+            # One transaction for the whole batch
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(f"INSERT INTO tickets ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def create(self, ticket: dict) -> None:
+        with self._lock:
+            self._conn.execute(f"INSERT INTO tickets ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               self._row(ticket))
+
+    def get(self, ticket_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM tickets WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+            follow_ups = self._conn.execute(
+                "SELECT message, created_at FROM ticket_follow_ups WHERE ticket_id = ? ORDER BY created_at",
+                (ticket_id,),
+            ).fetchall() if row else []
+        if row is None:
+            return None
+        ticket = self._ticket(row)
+        ticket["follow_up_messages"] = [{"message": m, "created_at": ts} for m, ts in follow_ups]
+        return ticket
+
+    def update_status(self, ticket_id: str, status: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("UPDATE tickets SET status = ? WHERE ticket_id = ?", (status, ticket_id))
+        return cursor.rowcount > 0
+
+    def find_duplicate(self, user_id: str, intent: str, fingerprint: Optional[str], tokens: FrozenSet[str],
+                       since: float, threshold: float, min_overlap: int) -> Optional[str]:
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT ticket_id, fingerprint, tokens FROM tickets"
+                " WHERE user_id = ? AND intent = ? AND status = 'open' AND created_at >= ?"
+                " ORDER BY created_at DESC LIMIT ?",
+                (user_id, intent, since, DUPLICATE_SCAN_LIMIT),
+            ).fetchall()
+        return best_match(candidates, fingerprint, tokens, threshold, min_overlap)
+
+    def add_follow_ups(self, follow_ups: Iterable[Tuple[str, str, float]]) -> None:
+        rows = list(follow_ups)
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT INTO ticket_follow_ups VALUES (?, ?, ?)", rows)
+                self._conn.executemany(
+                    "UPDATE tickets SET follow_ups = follow_ups + 1 WHERE ticket_id = ?",
+                    [(ticket_id,) for ticket_id, _, _ in rows],
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def list(self, user_id: Optional[str] = None, status: Optional[str] = None, query: Optional[str] = None,
+             limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if query:
+            # Substring search is a scan, but only over rows the index range selects
+            clauses.append("summary LIKE ? ESCAPE '\\'")
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if cursor:
+            clauses.append("(created_at, ticket_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM tickets "
+                f"{where} ORDER BY created_at DESC, ticket_id DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        return _page([self._ticket(row) for row in rows], limit)
+
+def ticket_store_from_settings():
+    if settings.TICKET_STORE_BACKEND == "memory":
+        return MemoryTicketStore()
+    return SQLiteTicketStore(settings.TICKET_STORE_SQLITE_PATH)
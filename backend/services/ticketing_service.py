@@ -1,9 +1,139 @@
-import uuid 
+import asyncio
+import time
+import uuid
+import weakref
+from typing import List, Optional, Set, Tuple
 
-_FAKE_TICKETS = {} 
+from backend.config import settings
+from backend.services import http_client
+from backend.services.ticket_store import STATUSES, best_match, new_ticket, ticket_store_from_settings
+from backend.utils.metrics import TICKETS_FILED
 
-def create_ticket(summary: str, details: dict) -> str: 
-    ticket_id = str(uuid.uuid4())[:8]
-    _FAKE_TICKETS[ticket_id] = {"summary": summary, "details": details}
+# Built-in ticket repository used unless TICKETING_BACKEND=http
+ticket_store = ticket_store_from_settings()
 
-    return ticket_id 
\ No newline at end of file
+def _tickets_url() -> str:
+    return f"{settings.TICKETING_SYSTEM_URL}/tickets"
+
+def _http_request(summary: str, details: dict) -> dict:
+    # Retries may resend the POST; the key lets the ticketing system dedupe it
+    return {
+        "json": {"summary": summary, "details": details},
+        "headers": {"Idempotency-Key": str(uuid.uuid4())},
+    }
+
+def create_ticket(summary: str, details: dict, user_id: Optional[str] = None) -> str:
+    if settings.TICKETING_BACKEND == "http":
+        response = http_client.request("POST", _tickets_url(), **_http_request(summary, details))
+        return response.json()["ticket_id"]
+
+    ticket = new_ticket(summary, details, user_id)
+    ticket_store.create(ticket)
+    return ticket["ticket_id"]
+
+def _file_tickets(items: List[dict]) -> List[dict]:
+    """
+    Open a ticket per item, unless the same user already has a recent open
+    ticket for the same intent and a near-identical message (in the store, or
+    earlier in this batch): then the message is attached to that ticket as a
+    follow-up. Returns {"ticket_id", "follow_up"} per item.
+    """
+    since = time.time() - settings.TICKET_DEDUP_WINDOW_SECONDS
+    threshold = settings.TICKET_DEDUP_THRESHOLD
+    min_overlap = settings.TICKET_DEDUP_MIN_OVERLAP
+    outcomes, fresh, follow_ups = [], [], []
+    for item in items:
+        ticket = new_ticket(item["summary"], item["details"], item.get("user_id"),
+                            intent=item.get("intent"), message=item.get("message"))
+        match = None
+        if item.get("dedup") and settings.TICKET_DEDUP_ENABLED and ticket["intent"] and ticket["tokens"]:
+            tokens = frozenset(ticket["tokens"].split())
+            match = best_match(
+                [(t["ticket_id"], t["fingerprint"], t["tokens"]) for t in reversed(fresh)
+                 if t["user_id"] == ticket["user_id"] and t["intent"] == ticket["intent"]],
+                ticket["fingerprint"], tokens, threshold, min_overlap,
+            ) or ticket_store.find_duplicate(ticket["user_id"], ticket["intent"], ticket["fingerprint"],
+                                             tokens, since, threshold, min_overlap)
+        if match:
+            follow_ups.append((match, item.get("message") or item["summary"], ticket["created_at"]))
+            outcomes.append({"ticket_id": match, "follow_up": True})
+        else:
+            fresh.append(ticket)
+            outcomes.append({"ticket_id": ticket["ticket_id"], "follow_up": False})
+    ticket_store.create_many(fresh)
+    ticket_store.add_follow_ups(follow_ups)
+    TICKETS_FILED.labels(result="created").inc(len(fresh))
+    TICKETS_FILED.labels(result="follow_up").inc(len(follow_ups))
+    return outcomes
+
+def file_ticket(summary: str, details: dict, user_id: str, intent: Optional[str], message: str) -> dict:
+    """Like create_ticket, but a repeat of an open request attaches to its ticket."""
+    if settings.TICKETING_BACKEND == "http":
+        # The external system owns its tickets (and any deduplication)
+        return {"ticket_id": create_ticket(summary, details, user_id), "follow_up": False}
+    item = {"summary": summary, "details": details, "user_id": user_id, "intent": intent,
+            "message": message, "dedup": True}
+    return _file_tickets([item])[0]
+
+# Async escalations that land in the same event-loop tick (e.g. a /chat/batch
+# replay, or a burst of retries during an outage) are handled together: one
+# bulk insert in a worker thread, with duplicates inside the burst collapsed
+# onto one ticket
+_pending: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, list]" = weakref.WeakKeyDictionary()
+# Running flush tasks; the loop itself only keeps weak references to tasks
+_flushes: Set[asyncio.Task] = set()
+
+async def _flush_pending(loop: asyncio.AbstractEventLoop) -> None:
+    batch = _pending.pop(loop, [])
+    try:
+        outcomes = await asyncio.to_thread(_file_tickets, [item for item, _ in batch])
+    except asyncio.CancelledError:
+        for _, future in batch:
+            future.cancel()
+        raise
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for (_, future), outcome in zip(batch, outcomes):
+        if not future.done():
+            future.set_result(outcome)
+
+def _submit(item: dict) -> asyncio.Future:
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    batch = _pending.get(loop)
+    if batch is None:
+        batch = _pending[loop] = []
+        # The task's first step runs on the next loop iteration, after this tick's submissions
+        task = loop.create_task(_flush_pending(loop))
+        _flushes.add(task)
+        task.add_done_callback(_flushes.discard)
+    batch.append((item, future))
+    return future
+
+async def create_ticket_async(summary: str, details: dict, user_id: Optional[str] = None) -> str:
+    if settings.TICKETING_BACKEND == "http":
+        response = await http_client.request_async("POST", _tickets_url(), **_http_request(summary, details))
+        return response.json()["ticket_id"]
+    outcome = await _submit({"summary": summary, "details": details, "user_id": user_id})
+    return outcome["ticket_id"]
+
+async def file_ticket_async(summary: str, details: dict, user_id: str, intent: Optional[str], message: str) -> dict:
+    if settings.TICKETING_BACKEND == "http":
+        return {"ticket_id": await create_ticket_async(summary, details, user_id), "follow_up": False}
+    return await _submit({"summary": summary, "details": details, "user_id": user_id, "intent": intent,
+                          "message": message, "dedup": True})
+
+def get_ticket(ticket_id: str) -> Optional[dict]:
+    return ticket_store.get(ticket_id)
+
+def update_ticket_status(ticket_id: str, status: str) -> bool:
+    if status not in STATUSES:
+        raise ValueError(f"Unknown status {status!r}; expected one of {', '.join(STATUSES)}")
+    return ticket_store.update_status(ticket_id, status)
+
+def list_tickets(user_id: Optional[str] = None, status: Optional[str] = None, query: Optional[str] = None,
+                 limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    return ticket_store.list(user_id, status, query, limit, cursor)
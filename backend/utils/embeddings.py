@@ -0,0 +1,89 @@
+"""
+Text embedders for the knowledge index.
+
+- hashing (default): CPU-only, no model download. Word, word-bigram and
+  character-trigram features are hashed (signed) into a fixed number of
+  dimensions with sublinear term frequency and L2 normalization, so cosine
+  similarity is a dot product. Good at lexical overlap, blind to synonyms
+  the documents never use.
+- azure_openai: the Azure OpenAI embeddings API, using
+  KNOWLEDGE_EMBEDDING_DEPLOYMENT on the configured endpoint.
+
+Every embedder returns float32 rows of unit length and has a `signature`
+that the index stores, so switching embedders triggers a rebuild instead of
+mixing incompatible vectors.
+"""
+import math
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+from backend.config import settings
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.signature = f"hashing-v1-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower().replace("’", "'"))
+        feats = [f"w:{t}" for t in tokens]
+        feats += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for t in tokens:
+            padded = f"<{t}>"
+            feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return feats
+
+    def _embed_one(self, text: str, row: np.ndarray) -> None:
+        counts = {}
+        for feature in self._features(text):
+            # crc32 is stable across processes, unlike the builtin hash()
+            h = zlib.crc32(feature.encode("utf-8"))
+            counts[h] = counts.get(h, 0) + 1
+        for h, count in counts.items():
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            row[h % self.dim] += sign * (1.0 + math.log(count))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._embed_one(text, matrix[i])
+        return _normalize_rows(matrix)
+
+class AzureOpenAIEmbedder:
+    BATCH_SIZE = 64
+
+    def __init__(self, deployment: str):
+        from openai import AzureOpenAI
+
+        self.deployment = deployment
+        self.signature = f"azure-openai-{deployment}"
+        self._client = AzureOpenAI(
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            response = self._client.embeddings.create(
+                model=self.deployment, input=texts[start:start + self.BATCH_SIZE]
+            )
+            rows += [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        return _normalize_rows(np.asarray(rows, dtype=np.float32))
+
+def embedder_from_settings():
+    if settings.KNOWLEDGE_EMBEDDER == "azure_openai":
+        return AzureOpenAIEmbedder(settings.KNOWLEDGE_EMBEDDING_DEPLOYMENT)
+    return HashingEmbedder(settings.KNOWLEDGE_EMBEDDING_DIM)
@@ -0,0 +1,151 @@
+"""
+Response cache for deterministic (temperature=0) LLM calls.
+
+Entries are keyed on (deployment, system-prompt hash, normalized user prompt).
+Tiers:
+- in-process LRU + TTL (always on when the cache is enabled),
+- optional SQLite file that survives restarts (LLM_CACHE_SQLITE_PATH),
+- optional near-duplicate lookup over the in-process tier for callers that
+  opt in (token-set Jaccard >= LLM_CACHE_NEAR_DUPLICATE_THRESHOLD).
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from backend.config import settings
+from backend.utils.cache import TTLCache
+
+_WS_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalize_prompt(text: str) -> str:
+    # Whitespace only: prompts may carry case-sensitive ids (e.g. user_id)
+    return _WS_RE.sub(" ", text).strip()
+
+def _token_set(text: str) -> frozenset:
+    return frozenset(_TOKEN_RE.findall(text.lower()))
+
+class SQLiteCacheTier:
+    # Prune expired rows once every this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] + self.ttl_seconds <= time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, now),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl_seconds,)
+                )
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int, ttl_seconds: float,
+                 sqlite_path: str = "", near_duplicate_threshold: float = 0.0):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = SQLiteCacheTier(sqlite_path, ttl_seconds) if sqlite_path else None
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self._lock = threading.Lock()
+        self._stats = {"disk_hits": 0, "near_duplicate_hits": 0, "stores": 0}
+
+    @classmethod
+    def from_settings(cls) -> Optional["LLMResponseCache"]:
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+        return cls(
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+            sqlite_path=settings.LLM_CACHE_SQLITE_PATH,
+            near_duplicate_threshold=settings.LLM_CACHE_NEAR_DUPLICATE_THRESHOLD,
+        )
+
+    def make_key(self, deployment: str, system_prompt: str, user_prompt: str) -> str:
+        return _sha256(f"{deployment}\x00{_sha256(system_prompt)}\x00{normalize_prompt(user_prompt)}")
+
+    def get(self, deployment: str, system_prompt: str, user_prompt: str,
+            allow_near_duplicate: bool = False) -> Optional[str]:
+        key = self.make_key(deployment, system_prompt, user_prompt)
+        entry = self.memory.get(key)
+        if entry is not None:
+            return entry[0]
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self._bump("disk_hits")
+                self._remember(key, deployment, system_prompt, user_prompt, value)
+                return value
+
+        if allow_near_duplicate and self.near_duplicate_threshold > 0:
+            return self._near_duplicate(deployment, system_prompt, user_prompt)
+        return None
+
+    def set(self, deployment: str, system_prompt: str, user_prompt: str, value: str) -> None:
+        key = self.make_key(deployment, system_prompt, user_prompt)
+        self._remember(key, deployment, system_prompt, user_prompt, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+        self._bump("stores")
+
+    def _remember(self, key, deployment, system_prompt, user_prompt, value) -> None:
+        scope = (deployment, _sha256(system_prompt))
+        self.memory.set(key, (value, scope, _token_set(user_prompt)))
+
+    def _near_duplicate(self, deployment: str, system_prompt: str, user_prompt: str) -> Optional[str]:
+        scope = (deployment, _sha256(system_prompt))
+        tokens = _token_set(user_prompt)
+        if not tokens:
+            return None
+        best_value, best_score = None, 0.0
+        # Linear scan is bounded by LLM_CACHE_MAX_ENTRIES
+        for _, (value, entry_scope, entry_tokens) in self.memory.items():
+            if entry_scope != scope or not entry_tokens:
+                continue
+            score = len(tokens & entry_tokens) / len(tokens | entry_tokens)
+            if score > best_score:
+                best_value, best_score = value, score
+        if best_score >= self.near_duplicate_threshold:
+            self._bump("near_duplicate_hits")
+            return best_value
+        return None
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        with self._lock:
+            stats.update(self._stats)
+        stats["disk_enabled"] = self.disk is not None
+        return stats
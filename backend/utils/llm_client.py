@@ -1,14 +1,16 @@
+import asyncio
+import hashlib
+import json
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-from openai import AzureOpenAI
+import time
+from contextvars import ContextVar
+from typing import Optional
 from backend.config import settings
+from backend.utils.llm_cache import LLMResponseCache
+from backend.utils.llm_resilience import Deployment, DeploymentPool, prompt_tokens
+from backend.utils.metrics import LLM_LATENCY, LLM_REQUESTS, observe_llm_usage
 
-# Ensure environment variables from backend/.env are available
-project_root = Path(__file__).parent.parent.parent
-dotenv_path = project_root / "backend" / ".env"
-load_dotenv(dotenv_path=dotenv_path)
-
+# backend/.env is loaded once, by backend.config.settings
 # Prefer configuration from settings, with environment fallbacks
 AZURE_OPENAI_API_KEY = settings.AZURE_OPENAI_API_KEY or os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = settings.AZURE_OPENAI_ENDPOINT or os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -22,44 +24,173 @@ AZURE_OPENAI_DEPLOYMENT = (
     or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 )
 
-# Lazily create client; avoid import-time crashes when envs are missing
-_client: AzureOpenAI | None = None
+# Deployments (with rate limits, retries and failover) are set up lazily;
+# avoid import-time crashes when envs are missing
+pool: DeploymentPool | None = None
+
+# Shared response cache; None when LLM_CACHE_ENABLED is false
+response_cache = LLMResponseCache.from_settings()
 
-def _get_client() -> AzureOpenAI:
-    global _client
-    if _client is not None:
-        return _client
-    if not (AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT):
-        raise RuntimeError(
-            "Azure OpenAI configuration missing. Please set AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT in your .env or environment."
+def _get_pool() -> DeploymentPool:
+    global pool
+    if pool is None:
+        pool = DeploymentPool.from_settings(
+            AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION, AZURE_OPENAI_DEPLOYMENT
         )
-    _client = AzureOpenAI(
-        api_key=AZURE_OPENAI_API_KEY,
-        api_version=AZURE_OPENAI_API_VERSION,
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    )
-    return _client
+    return pool
 
-def call_llm(system_prompt: str, user_prompt: str) -> str:
+def use_clients(client=None, async_client=None) -> None:
     """
-    Call Azure OpenAI Chat Completions and return the response text.
-    Used by TriageAgent and PlannerAgent.
+    Swap in OpenAI-compatible clients (anything exposing chat.completions.create),
+    e.g. a local mock for benchmarks. They are wrapped in a single deployment so
+    limits and retries still apply. Passing None restores the configured deployments.
     """
-    if not AZURE_OPENAI_DEPLOYMENT:
-        raise RuntimeError(
-            "Azure OpenAI deployment name not set. Set AZURE_OPENAI_DEPLOYMENT_NAME (preferred) or AZURE_OPENAI_DEPLOYMENT in your .env or environment."
-        )
-    client = _get_client()
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT,  # this is the deployment name
-        temperature=0.0,                # deterministic for planning / classification
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-    )
+    global pool
+    if client is None and async_client is None:
+        pool = None
+        return
+    deployment = Deployment("injected", AZURE_OPENAI_DEPLOYMENT, client=client, async_client=async_client,
+                            endpoint=AZURE_OPENAI_ENDPOINT, api_key=AZURE_OPENAI_API_KEY,
+                            api_version=AZURE_OPENAI_API_VERSION)
+    pool = DeploymentPool([deployment], settings.LLM_MAX_CONCURRENCY, settings.LLM_MAX_RETRIES)
+
+async def warm_up(connect: bool = False) -> None:
+    """Build the deployment pool and its SDK clients ahead of the first call (see DeploymentPool.warm_up)."""
+    await _get_pool().warm_up(connect)
+
+async def aclose() -> None:
+    """Close pooled LLM connections (call on application shutdown)."""
+    if pool is not None:
+        await pool.aclose()
 
+def pool_stats() -> dict:
+    return pool.stats() if pool is not None else {"deployments": []}
+
+def _build_messages(system_prompt: str, user_prompt: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+def _extract_content(response) -> str:
     content = response.choices[0].message.content
     if content is None:
         raise ValueError("LLM returned empty content")
     return content
+
+def _cache_get(system_prompt: str, user_prompt: str, allow_near_duplicate: bool):
+    if response_cache is None:
+        return None
+    return response_cache.get(
+        AZURE_OPENAI_DEPLOYMENT or "", system_prompt, user_prompt, allow_near_duplicate
+    )
+
+def _is_json(content: str) -> bool:
+    try:
+        json.loads(content)
+        return True
+    except ValueError:
+        return False
+
+def _cache_set(system_prompt: str, user_prompt: str, content: str) -> None:
+    # Every caller asks for JSON; never pin a malformed response in the cache
+    if response_cache is not None and _is_json(content):
+        response_cache.set(AZURE_OPENAI_DEPLOYMENT or "", system_prompt, user_prompt, content)
+
+def cache_stats() -> dict:
+    return response_cache.stats() if response_cache else {"enabled": False}
+
+# Per-request tally (see track_usage). Tasks started from a request, such as a
+# coalesced call, share its dict, so tokens are counted once, by the caller
+# that actually made the API call.
+_usage: ContextVar[Optional[dict]] = ContextVar("llm_usage", default=None)
+
+def track_usage() -> dict:
+    """Start counting LLM calls and tokens for the current request; returns the live tally."""
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    _usage.set(usage)
+    return usage
+
+def _observe(response, mode: str, started: float, messages: list) -> None:
+    LLM_LATENCY.labels(mode=mode).observe(time.perf_counter() - started)
+    LLM_REQUESTS.labels(result="ok").inc()
+    observe_llm_usage(response)
+    usage = _usage.get()
+    if usage is not None:
+        reported = getattr(response, "usage", None)
+        usage["calls"] += 1
+        # Fall back to the local count for clients that don't report usage
+        usage["prompt_tokens"] += getattr(reported, "prompt_tokens", None) or prompt_tokens(messages)
+        usage["completion_tokens"] += getattr(reported, "completion_tokens", None) or 0
+
+def _params(response_format: Optional[dict]) -> dict:
+    params = {"temperature": 0.0}  # deterministic for planning / classification
+    if response_format is not None:
+        params["response_format"] = response_format
+    return params
+
+def call_llm(system_prompt: str, user_prompt: str, allow_near_duplicate: bool = False,
+             response_format: Optional[dict] = None) -> str:
+    """
+    Call Azure OpenAI Chat Completions and return the response text.
+    Used by TriageAgent and PlannerAgent.
+
+    Responses are cached; pass allow_near_duplicate=True only when the output
+    does not depend on exact prompt details (e.g. triage, not planning).
+    response_format is passed through as-is (see utils.structured_output).
+    """
+    cached = _cache_get(system_prompt, user_prompt, allow_near_duplicate)
+    if cached is not None:
+        LLM_REQUESTS.labels(result="cache_hit").inc()
+        return cached
+
+    messages = _build_messages(system_prompt, user_prompt)
+    started = time.perf_counter()
+    try:
+        response = _get_pool().complete(messages, **_params(response_format))
+    except Exception:
+        LLM_REQUESTS.labels(result="error").inc()
+        raise
+    _observe(response, "sync", started, messages)
+    content = _extract_content(response)
+    _cache_set(system_prompt, user_prompt, content)
+    return content
+
+# Identical async calls already in flight share one request (e.g. within a batch replay)
+_inflight: dict = {}
+
+async def call_llm_async(system_prompt: str, user_prompt: str, allow_near_duplicate: bool = False,
+                         response_format: Optional[dict] = None) -> str:
+    """
+    Async variant of call_llm built on AsyncAzureOpenAI.
+    Used by the async /chat pipeline so the event loop is never blocked on the LLM.
+    Concurrent identical calls are coalesced into a single request.
+    """
+    cached = _cache_get(system_prompt, user_prompt, allow_near_duplicate)
+    if cached is not None:
+        LLM_REQUESTS.labels(result="cache_hit").inc()
+        return cached
+
+    key = hashlib.sha256(f"{system_prompt}\x00{user_prompt}".encode("utf-8")).hexdigest()
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_complete_async(system_prompt, user_prompt, response_format))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        LLM_REQUESTS.labels(result="coalesced").inc()
+    # shield: one caller being cancelled must not cancel the shared request
+    return await asyncio.shield(task)
+
+async def _complete_async(system_prompt: str, user_prompt: str, response_format: Optional[dict]) -> str:
+    messages = _build_messages(system_prompt, user_prompt)
+    started = time.perf_counter()
+    try:
+        response = await _get_pool().complete_async(messages, **_params(response_format))
+    except Exception:
+        LLM_REQUESTS.labels(result="error").inc()
+        raise
+    _observe(response, "async", started, messages)
+    content = _extract_content(response)
+    _cache_set(system_prompt, user_prompt, content)
+    return content
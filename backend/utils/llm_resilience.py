@@ -0,0 +1,529 @@
+"""
+Resilience layer between call_llm and the Azure OpenAI deployments.
+
+Every request goes through:
+- a concurrency cap (LLM_MAX_CONCURRENCY in-flight calls in total, shared by
+  sync threads and every event loop),
+- per-deployment request/token buckets mirroring Azure's RPM/TPM quotas, so
+  bursts queue locally instead of collecting 429s,
+- a per-deployment circuit breaker that stops sending traffic after repeated
+  failures and lets a single probe through after a cool-down,
+- weighted selection across healthy deployments, failing over on 429, 5xx,
+  timeouts and connection errors, and honoring Retry-After.
+
+Deployments come from LLM_DEPLOYMENTS (a JSON list) or, when that is unset,
+the single AZURE_OPENAI_* deployment.
+
+The openai SDK is imported when the first client is built rather than at
+import time; it is the single largest contributor to cold-start time.
+"""
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from backend.config import settings
+from backend.utils.logger import get_logger
+from backend.utils.metrics import LLM_RATE_LIMIT_WAIT, LLM_RETRIES
+from backend.utils.prompt_builder import count_tokens
+
+logger = get_logger(__name__)
+
+class LLMUnavailableError(RuntimeError):
+    """No deployment can take the request (open circuits or long Retry-After)."""
+
+class TokenBucket:
+    """Per-minute budget refilled continuously. A limit of 0 means unlimited."""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._clock = clock
+        self._available = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` would be available, without taking it."""
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self._available
+        return max(0.0, missing / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` now (the balance may go negative) and return how long the
+        caller must wait before using it. Reservations queue in arrival order.
+        """
+        if self.capacity <= 0:
+            return 0.0
+        # A single request larger than the whole budget must not wait forever
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self._available -= amount
+            return 0.0 if self._available >= 0 else -self._available / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or charge (negative) the estimate's error."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._available = min(self.capacity, self._available + amount)
+
+class ConcurrencyLimit:
+    """
+    A semaphore shared by threads and every event loop. A released slot is
+    handed to the oldest waiter: blocked threads wake on an Event, coroutines
+    on a future resolved in their own loop, so async waiters hold no thread.
+    A limit of 0 means unlimited.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._used = 0
+        self._waiters: deque = deque()  # threading.Event or (loop, future)
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> bool:
+        if self.limit <= 0 or (self._used < self.limit and not self._waiters):
+            self._used += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._try_take():
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_take():
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            # A slot handed to us just before the cancellation goes to the next waiter
+            if handed_over:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._used -= 1
+                    return
+                waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+                return
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(_hand_over, future)
+                return
+            except RuntimeError:
+                # Its loop is closed; offer the slot to the next waiter
+                continue
+
+def _hand_over(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; after
+    `reset_seconds` one probe is let through (half-open) and its outcome
+    closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._changed_at = 0.0
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        if self.state == "closed":
+            return True
+        # open: wait out the reset period; half-open: a probe is in flight, but
+        # allow another if it never reported back
+        return self._clock() - self._changed_at >= self.reset_seconds
+
+    def begin(self) -> None:
+        with self._lock:
+            if self.state != "closed" and self._clock() - self._changed_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._changed_at = self._clock()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened += 1
+                self._changed_at = self._clock()
+
+class Deployment:
+    def __init__(self, name: str, model: str, weight: float = 1.0, endpoint: Optional[str] = None,
+                 api_key: Optional[str] = None, api_version: Optional[str] = None,
+                 rpm: float = 0, tpm: float = 0, client=None, async_client=None, clock=time.monotonic):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.api_version = api_version
+        self.requests = TokenBucket(rpm, clock)
+        self.tokens = TokenBucket(tpm, clock)
+        self.breaker = CircuitBreaker(
+            settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS, clock)
+        self.cooldown_until = 0.0
+        self._client = client
+        self._async_client = async_client
+        self._owns_clients = client is None and async_client is None
+
+    def _client_kwargs(self) -> dict:
+        if not (self.api_key and self.endpoint):
+            raise RuntimeError(
+                "Azure OpenAI configuration missing. Please set AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT in your .env or environment."
+            )
+        if not self.model:
+            raise RuntimeError(
+                "Azure OpenAI deployment name not set. Set AZURE_OPENAI_DEPLOYMENT_NAME (preferred) or AZURE_OPENAI_DEPLOYMENT in your .env or environment."
+            )
+        # Retries are handled here, across deployments, not inside the SDK
+        return {
+            "api_key": self.api_key,
+            "api_version": self.api_version,
+            "azure_endpoint": self.endpoint,
+            "timeout": settings.LLM_TIMEOUT_SECONDS,
+            "max_retries": 0,
+        }
+
+    def get_client(self):
+        if self._client is None:
+            from openai import AzureOpenAI
+
+            self._client = AzureOpenAI(**self._client_kwargs())
+        return self._client
+
+    def get_async_client(self):
+        if self._async_client is None:
+            from openai import AsyncAzureOpenAI
+
+            self._async_client = AsyncAzureOpenAI(**self._client_kwargs())
+        return self._async_client
+
+    async def warm_up(self, connect: bool = False) -> None:
+        """
+        Build both SDK clients now. With connect=True, also list models on the
+        async client so its pooled connection is open (TCP + TLS) before the
+        first chat call; the call costs no tokens.
+        """
+        self.get_client()
+        client = self.get_async_client()
+        if connect and self._owns_clients:
+            await client.models.list()
+
+    async def aclose(self) -> None:
+        """Close SDK clients this deployment created (injected ones are left alone)."""
+        if not self._owns_clients:
+            return
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def quota_wait(self, tokens: float) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def reserve(self, tokens: float) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def refund(self, tokens: float) -> None:
+        """Give back a reservation whose request was never sent."""
+        self.requests.adjust(1)
+        self.tokens.adjust(tokens)
+
+    def stats(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "weight": self.weight,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 3),
+        }
+
+def estimate_tokens(messages: list) -> int:
+    """Locally counted prompt size plus the expected completion."""
+    return prompt_tokens(messages) + settings.LLM_EXPECTED_COMPLETION_TOKENS
+
+def prompt_tokens(messages: list) -> int:
+    return sum(count_tokens(m.get("content") or "") for m in messages)
+
+def _retry_after(error) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass  # HTTP-date form; fall back to computed backoff
+    return None
+
+def classify_error(error) -> Tuple[Optional[str], Optional[float]]:
+    """Return (reason, retry_after) for retryable errors, (None, None) otherwise."""
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate_limited", _retry_after(error)
+    if status is not None:
+        return ("server_error", _retry_after(error)) if status >= 500 else (None, None)
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout", None
+    # An SDK error means the SDK is loaded; injected clients may never load it
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        if isinstance(error, openai.APITimeoutError):
+            return "timeout", None
+        if isinstance(error, openai.APIConnectionError):
+            return "connection_error", None
+    return None, None
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+
+class DeploymentPool:
+    def __init__(self, deployments: List[Deployment], max_concurrency: int, max_retries: int,
+                 clock=time.monotonic):
+        if not deployments:
+            raise ValueError("At least one LLM deployment is required")
+        self.deployments = deployments
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._clock = clock
+        self._random = random.Random()
+        self._slots = ConcurrencyLimit(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._retries = 0
+
+    @classmethod
+    def from_settings(cls, api_key: Optional[str], endpoint: Optional[str], api_version: Optional[str],
+                      model: Optional[str]) -> "DeploymentPool":
+        """
+        LLM_DEPLOYMENTS entries look like
+        {"name": "eastus", "endpoint": "...", "deployment": "gpt-4o", "weight": 2, "rpm": 300, "tpm": 50000}
+        and fall back to the AZURE_OPENAI_* values for anything they omit.
+        """
+        configured = json.loads(settings.LLM_DEPLOYMENTS) if settings.LLM_DEPLOYMENTS else [{}]
+        deployments = [
+            Deployment(
+                name=entry.get("name") or f"deployment-{i}",
+                model=entry.get("deployment") or model,
+                weight=float(entry.get("weight", 1.0)),
+                endpoint=entry.get("endpoint") or endpoint,
+                api_key=entry.get("api_key") or api_key,
+                api_version=entry.get("api_version") or api_version,
+                rpm=float(entry.get("rpm", settings.LLM_REQUESTS_PER_MINUTE)),
+                tpm=float(entry.get("tpm", settings.LLM_TOKENS_PER_MINUTE)),
+            )
+            for i, entry in enumerate(configured)
+        ]
+        return cls(deployments, settings.LLM_MAX_CONCURRENCY, settings.LLM_MAX_RETRIES)
+
+    # Selection
+
+    def _select(self, tokens: float) -> Tuple[Optional[Deployment], float]:
+        """
+        Pick a deployment and reserve quota on it. Returns (deployment, wait) or,
+        when every usable deployment is cooling down, (None, wait). Callers go
+        through _acquire, which gives the quota back when it refuses the wait.
+        """
+        now = self._clock()
+        usable = [d for d in self.deployments if d.breaker.available()]
+        if not usable:
+            raise LLMUnavailableError("All LLM deployments have open circuits")
+        ready = [d for d in usable if d.cooldown_until <= now]
+        if not ready:
+            return None, min(d.cooldown_until for d in usable) - now
+
+        # Prefer deployments with quota to spare right now; otherwise the one
+        # whose buckets refill soonest
+        waits = {d.name: d.quota_wait(tokens) for d in ready}
+        candidates = [d for d in ready if waits[d.name] == 0]
+        if candidates:
+            deployment = self._random.choices(candidates, weights=[d.weight for d in candidates])[0]
+        else:
+            deployment = min(ready, key=lambda d: waits[d.name])
+        return deployment, deployment.reserve(tokens)
+
+    def _acquire(self, tokens: float) -> Tuple[Optional[Deployment], float]:
+        """_select, raising LLMUnavailableError instead of waiting longer than LLM_RETRY_MAX_WAIT_SECONDS."""
+        deployment, wait = self._select(tokens)
+        if wait > settings.LLM_RETRY_MAX_WAIT_SECONDS:
+            if deployment is not None:
+                deployment.refund(tokens)
+            raise LLMUnavailableError(f"LLM deployments are rate limited for another {wait:.1f}s")
+        if deployment is not None:
+            deployment.breaker.begin()
+        return deployment, wait
+
+    def _on_failure(self, deployment: Deployment, error: Exception, attempt: int) -> None:
+        reason, retry_after = classify_error(error)
+        if reason is None:
+            raise error
+        # 429 means "slow down", not "broken": cool down but keep the circuit closed
+        if reason != "rate_limited":
+            deployment.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        if retry_after is None:
+            cap = min(settings.LLM_RETRY_MAX_WAIT_SECONDS, settings.LLM_RETRY_BASE_BACKOFF_SECONDS * (2 ** attempt))
+            retry_after = self._random.uniform(0, cap)
+        deployment.cooldown_until = max(deployment.cooldown_until, self._clock() + retry_after)
+        LLM_RETRIES.labels(reason=reason).inc()
+        with self._lock:
+            self._retries += 1
+        logger.warning("LLM call to %s failed (%s); retrying, attempt %d", deployment.name, reason, attempt + 1)
+
+    def _on_success(self, deployment: Deployment, response, tokens: float) -> None:
+        deployment.breaker.record_success()
+        used = _usage_tokens(response)
+        if used is not None:
+            deployment.tokens.adjust(tokens - used)
+
+    # Calls
+
+    def complete(self, messages: list, **params):
+        tokens = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            deployment, wait = self._acquire(tokens)
+            if wait > 0:
+                LLM_RATE_LIMIT_WAIT.observe(wait)
+                time.sleep(wait)
+            if deployment is None:
+                continue
+            try:
+                response = self._call(deployment, messages, params)
+            except Exception as e:
+                self._on_failure(deployment, e, attempt)
+                attempt += 1
+                continue
+            self._on_success(deployment, response, tokens)
+            return response
+
+    def _call(self, deployment: Deployment, messages: list, params: dict):
+        self._slots.acquire()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return deployment.get_client().chat.completions.create(
+                model=deployment.model, messages=messages, **params)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    async def complete_async(self, messages: list, **params):
+        tokens = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            deployment, wait = self._acquire(tokens)
+            if wait > 0:
+                LLM_RATE_LIMIT_WAIT.observe(wait)
+                try:
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    if deployment is not None:
+                        deployment.refund(tokens)
+                    raise
+            if deployment is None:
+                continue
+            try:
+                response = await self._call_async(deployment, messages, params)
+            except Exception as e:
+                self._on_failure(deployment, e, attempt)
+                attempt += 1
+                continue
+            self._on_success(deployment, response, tokens)
+            return response
+
+    async def _call_async(self, deployment: Deployment, messages: list, params: dict):
+        await self._slots.acquire_async()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            # Also bounds injected clients that have no timeout of their own
+            return await asyncio.wait_for(
+                deployment.get_async_client().chat.completions.create(
+                    model=deployment.model, messages=messages, **params),
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    async def warm_up(self, connect: bool = False) -> None:
+        """Warm every deployment concurrently; a deployment that fails to connect is logged, not fatal."""
+        results = await asyncio.gather(
+            *(deployment.warm_up(connect) for deployment in self.deployments), return_exceptions=True
+        )
+        for deployment, result in zip(self.deployments, results):
+            if isinstance(result, Exception):
+                logger.warning("LLM deployment %s warm-up failed: %s", deployment.name, result)
+
+    async def aclose(self) -> None:
+        for deployment in self.deployments:
+            await deployment.aclose()
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "retries": self._retries,
+            "open_circuits": sum(d.breaker.state != "closed" for d in self.deployments),
+            "deployments": [d.stats(now) for d in self.deployments],
+        }
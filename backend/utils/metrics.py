@@ -0,0 +1,241 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters and histograms are pre-declared at module level so the hot path is a
+dict lookup, a lock and a couple of additions. Components that already keep
+their own stats (caches, the triage fast path) are exported through collectors
+instead of being double-counted.
+"""
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric(ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child for one label combination."""
+
+    @abstractmethod
+    def _render_child(self, key: tuple, child) -> List[str]:
+        """Exposition lines for one child."""
+
+    def _label_pairs(self, key: tuple) -> List[Tuple[str, str]]:
+        return list(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        # labels() may add a child while we render; iterate over a snapshot
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(key, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child):
+        with child._lock:
+            value = child.value
+        return [f"{self.name}{_format_labels(self._label_pairs(key))} {_format_value(value)}"]
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if i < len(self.counts):
+                self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, key, child):
+        # Copy under the child's lock so the buckets, sum and count agree
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        pairs = self._label_pairs(key)
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(child.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(pairs + [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        """Add a callable returning already-formatted exposition lines."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+def stats_collector(prefix: str, documentation: str,
+                    get_stats: Callable[[], dict]) -> Callable[[], List[str]]:
+    """
+    Export each numeric field of a component's stats() dict as `<prefix>_<field>`.
+    Fields are untyped since such dicts mix counters and gauges.
+    """
+    def collect() -> List[str]:
+        lines = []
+        for field, value in sorted(get_stats().items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{field}"
+            lines += [f"# HELP {name} {documentation} ({field})", f"# TYPE {name} untyped",
+                      f"{name} {_format_value(value)}"]
+        return lines
+    return collect
+
+registry = Registry()
+
+# Pipeline
+STEP_LATENCY = registry.histogram(
+    "pipeline_step_duration_seconds", "Latency of each chat pipeline step", ("step",))
+CHAT_REQUESTS = registry.counter(
+    "chat_requests_total", "Chat pipeline runs by outcome", ("outcome",))
+ESCALATIONS = registry.counter(
+    "escalations_total", "Tickets created by the escalation agent", ("reason",))
+TICKETS_FILED = registry.counter(
+    "tickets_filed_total", "Escalations that opened a new ticket vs. attached to an open one", ("result",))
+SAFETY_BLOCKS = registry.counter(
+    "safety_blocks_total", "Plans blocked by the safety agent")
+ADMISSIONS = registry.counter(
+    "admission_decisions_total", "Chat requests admitted or shed, by urgency and result", ("urgency", "result"))
+ADMISSION_WAIT = registry.histogram(
+    "admission_queue_wait_seconds", "Time admitted chat requests waited in the admission queue", ("urgency",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0))
+
+# LLM
+LLM_LATENCY = registry.histogram(
+    "llm_request_duration_seconds", "Latency of LLM calls that reached the API", ("mode",))
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "LLM calls by result", ("result",))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "LLM tokens consumed", ("direction",))
+LLM_REQUEST_TOKENS = registry.histogram(
+    "llm_tokens_per_chat_request", "LLM tokens used by one chat request", ("direction",),
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+PROMPT_TRIMS = registry.counter(
+    "llm_prompt_trims_total", "Prompts trimmed to fit the token budget", ("prompt",))
+LLM_PARSES = registry.counter(
+    "llm_output_parses_total", "LLM responses validated against their schema, by agent and result",
+    ("agent", "result"))
+LLM_RETRIES = registry.counter(
+    "llm_retries_total", "LLM calls retried or failed over, by reason", ("reason",))
+LLM_RATE_LIMIT_WAIT = registry.histogram(
+    "llm_rate_limit_wait_seconds", "Time spent waiting for LLM quota or Retry-After")
+
+# Runbooks
+RUNBOOK_LATENCY = registry.histogram(
+    "runbook_duration_seconds", "Runbook execution latency", ("runbook_id", "status"))
+JOBS = registry.counter(
+    "runbook_jobs_total", "Background runbook job transitions", ("runbook_id", "event"))
+
+def render_latest() -> str:
+    return registry.render()
+
+def observe_llm_usage(response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.labels(direction="prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(direction="completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+# Prometheus' own content type for text format 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
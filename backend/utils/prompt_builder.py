@@ -0,0 +1,122 @@
+"""
+Compact, budgeted prompts for LLM calls that carry context.
+
+Context is rendered as minified JSON containing only whitelisted fields, given
+as dotted paths ("intent.domain", "user.role") in priority order. Prompts are
+measured with a local token counter (tiktoken when installed, otherwise a
+slightly pessimistic heuristic) and fitted to a per-call budget: the
+lowest-priority optional fields are dropped first, then the longest strings
+are shortened.
+"""
+import json
+import re
+from typing import Iterable, List, Optional
+
+from backend.utils.metrics import PROMPT_TRIMS
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")  # gpt-4o family
+except Exception:  # not installed, or the encoding can't be fetched offline
+    _ENCODING = None
+
+# Letters runs, up to 3 digits, or any single other character
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+# Strings are never shortened below this many characters
+MIN_STRING_CHARS = 32
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # BPE vocabularies keep common words whole and split long ones; JSON
+    # punctuation is roughly one token per character
+    return sum(1 + (len(p) - 1) // 6 if p[0].isalpha() else 1 for p in _PIECES.findall(text))
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def _lookup(context: dict, path: str):
+    value = context
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def _assign(target: dict, path: str, value) -> None:
+    *parents, leaf = path.split(".")
+    for part in parents:
+        target = target.setdefault(part, {})
+    target[leaf] = value
+
+class BuiltPrompt:
+    def __init__(self, text: str, tokens: int, dropped: List[str], truncated: List[str]):
+        self.text = text
+        self.tokens = tokens          # system + user prompt tokens
+        self.dropped = dropped        # fields removed to meet the budget
+        self.truncated = truncated    # string fields shortened to meet the budget
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.dropped or self.truncated)
+
+def build_context_prompt(name: str, system_prompt: str, context: dict, fields: Iterable[str],
+                         budget_tokens: int, required: Iterable[str] = ()) -> BuiltPrompt:
+    """
+    Render `fields` (highest priority first) from `context` as compact JSON that,
+    together with the system prompt, fits in `budget_tokens` where possible.
+    Required fields are never dropped, only shortened. `name` labels the
+    trim metric.
+    """
+    required = set(required)
+    selected = [(path, _lookup(context, path)) for path in fields]
+    selected = [(path, value) for path, value in selected if value not in (None, "", [], {})]
+    system_tokens = count_tokens(system_prompt)
+
+    def render(entries) -> str:
+        data: dict = {}
+        for path, value in entries:
+            _assign(data, path, value)
+        return compact_json(data)
+
+    text = render(selected)
+    tokens = system_tokens + count_tokens(text)
+    dropped: List[str] = []
+    truncated: List[str] = []
+
+    # 1) Drop optional fields, lowest priority first
+    for path, _ in reversed(list(selected)):
+        if tokens <= budget_tokens:
+            break
+        if path in required:
+            continue
+        selected = [(p, v) for p, v in selected if p != path]
+        dropped.append(path)
+        text = render(selected)
+        tokens = system_tokens + count_tokens(text)
+
+    # 2) Shorten the longest strings that are left
+    while tokens > budget_tokens:
+        target = _longest_string(selected)
+        if target is None:
+            break
+        index, path, value = target
+        excess_chars = (tokens - budget_tokens) * 4 + 1
+        keep = max(MIN_STRING_CHARS, len(value) - excess_chars)
+        selected[index] = (path, value[:keep] + "…")
+        if path not in truncated:
+            truncated.append(path)
+        text = render(selected)
+        tokens = system_tokens + count_tokens(text)
+
+    if dropped or truncated:
+        PROMPT_TRIMS.labels(prompt=name).inc()
+    return BuiltPrompt(text, tokens, dropped, truncated)
+
+def _longest_string(entries) -> Optional[tuple]:
+    best = None
+    for index, (path, value) in enumerate(entries):
+        if isinstance(value, str) and len(value) > MIN_STRING_CHARS + 1:
+            if best is None or len(value) > len(best[2]):
+                best = (index, path, value)
+    return best
@@ -0,0 +1,53 @@
+"""
+Structured (JSON-schema) LLM outputs parsed straight into pydantic models.
+
+response_format_for() turns a model into the `response_format` Azure OpenAI
+expects, so the service constrains decoding to the schema; parse_output()
+validates the raw text with pydantic's Rust JSON parser in one pass (no
+json.loads + dict walking) and counts successes and failures per agent.
+LLM_RESPONSE_FORMAT selects json_schema (default), json_object for
+deployments without structured outputs, or none.
+"""
+from functools import lru_cache
+from typing import Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from backend.config import settings
+from backend.utils.metrics import LLM_PARSES
+
+Model = TypeVar("Model", bound=BaseModel)
+
+def response_format_for(model: Type[BaseModel], strict: bool = True) -> Optional[dict]:
+    """
+    Strict schemas need every object closed and every property required, which
+    free-form fields (e.g. runbook inputs) can't satisfy; pass strict=False for
+    those and rely on parse_output() to enforce the model.
+    """
+    mode = settings.LLM_RESPONSE_FORMAT
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": model.__name__,
+                "schema": _schema(model),
+                "strict": strict,
+            },
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+@lru_cache(maxsize=None)
+def _schema(model: Type[BaseModel]) -> dict:
+    return model.model_json_schema()
+
+def parse_output(model: Type[Model], raw: str, agent: str) -> Optional[Model]:
+    """Validate `raw` into `model`, or return None (and count it) if it doesn't fit."""
+    try:
+        parsed = model.model_validate_json(raw)
+    except ValidationError:
+        LLM_PARSES.labels(agent=agent, result="error").inc()
+        return None
+    LLM_PARSES.labels(agent=agent, result="ok").inc()
+    return parsed
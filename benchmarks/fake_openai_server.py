@@ -0,0 +1,131 @@
+"""
+Local OpenAI-compatible chat completions server for exercising the LLM client's
+rate limiting, retries and failover without Azure.
+
+Serves both the Azure route (/openai/deployments/{deployment}/chat/completions)
+and the plain OpenAI route (/v1/chat/completions), answering with
+benchmarks.mock_llm.default_responder:
+
+    uvicorn benchmarks.fake_openai_server:app --port 9100
+
+then point AZURE_OPENAI_ENDPOINT (or LLM_DEPLOYMENTS entries) at
+http://127.0.0.1:9100 with any API key. Behaviour is set per deployment name
+through FAKE_OPENAI_DEPLOYMENTS, a JSON object such as
+{"primary": {"latency_ms": 200, "rate_429": 0.3}, "secondary": {"rpm": 60}},
+with FAKE_OPENAI_* env vars as the defaults for every deployment:
+
+    latency_ms / jitter_ms   response latency
+    rate_429                 fraction of requests answered 429 + Retry-After
+    rate_500                 fraction of requests answered 500
+    retry_after_seconds      Retry-After sent with injected 429s
+    rpm                      server-side requests-per-minute quota (0 = off)
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from benchmarks.mock_llm import default_responder
+
+DEFAULTS = {
+    "latency_ms": float(os.getenv("FAKE_OPENAI_LATENCY_MS", "100")),
+    "jitter_ms": float(os.getenv("FAKE_OPENAI_JITTER_MS", "0")),
+    "rate_429": float(os.getenv("FAKE_OPENAI_429_RATE", "0")),
+    "rate_500": float(os.getenv("FAKE_OPENAI_500_RATE", "0")),
+    "retry_after_seconds": float(os.getenv("FAKE_OPENAI_RETRY_AFTER_SECONDS", "1")),
+    "rpm": float(os.getenv("FAKE_OPENAI_RPM", "0")),
+}
+
+_overrides: Dict[str, dict] = json.loads(os.getenv("FAKE_OPENAI_DEPLOYMENTS", "{}"))
+_recent: Dict[str, Deque[float]] = defaultdict(deque)
+counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+app = FastAPI(title="Fake OpenAI-compatible server")
+
+def configure(deployment: str, **behaviour) -> None:
+    """Override behaviour for one deployment (when running in-process)."""
+    _overrides.setdefault(deployment, {}).update(behaviour)
+
+def reset() -> None:
+    _overrides.clear()
+    _recent.clear()
+    counts.clear()
+
+def _behaviour(deployment: str) -> dict:
+    return {**DEFAULTS, **_overrides.get(deployment, {})}
+
+def _error(status: int, message: str, retry_after: float = None) -> JSONResponse:
+    headers = {}
+    if retry_after is not None:
+        headers = {"retry-after": str(retry_after), "retry-after-ms": str(int(retry_after * 1000))}
+    return JSONResponse({"error": {"code": str(status), "message": message}}, status_code=status, headers=headers)
+
+def _over_quota(deployment: str, rpm: float) -> bool:
+    if rpm <= 0:
+        return False
+    now = time.monotonic()
+    window = _recent[deployment]
+    while window and now - window[0] >= 60:
+        window.popleft()
+    if len(window) >= rpm:
+        return True
+    window.append(now)
+    return False
+
+async def _complete(deployment: str, body: dict):
+    behaviour = _behaviour(deployment)
+    counts[deployment]["requests"] += 1
+
+    if _over_quota(deployment, behaviour["rpm"]) or random.random() < behaviour["rate_429"]:
+        counts[deployment]["429"] += 1
+        return _error(429, "Rate limit exceeded (injected)", behaviour["retry_after_seconds"])
+    if random.random() < behaviour["rate_500"]:
+        counts[deployment]["500"] += 1
+        return _error(500, "Internal server error (injected)")
+
+    latency_ms = behaviour["latency_ms"] + random.uniform(-behaviour["jitter_ms"], behaviour["jitter_ms"])
+    await asyncio.sleep(max(0.0, latency_ms) / 1000)
+
+    messages = body.get("messages", [])
+    system_prompt = messages[0]["content"] if messages else ""
+    user_prompt = messages[-1]["content"] if messages else ""
+    content = default_responder(system_prompt, user_prompt)
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    completion_tokens = len(content) // 4
+    counts[deployment]["ok"] += 1
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or deployment,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: Request):
+    return await _complete(deployment, await request.json())
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    return await _complete(body.get("model", "default"), body)
+
+@app.get("/stats")
+def stats():
+    return {deployment: dict(c) for deployment, c in counts.items()}
@@ -0,0 +1,89 @@
+"""
+Compare end-to-end latency of the two-stage (triage -> planner) pipeline with the
+fused single-call mode, against a mock LLM with fixed latency.
+
+The triage fast path, plan templates and LLM response cache are turned off so
+every request is LLM-bound, which is the case fused mode is meant to speed up.
+
+Usage:
+    python -m benchmarks.fused_vs_two_stage --requests 50 --latency-ms 300 -o fused.json
+"""
+import argparse
+import asyncio
+import time
+
+from backend.config import settings
+from backend.utils import llm_client
+from benchmarks.common import summarize_ms, write_json
+from benchmarks.mock_llm import MockLLM
+
+MESSAGES = [
+    "I can't log in, my account seems locked",
+    "How many vacation days do I have left?",
+    "My laptop screen is flickering",
+    "Where can I find my payslip?",
+]
+
+async def _run_mode(mode: str, mock: MockLLM, requests: int, concurrency: int) -> dict:
+    from backend.orchestrator.agent_router import handle_chat_async
+
+    settings.FUSED_TRIAGE_PLANNING = mode == "fused"
+    calls_before = mock.calls
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        # Unique text per request so in-flight coalescing can't share calls
+        message = f"{MESSAGES[i % len(MESSAGES)]} (#{i})"
+        async with semaphore:
+            started = time.perf_counter()
+            await handle_chat_async(f"bench-{i}", message)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "latency_ms": summarize_ms(latencies),
+        "llm_calls_per_request": round((mock.calls - calls_before) / requests, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fused vs two-stage triage+planning benchmark")
+    parser.add_argument("--requests", "-n", type=int, default=40)
+    parser.add_argument("--concurrency", "-c", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--output", "-o", help="Write results as JSON")
+    args = parser.parse_args()
+
+    settings.TRIAGE_FASTPATH_ENABLED = False
+    settings.PLAN_TEMPLATES_ENABLED = False
+    llm_client.response_cache = None
+
+    mock = MockLLM(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    mock.install()
+
+    results = {
+        "config": vars(args),
+        "modes": {
+            mode: asyncio.run(_run_mode(mode, mock, args.requests, args.concurrency))
+            for mode in ("two_stage", "fused")
+        },
+    }
+    two_stage, fused = results["modes"]["two_stage"], results["modes"]["fused"]
+    results["speedup_p50"] = round(two_stage["latency_ms"]["p50"] / max(fused["latency_ms"]["p50"], 1e-9), 2)
+
+    print(f"{'mode':<10} {'p50 ms':>9} {'p95 ms':>9} {'llm calls/req':>14} {'req/s':>8}")
+    for mode, r in results["modes"].items():
+        lat = r["latency_ms"]
+        print(f"{mode:<10} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {r['llm_calls_per_request']:>14} {r['requests_per_second']:>8}")
+    print(f"p50 speedup: {results['speedup_p50']}x")
+
+    if args.output:
+        write_json(args.output, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Drive the real LLM client (AzureOpenAI SDK, rate limiting, retries, failover)
+against the in-process fake OpenAI server with injected 429s.
+
+Scenarios:
+- single:   one deployment answering a share of requests with 429 + Retry-After
+- failover: the same flaky deployment (weight 3) plus a healthy one (weight 1)
+
+Usage:
+    python -m benchmarks.llm_failover --requests 200 --rate-429 0.3 -o failover.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+
+import uvicorn
+
+from backend.config import settings
+from backend.utils import llm_client
+from backend.utils.llm_resilience import DeploymentPool
+from benchmarks import fake_openai_server
+from benchmarks.common import summarize_ms, write_json
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(fake_openai_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def _run(requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await llm_client.call_llm_async("You are a test.", f"request {i}")
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    await llm_client.aclose()
+    return {
+        "latency_ms": summarize_ms(latencies),
+        "success_rate": round(len(latencies) / requests, 4),
+        "errors": errors,
+        "requests_per_second": round(requests / elapsed, 2),
+    }
+
+def _scenario(deployments: list, args) -> dict:
+    fake_openai_server.reset()
+    fake_openai_server.configure("primary", rate_429=args.rate_429, retry_after_seconds=args.retry_after)
+    settings.LLM_DEPLOYMENTS = json.dumps(deployments)
+    llm_client.pool = DeploymentPool.from_settings("fake-key", None, "2024-08-01-preview", None)
+    result = asyncio.run(_run(args.requests, args.concurrency))
+    pool = llm_client.pool_stats()
+    result["client_retries"] = pool["retries"]
+    result["server"] = fake_openai_server.stats()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM client retry/failover benchmark against a fake server")
+    parser.add_argument("--requests", "-n", type=int, default=200)
+    parser.add_argument("--concurrency", "-c", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--rate-429", type=float, default=0.3)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--output", "-o", help="Write results as JSON")
+    args = parser.parse_args()
+
+    fake_openai_server.DEFAULTS["latency_ms"] = args.latency_ms
+    # Retries are expected here; don't log each one
+    logging.getLogger("backend.utils.llm_resilience").setLevel(logging.ERROR)
+    llm_client.response_cache = None
+    port = _free_port()
+    server = _start_server(port)
+    endpoint = f"http://127.0.0.1:{port}"
+
+    primary = {"name": "primary", "endpoint": endpoint, "deployment": "primary", "weight": 3}
+    secondary = {"name": "secondary", "endpoint": endpoint, "deployment": "secondary", "weight": 1}
+    results = {
+        "config": vars(args),
+        "scenarios": {
+            "single": _scenario([primary], args),
+            "failover": _scenario([primary, secondary], args),
+        },
+    }
+    server.should_exit = True
+
+    print(f"{'scenario':<10} {'ok %':>7} {'p50 ms':>9} {'p95 ms':>9} {'retries':>8} {'req/s':>8}")
+    for name, r in results["scenarios"].items():
+        lat = r["latency_ms"]
+        print(f"{name:<10} {r['success_rate'] * 100:>6.1f}% {lat['p50']:>9.1f} {lat['p95']:>9.1f} "
+              f"{r['client_retries']:>8} {r['requests_per_second']:>8}")
+
+    if args.output:
+        write_json(args.output, results)
+
+if __name__ == "__main__":
+    main()
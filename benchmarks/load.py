@@ -0,0 +1,289 @@
+"""
+End-to-end load benchmark: the whole pipeline against a deterministic mock LLM.
+
+Each target is driven at fixed concurrency levels with the same message mix:
+- handle_chat: the sync pipeline, called from a thread pool of `concurrency`
+  workers (how batch jobs and the CLI use it),
+- http:        POST /chat through the ASGI app in-process (httpx
+               ASGITransport), so routing, validation and serialization are
+               included but no sockets are.
+
+Reported per target and level: end-to-end latency, p50/p95/p99 of every
+activity-log step (its `duration_ms`), requests/sec and error count. Memory
+per request is measured in a separate tracemalloc pass after the timed runs,
+since tracing slows allocation down enough to skew latency.
+
+Results are written as JSON tagged with the git commit; pass an earlier file
+with --compare to print the change in p50/p95/req/s per target and level.
+
+Stores that write to disk (audit log, ticket store, job queue, knowledge index) are
+pointed at a temporary directory unless already set in the environment.
+
+Usage:
+    python -m benchmarks.load --concurrency 1,8,32 --requests 200 -o load.json
+    python -m benchmarks.load --distribution lognormal --latency-ms 400 --sigma 0.6
+    python -m benchmarks.load --responses recorded.json --record --live   # record from Azure
+    python -m benchmarks.load --compare load.json
+"""
+import os
+import tempfile
+
+_SCRATCH = tempfile.mkdtemp(prefix="sd-bench-")
+for _name, _value in {
+    "AUDIT_LOG_DIR": os.path.join(_SCRATCH, "audit_logs"),
+    "TICKET_STORE_SQLITE_PATH": os.path.join(_SCRATCH, "tickets.db"),
+    "KNOWLEDGE_INDEX_DIR": os.path.join(_SCRATCH, "knowledge_index"),
+    "JOB_QUEUE_SQLITE_PATH": os.path.join(_SCRATCH, "jobs.db"),
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import httpx
+
+from backend.config import settings
+from backend.utils import llm_client
+from benchmarks.common import summarize_ms, write_json
+from benchmarks.mock_llm import DISTRIBUTIONS, MockLLM, ResponseBook, default_responder, live_responder
+
+MESSAGES = [
+    "I can't log in, my account seems locked",
+    "How many vacation days do I have left?",
+    "My laptop screen is flickering",
+    "Where can I find my payslip?",
+    "What is the remote work policy?",
+    "Can you help me with something?",
+]
+TARGETS = ("handle_chat", "http")
+
+def _message(i: int, unique: bool) -> str:
+    message = MESSAGES[i % len(MESSAGES)]
+    # Unique text defeats the response cache and in-flight coalescing
+    return f"{message} (#{i})" if unique else message
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+class _Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+
+    def add(self, started: float, activity_log: list) -> None:
+        self.latencies.append((time.perf_counter() - started) * 1000)
+        for entry in activity_log:
+            if "duration_ms" in entry:
+                self.steps[entry["step"]].append(entry["duration_ms"])
+
+    def result(self, requests: int, elapsed: float) -> dict:
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "requests_per_second": round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summarize_ms(self.latencies),
+            "steps_ms": {step: summarize_ms(values) for step, values in sorted(self.steps.items())},
+        }
+
+def _drive_handle_chat(requests: int, concurrency: int, unique: bool, offset: int) -> _Recorder:
+    from backend.orchestrator.agent_router import handle_chat
+
+    recorder = _Recorder()
+
+    def one(i: int) -> None:
+        started = time.perf_counter()
+        try:
+            _, activity_log = handle_chat(f"bench-{i}", _message(i, unique))
+        except Exception:
+            recorder.errors += 1
+            return
+        recorder.add(started, activity_log)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(offset, offset + requests)))
+    return recorder
+
+async def _drive_http_async(requests: int, concurrency: int, unique: bool, offset: int) -> _Recorder:
+    from backend.orchestrator.main import app
+
+    recorder = _Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def one(i: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/chat", json={"user_id": f"bench-{i}", "message": _message(i, unique)}
+                    )
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    recorder.errors += 1
+                    return
+                recorder.add(started, response.json()["activity_log"])
+
+        await asyncio.gather(*(one(i) for i in range(offset, offset + requests)))
+    await llm_client.aclose()
+    return recorder
+
+def _drive_http(requests: int, concurrency: int, unique: bool, offset: int) -> _Recorder:
+    return asyncio.run(_drive_http_async(requests, concurrency, unique, offset))
+
+DRIVERS: Dict[str, Callable[[int, int, bool, int], _Recorder]] = {
+    "handle_chat": _drive_handle_chat,
+    "http": _drive_http,
+}
+
+def _measure_memory(drive: Callable, requests: int, concurrency: int, unique: bool, offset: int) -> dict:
+    """Peak traced bytes per in-flight request, and bytes still held afterwards per request."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        drive(requests, concurrency, unique, offset)
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "peak_kb_per_inflight_request": round((peak - baseline) / 1024 / min(concurrency, requests), 1),
+        "retained_kb_per_request": round(max(0, retained - baseline) / 1024 / requests, 2),
+    }
+
+def _change(new: float, prev: float) -> str:
+    return f"{(new - prev) / prev * 100:+.1f}%" if prev else "n/a"
+
+def _compare(baseline: dict, current: dict) -> None:
+    print(f"\nvs {baseline.get('commit', '?')} ({baseline.get('started_at', '?')}):")
+    print(f"{'target':<12} {'conc':>5} {'p50':>9} {'p95':>9} {'req/s':>9}")
+    for target, levels in current["targets"].items():
+        for level, r in levels["levels"].items():
+            old = baseline.get("targets", {}).get(target, {}).get("levels", {}).get(level)
+            if not old:
+                continue
+            print(
+                f"{target:<12} {level:>5} "
+                f"{_change(r['latency_ms']['p50'], old['latency_ms']['p50']):>9} "
+                f"{_change(r['latency_ms']['p95'], old['latency_ms']['p95']):>9} "
+                f"{_change(r['requests_per_second'], old['requests_per_second']):>9}"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark against a mock LLM")
+    parser.add_argument("--requests", "-n", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", "-c", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated: handle_chat,http")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0, help="Half-width for the uniform distribution")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Shape of the lognormal distribution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--responses", help="ResponseBook JSON of recorded responses keyed by prompt hash")
+    parser.add_argument("--record", action="store_true", help="Add responses for unseen prompts to --responses")
+    parser.add_argument("--live", action="store_true", help="Answer unseen prompts with the real Azure deployment")
+    parser.add_argument("--unique", action="store_true",
+                        help="Make every message unique so caches and coalescing can't help")
+    parser.add_argument("--llm-bound", action="store_true",
+                        help="Turn off the triage fast path, plan templates and response cache")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests before each target")
+    parser.add_argument("--memory-requests", type=int, default=50, help="Requests in the tracemalloc pass; 0 skips it")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--output", "-o", help="Write results as JSON")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    if args.llm_bound:
+        settings.TRIAGE_FASTPATH_ENABLED = False
+        settings.PLAN_TEMPLATES_ENABLED = False
+        llm_client.response_cache = None
+
+    book = None
+    responder = default_responder
+    if args.responses or args.live:
+        book = ResponseBook(args.responses, fallback=live_responder() if args.live else default_responder,
+                            record=args.record or args.live)
+        responder = book
+    mock = MockLLM(responder, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed,
+                   distribution=args.distribution, sigma=args.sigma)
+    mock.install()
+
+    results = {
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "targets": {},
+    }
+    offset = 0
+    for target in targets:
+        drive = DRIVERS[target]
+        if args.warmup:
+            drive(args.warmup, min(levels), args.unique, offset)
+            offset += args.warmup
+        target_results = {"levels": {}}
+        for concurrency in levels:
+            calls_before = mock.calls
+            started = time.perf_counter()
+            recorder = drive(args.requests, concurrency, args.unique, offset)
+            elapsed = time.perf_counter() - started
+            offset += args.requests
+            level = recorder.result(args.requests, elapsed)
+            level["llm_calls_per_request"] = round((mock.calls - calls_before) / args.requests, 3)
+            target_results["levels"][str(concurrency)] = level
+        if args.memory_requests:
+            target_results["memory"] = _measure_memory(drive, args.memory_requests, max(levels), args.unique, offset)
+            offset += args.memory_requests
+        results["targets"][target] = target_results
+
+    if book is not None:
+        results["responses"] = book.stats()
+        book.save()
+
+    print(f"{'target':<12} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+    for target, target_results in results["targets"].items():
+        for concurrency, r in target_results["levels"].items():
+            lat = r["latency_ms"]
+            print(f"{target:<12} {concurrency:>5} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f} "
+                  f"{r['requests_per_second']:>9} {r['errors']:>7}")
+        memory = target_results.get("memory")
+        if memory:
+            print(f"{target:<12} memory: {memory['peak_kb_per_inflight_request']} KB peak per in-flight request, "
+                  f"{memory['retained_kb_per_request']} KB retained per request")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            _compare(json.load(f), results)
+
+    if args.output:
+        write_json(args.output, results)
+
+if __name__ == "__main__":
+    main()
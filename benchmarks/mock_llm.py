@@ -0,0 +1,207 @@
+"""
+Deterministic stand-in for the Azure OpenAI client.
+
+MockLLM exposes `client` and `async_client` objects with the same
+`chat.completions.create(...)` surface the real SDK has, so it can be installed
+with backend.utils.llm_client.use_clients(...). Responses come from a responder
+function; latency is sampled from a seeded distribution so runs are repeatable.
+
+Latency distributions (all in milliseconds, `latency_ms` is the centre):
+- fixed:     always latency_ms,
+- uniform:   latency_ms +/- jitter_ms,
+- lognormal: median latency_ms, shape `sigma`, i.e. a long right tail like a
+             real hosted model.
+
+A ResponseBook replaces the responder with answers keyed by a hash of the
+(system, user) prompt pair, loaded from a JSON file. It can be filled by
+recording any responder, including `live_responder()` against the real
+Azure deployment, and then replayed offline.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+
+from backend.agents.fused_agent import FUSED_SYSTEM_PROMPT
+from backend.agents.planner_agent import PLANNER_SYSTEM_PROMPT
+from backend.agents.triage_agent import TRIAGE_SYSTEM_PROMPT
+
+Responder = Callable[[str, str], str]
+
+_KEYWORD_INTENTS = [
+    (("locked", "log in", "login", "password", "sign in"), "account_access_issue", "it", "high"),
+    (("pto", "vacation", "time off", "days off"), "pto_balance", "hr", "low"),
+    (("policy", "policies"), "hr_policy_question", "hr", "low"),
+    (("laptop", "printer", "monitor", "keyboard"), "device_issue", "it", "normal"),
+    (("paycheck", "salary", "payslip"), "payroll_question", "finance", "normal"),
+]
+
+_INTENT_ACTIONS = {
+    "account_access_issue": [("check_account_status", {}), ("reset_password", {"reason": "self_service_reset"})],
+    "pto_balance": [("lookup_pto_balance", {})],
+}
+
+def classify_text(text: str) -> dict:
+    lowered = text.lower()
+    for keywords, intent, domain, urgency in _KEYWORD_INTENTS:
+        if any(k in lowered for k in keywords):
+            return {"intent": intent, "domain": domain, "urgency": urgency, "confidence": 0.9}
+    return {"intent": "unknown", "domain": "general", "urgency": "normal", "confidence": 0.4}
+
+def plan_for(intent: str, user_id: Optional[str]) -> dict:
+    actions = [
+        {"runbook_id": runbook_id, "inputs": {"user_id": user_id, **extra}}
+        for runbook_id, extra in _INTENT_ACTIONS.get(intent, [])
+    ]
+    return {"requires_human_approval": False, "actions": actions}
+
+def default_responder(system_prompt: str, user_prompt: str) -> str:
+    """Answer triage, planner and fused prompts the way a well-behaved model would."""
+    if system_prompt == TRIAGE_SYSTEM_PROMPT:
+        return json.dumps(classify_text(user_prompt))
+
+    if system_prompt == PLANNER_SYSTEM_PROMPT:
+        context = json.loads(user_prompt)
+        intent = context.get("intent", {})
+        return json.dumps(plan_for(intent.get("intent"), intent.get("user_id")))
+
+    if system_prompt == FUSED_SYSTEM_PROMPT:
+        context = json.loads(user_prompt)
+        intent = classify_text(context.get("message", ""))
+        user_id = (context.get("user") or {}).get("id")
+        return json.dumps({"intent": intent, "plan": plan_for(intent["intent"], user_id)})
+
+    return json.dumps({})
+
+def prompt_hash(system_prompt: str, user_prompt: str) -> str:
+    return hashlib.sha256(f"{system_prompt}\x00{user_prompt}".encode("utf-8")).hexdigest()
+
+def live_responder() -> Responder:
+    """Answer with the configured Azure OpenAI deployment, for recording a ResponseBook."""
+    from openai import AzureOpenAI
+
+    from backend.config import settings
+
+    client = AzureOpenAI(
+        api_key=settings.AZURE_OPENAI_API_KEY,
+        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+        api_version=settings.AZURE_OPENAI_API_VERSION,
+    )
+
+    def respond(system_prompt: str, user_prompt: str) -> str:
+        response = client.chat.completions.create(
+            model=settings.AZURE_OPENAI_DEPLOYMENT,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            temperature=0,
+        )
+        return response.choices[0].message.content or ""
+
+    return respond
+
+class ResponseBook:
+    """
+    Canned responses keyed by prompt_hash(). Misses go to `fallback`; with
+    record=True their answers are kept and written back by save().
+    """
+
+    def __init__(self, path: Optional[str] = None, fallback: Responder = default_responder, record: bool = False):
+        self.path = path
+        self.fallback = fallback
+        self.record = record
+        self.responses: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.responses = json.load(f)
+
+    def __call__(self, system_prompt: str, user_prompt: str) -> str:
+        key = prompt_hash(system_prompt, user_prompt)
+        with self._lock:
+            content = self.responses.get(key)
+            if content is not None:
+                self.hits += 1
+                return content
+            self.misses += 1
+        content = self.fallback(system_prompt, user_prompt)
+        if self.record:
+            with self._lock:
+                self.responses[key] = content
+        return content
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = dict(self.responses)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self.responses), "hits": self.hits, "misses": self.misses}
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+class MockLLM:
+    def __init__(self, responder: Responder = default_responder, latency_ms: float = 300.0,
+                 jitter_ms: float = 0.0, seed: int = 0, distribution: str = "uniform", sigma: float = 0.5):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}, expected one of {DISTRIBUTIONS}")
+        self.responder = responder
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self._create)))
+        self.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self._acreate)))
+
+    def _sample_latency_s(self) -> float:
+        with self._lock:
+            self.calls += 1
+            if self.distribution == "lognormal":
+                latency = self.latency_ms * self._random.lognormvariate(0.0, self.sigma)
+            elif self.distribution == "uniform" and self.jitter_ms:
+                latency = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            else:
+                latency = self.latency_ms
+        return max(0.0, latency) / 1000
+
+    def _respond(self, messages: list):
+        system_prompt, user_prompt = messages[0]["content"], messages[-1]["content"]
+        content = self.responder(system_prompt, user_prompt)
+        usage = SimpleNamespace(
+            prompt_tokens=_approx_tokens(system_prompt) + _approx_tokens(user_prompt),
+            completion_tokens=_approx_tokens(content),
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    def _create(self, model: str, messages: list, **kwargs):
+        time.sleep(self._sample_latency_s())
+        return self._respond(messages)
+
+    async def _acreate(self, model: str, messages: list, **kwargs):
+        await asyncio.sleep(self._sample_latency_s())
+        return self._respond(messages)
+
+    def install(self) -> None:
+        """Route backend.utils.llm_client through this mock."""
+        from backend.utils import llm_client
+        if not llm_client.AZURE_OPENAI_DEPLOYMENT:
+            llm_client.AZURE_OPENAI_DEPLOYMENT = "mock"
+        llm_client.use_clients(self.client, self.async_client)
@@ -2,6 +2,7 @@
 import httpx
 import json
 import argparse
+import uuid
 from typing import Any, Dict
 from colorama import init as colorama_init, Fore, Style
 
@@ -53,24 +54,28 @@ def pretty_print_step(step: Dict[str, Any]) -> None:
     summary = summarize_step(step)
     print(f" {color}• {name:<18}{Style.DIM}{summary}{Style.RESET_ALL}")
 
+def print_step(step: Dict[str, Any], verbose: bool = False) -> None:
+    if verbose:
+        # Pretty-print full JSON for the step
+        name = step.get("step", "unknown")
+        data = step.get("result") or step.get("details") or {}
+        color = STEP_COLOR.get(name, Fore.WHITE)
+        print(f" {color}• {name}{Style.RESET_ALL}")
+        print(Style.DIM + json.dumps(data, indent=2) + Style.RESET_ALL)
+    else:
+        pretty_print_step(step)
+
 def print_activity_log(activity_log: Any, verbose: bool = False) -> None:
     print(Style.BRIGHT + "Activity Pipeline:" + Style.RESET_ALL)
     for step in activity_log:
-        if verbose:
-            # Pretty-print full JSON for each step
-            name = step.get("step", "unknown")
-            data = step.get("result") or step.get("details") or {}
-            color = STEP_COLOR.get(name, Fore.WHITE)
-            print(f" {color}• {name}{Style.RESET_ALL}")
-            print(Style.DIM + json.dumps(data, indent=2) + Style.RESET_ALL)
-        else:
-            pretty_print_step(step)
+        print_step(step, verbose=verbose)
     print()
 
-def send_message(user_id: str, message: str):
+def send_message(user_id: str, message: str, session_id: str = None):
     payload = {
         "user_id": user_id,
         "message": message,
+        "session_id": session_id,
     }
     # Use explicit serialization to avoid lint complaints about keyword args
     raw = json.dumps(payload)
@@ -80,13 +85,55 @@ def send_message(user_id: str, message: str):
         resp.raise_for_status()
         return resp.json()
 
+def stream_message(user_id: str, message: str, session_id: str = None):
+    """Yield pipeline events from /chat/stream as they arrive."""
+    raw = json.dumps({"user_id": user_id, "message": message, "session_id": session_id})
+    headers = {"Content-Type": "application/json"}
+    # LLM-backed steps can take a while; only bound the connect/idle time
+    with httpx.Client(timeout=httpx.Timeout(60.0, connect=10.0)) as client:
+        with client.stream("POST", f"{BASE_URL}/chat/stream", content=raw, headers=headers) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+def run_streaming(user_id: str, msg: str, verbose: bool, session_id: str = None) -> list:
+    """Print the streamed pipeline; returns runbooks awaiting the user's confirmation."""
+    pending = []
+    print(Style.BRIGHT + "Activity Pipeline:" + Style.RESET_ALL)
+    for event in stream_message(user_id, msg, session_id=session_id):
+        kind = event.get("event")
+        data = event.get("data", {})
+        if kind == "step":
+            print_step(data, verbose=verbose)
+        elif kind == "reply":
+            print(f"\n{Fore.GREEN}[assistant]{Style.RESET_ALL} {data.get('reply')}\n")
+            pending = data.get("confirmation_required", [])
+        elif kind == "error":
+            print(f"{Fore.RED}[error]{Style.RESET_ALL} {data.get('error')}")
+    return pending
+
+def awaiting_confirmation(activity_log: Any) -> list:
+    for step in activity_log:
+        if step.get("step") == "runbook_execution":
+            return [r.get("runbook_id") for r in step.get("result", []) if r.get("status") == "awaiting_confirmation"]
+    return []
+
+def ask_confirmation(runbooks: list) -> bool:
+    answer = input(f"{Fore.YELLOW}Confirm running {', '.join(runbooks)}? [y/N] {Style.RESET_ALL}")
+    return answer.strip().lower() in ("y", "yes")
+
 def main():
     parser = argparse.ArgumentParser(description="Service Desk Autopilot CLI")
     parser.add_argument("--verbose", "-v", action="store_true", help="Show detailed JSON for activity log")
+    parser.add_argument("--no-stream", action="store_true", help="Use /chat and print everything at the end")
     args = parser.parse_args()
 
     print("Service Desk Autopilot CLI")
     user_id = input("Enter your user id (e.g. jv-123): ").strip() or "demo-user"
+    # One conversation per CLI run: the server remembers earlier turns, so
+    # confirmations and follow-ups don't re-run triage and planning
+    session_id = uuid.uuid4().hex
 
     print("Type 'quit' to exit.\n")
 
@@ -95,8 +142,25 @@ def main():
         if msg.lower() in ("quit", "exit"):
             break
 
+        if not args.no_stream:
+            try:
+                pending = run_streaming(user_id, msg, verbose=args.verbose, session_id=session_id)
+                if pending:
+                    answer = "yes" if ask_confirmation(pending) else "no"
+                    run_streaming(user_id, answer, verbose=args.verbose, session_id=session_id)
+            except Exception as e:
+                print(f"[error] {e}")
+                continue
+            print(Style.DIM + "=" * 60 + Style.RESET_ALL + "\n")
+            continue
+
         try:
-            data = send_message(user_id, msg)
+            data = send_message(user_id, msg, session_id=session_id)
+            pending = awaiting_confirmation(data.get("activity_log", []))
+            if pending:
+                print(f"\n{Fore.GREEN}[assistant]{Style.RESET_ALL} {data['reply']}\n")
+                answer = "yes" if ask_confirmation(pending) else "no"
+                data = send_message(user_id, answer, session_id=session_id)
         except Exception as e:
             print(f"[error] {e}")
             continue
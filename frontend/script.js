@@ -13,6 +13,10 @@ const statusText = document.getElementById('statusText');
 
 // State
 let isProcessing = false;
+// One conversation per page load: the server remembers earlier turns
+const sessionId = window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
 
 // Initialize
 window.addEventListener('DOMContentLoaded', () => {
@@ -78,31 +82,14 @@ async function sendMessage() {
     setProcessingState(true);
 
     try {
-        const response = await fetch(`${API_BASE_URL}/chat`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                user_id: userId,
-                message: message
-            })
-        });
-
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+        const pending = await streamChat(userId, message);
+        // Sensitive runbooks are held until the user explicitly confirms;
+        // the answer is a normal turn in the same session
+        if (pending.length) {
+            const answer = window.confirm(`Confirm running ${pending.join(', ')}?`) ? 'yes' : 'no';
+            addChatMessage('user', answer);
+            await streamChat(userId, answer);
         }
-
-        const data = await response.json();
-        
-        // Add assistant reply
-        addChatMessage('assistant', data.reply);
-        
-        // Process activity log
-        if (data.activity_log && data.activity_log.length > 0) {
-            processActivityLog(data.activity_log);
-        }
-
     } catch (error) {
         console.error('Error sending message:', error);
         addChatMessage('assistant', '❌ Error: Could not reach the server. Please ensure the backend is running on port 8000.');
@@ -112,6 +99,62 @@ async function sendMessage() {
     }
 }
 
+// Stream one pipeline run; resolves to the runbooks awaiting confirmation
+async function streamChat(userId, message) {
+    let pending = [];
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            user_id: userId,
+            message: message,
+            session_id: sessionId
+        })
+    });
+
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    // Render each pipeline step as soon as the server finishes it
+    await readEventStream(response, (event) => {
+        const data = event.data || {};
+        if (event.event === 'step') {
+            processActivityLog([data]);
+        } else if (event.event === 'reply') {
+            addChatMessage('assistant', data.reply);
+            pending = data.confirmation_required || [];
+        } else if (event.event === 'error') {
+            addChatMessage('assistant', `❌ Error: ${data.error}`);
+            addLogEntry('error', data);
+        }
+    });
+    return pending;
+}
+
+// Read an NDJSON response body, calling onEvent for each complete line
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) onEvent(JSON.parse(line));
+        }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
 // Add Chat Message
 function addChatMessage(role, content) {
     // Remove welcome message if it exists
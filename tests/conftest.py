@@ -0,0 +1,45 @@
+"""
+Point every on-disk store at a throwaway directory before any backend module
+is imported (several open their SQLite files at import time).
+"""
+import os
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="smartdesk-tests-")
+for name, filename in (
+    ("TICKET_STORE_SQLITE_PATH", "tickets.db"),
+    ("JOB_QUEUE_SQLITE_PATH", "jobs.db"),
+    ("SESSION_SQLITE_PATH", "sessions.db"),
+    ("SAFETY_QUOTA_SQLITE_PATH", "safety_quotas.db"),
+    ("AUDIT_LOG_DIR", "audit_logs"),
+    ("KNOWLEDGE_INDEX_DIR", "knowledge_index"),
+):
+    os.environ.setdefault(name, os.path.join(_data_dir, filename))
+os.environ.setdefault("STARTUP_WARMUP", "false")
+
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+@pytest.fixture
+def serve():
+    """Start an ASGI app on a free local port; returns its base URL."""
+    servers = []
+
+    def start(app) -> str:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        servers.append(server)
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for server in servers:
+        server.should_exit = True
@@ -0,0 +1,6 @@
+"""Runbook targets for the process-pool tests (imported by spawned workers)."""
+import time
+
+def hang(inputs: dict) -> dict:
+    time.sleep(inputs.get("seconds", 30))
+    return {"status": "success", "details": {}}
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from backend.orchestrator import agent_router
+from benchmarks.mock_llm import MockLLM, default_responder
+
+LOCKED_OUT = "I can't log in, my account seems locked"
+
+@pytest.fixture(autouse=True)
+def mock_llm():
+    MockLLM(default_responder, latency_ms=0, jitter_ms=0).install()
+
+def _session():
+    return f"user-{uuid.uuid4().hex[:8]}", uuid.uuid4().hex
+
+def _statuses(activity_log: list) -> dict:
+    for entry in activity_log:
+        if entry["step"] == "runbook_execution":
+            return {r["runbook_id"]: r["status"] for r in entry["result"]}
+    return {}
+
+def test_unclear_reply_to_held_runbook_reasks_and_keeps_it_held():
+    user_id, session_id = _session()
+    _, activity_log = agent_router.handle_chat(user_id, LOCKED_OUT, session_id=session_id)
+    assert _statuses(activity_log)["reset_password"] == "awaiting_confirmation"
+
+    reply, activity_log = agent_router.handle_chat(user_id, "ok but first tell me my balance", session_id=session_id)
+    assert "reset_password" in reply
+    assert [e["step"] for e in activity_log if e["step"] != "admission"] == ["clarification"]
+
+    _, activity_log = agent_router.handle_chat(user_id, "yes please", session_id=session_id)
+    assert _statuses(activity_log)["reset_password"] in ("success", "queued")
+
+def test_client_cannot_confirm_on_the_users_behalf():
+    from fastapi.testclient import TestClient
+
+    from backend.orchestrator.main import app
+
+    user_id, session_id = _session()
+    response = TestClient(app).post("/chat", json={
+        "user_id": user_id, "message": LOCKED_OUT, "session_id": session_id, "confirmed": True,
+    })
+    assert response.status_code == 200
+    assert _statuses(response.json()["activity_log"])["reset_password"] == "awaiting_confirmation"
+
+def test_yes_without_a_held_plan_runs_nothing_sensitive():
+    user_id, session_id = _session()
+    _, activity_log = agent_router.handle_chat(user_id, "yes", session_id=session_id)
+    assert _statuses(activity_log).get("reset_password") is None
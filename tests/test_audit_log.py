@@ -0,0 +1,64 @@
+import errno
+import json
+import os
+import tempfile
+
+import pytest
+
+from backend.services.audit_log_service import INDEX_FILE, SEGMENT_PREFIX, AuditLog, build_run_record
+
+def _records(user_id: str, n: int):
+    return [build_run_record(user_id, f"message {i}", "reply", []) for i in range(n)]
+
+def _segments(directory: str):
+    return sorted(name for name in os.listdir(directory) if name.startswith(SEGMENT_PREFIX))
+
+class _DiskFullSegment:
+    """Writes half of what it is given, then fails like a full disk."""
+
+    def __init__(self, segment):
+        self._segment = segment
+
+    def write(self, data: bytes) -> int:
+        self._segment.write(data[:len(data) // 2])
+        self._segment.flush()
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self._segment, name)
+
+def test_failed_batch_is_cut_off_and_retried_cleanly():
+    directory = tempfile.mkdtemp()
+    log = AuditLog(directory, fsync=False)
+    first, second = _records("u1", 3), _records("u2", 3)
+    log._write_batch(first)
+    [segment] = _segments(directory)
+    size = os.path.getsize(os.path.join(directory, segment))
+
+    log._segment = _DiskFullSegment(log._segment)
+    with pytest.raises(OSError):
+        log._write_batch(second)
+    assert os.path.getsize(os.path.join(directory, segment)) == size
+
+    log._write_batch(second)  # the writer's retry
+    assert len(_segments(directory)) == 2
+    assert [run["run_id"] for run in log.query(user_id="u2")] == [r["run_id"] for r in reversed(second)]
+    log.close()
+
+    os.remove(os.path.join(directory, INDEX_FILE))
+    rebuilt = AuditLog(directory, fsync=False)
+    assert rebuilt.rebuild_index() == 6
+    rebuilt.close()
+
+def test_rebuild_index_skips_a_bad_line_and_keeps_going():
+    directory = tempfile.mkdtemp()
+    before, after = _records("u1", 1)[0], _records("u1", 1)[0]
+    with open(os.path.join(directory, f"{SEGMENT_PREFIX}20260101T000000-1-0001.jsonl"), "wb") as f:
+        f.write((json.dumps(before) + "\n").encode())
+        f.write(b'{"run_id": "torn", "ts"\n')
+        f.write((json.dumps(after) + "\n").encode())
+
+    log = AuditLog(directory, fsync=False)
+    assert log.rebuild_index() == 2
+    assert log.get(after["run_id"])["message"] == after["message"]
+    log.close()
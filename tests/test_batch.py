@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from backend.orchestrator import agent_router
+from backend.orchestrator.admission import AdmissionController, AdmissionRejected
+from backend.orchestrator.batch import run_batch
+from benchmarks.mock_llm import MockLLM, default_responder
+
+@pytest.fixture(autouse=True)
+def mock_llm():
+    MockLLM(default_responder, latency_ms=5, jitter_ms=0).install()
+
+def _replay(records, concurrency: int):
+    async def collect():
+        return [result async for result in run_batch(records, concurrency, include_activity_log=False)]
+    return asyncio.run(collect())
+
+def test_batch_replay_is_not_shed_by_per_user_limits(monkeypatch):
+    # An interactive budget this tight would shed almost every record of a one-user replay
+    interactive = AdmissionController(max_concurrency=1, user_max_concurrency=1, user_max_queued=1)
+    batch = AdmissionController(max_concurrency=2, user_max_concurrency=0, user_max_queued=0,
+                                queue_limits={"high": 0, "normal": 0, "low": 0},
+                                max_wait_seconds={"high": 0, "normal": 0, "low": 0})
+    monkeypatch.setattr(agent_router, "admission_controller", interactive)
+    monkeypatch.setattr(agent_router, "batch_admission_controller", batch)
+
+    records = [{"user_id": "replay-user", "message": "How many vacation days do I have left?"}] * 24
+    results = _replay(records, concurrency=24)
+    assert [r for r in results if "error" in r] == []
+    assert batch.stats()["admitted"] == 24
+    assert interactive.stats()["admitted"] == 0
+
+def test_batch_controller_queues_instead_of_shedding():
+    controller = AdmissionController.for_batch()
+    controller.max_concurrency = 1
+
+    async def run(i: int):
+        admission = await controller.admit_async("replay-user", "low", "general")
+        await asyncio.sleep(0.01)
+        admission.release()
+
+    async def burst():
+        await asyncio.gather(*(run(i) for i in range(50)))
+
+    asyncio.run(burst())
+    stats = controller.stats()
+    assert stats["admitted"] == 50
+    assert all(stats[k] == 0 for k in stats if k.startswith("shed_"))
+
+def test_timings_keep_every_step_in_order(monkeypatch):
+    async def handle_chat_async(user_id, message, session_id=None, batch=False):
+        steps = ["admission", "clarification", "triage", "clarification"]
+        return "reply", [{"step": name, "duration_ms": float(i)} for i, name in enumerate(steps)]
+
+    monkeypatch.setattr("backend.orchestrator.batch.handle_chat_async", handle_chat_async)
+    [result] = _replay([{"user_id": "u1", "message": "hi"}], concurrency=1)
+    assert result["timings_ms"] == [["admission", 0.0], ["clarification", 1.0], ["triage", 2.0],
+                                    ["clarification", 3.0]]
+
+def test_stopping_the_consumer_cancels_records_in_flight(monkeypatch):
+    started, cancelled = [], []
+
+    async def handle_chat_async(user_id, message, session_id=None, batch=False):
+        started.append(message)
+        try:
+            await asyncio.sleep(0 if message == "fast" else 30)
+        except asyncio.CancelledError:
+            cancelled.append(message)
+            raise
+        return "reply", []
+
+    monkeypatch.setattr("backend.orchestrator.batch.handle_chat_async", handle_chat_async)
+    records = [{"user_id": "u1", "message": m} for m in ("fast", "slow-1", "slow-2")]
+
+    async def first_result_only():
+        results = run_batch(records, concurrency=3, include_activity_log=False)
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)  # let the cancellations land
+        return first, sorted(cancelled)  # before asyncio.run cancels whatever is left
+
+    first, cancelled_in_time = asyncio.run(first_result_only())
+    assert first["message"] == "fast"
+    assert cancelled_in_time == ["slow-1", "slow-2"]
@@ -0,0 +1,36 @@
+import pytest
+
+from backend.agents.clarification_agent import ClarificationAgent
+
+PENDING = {"pending_confirmation": ["reset_password"]}
+
+@pytest.fixture
+def agent():
+    return ClarificationAgent()
+
+@pytest.mark.parametrize("message", [
+    "yes", "Yes!", "y", "ok", "okay thanks", "Yes, please.", "please do", "go ahead", "yes do it", "Confirmed",
+])
+def test_short_affirmative_confirms(agent, message):
+    assert agent.interpret(message, PENDING, None).kind == "confirm"
+
+@pytest.mark.parametrize("message", ["no", "No thanks", "nope", "don't", "Don’t", "never mind", "cancel."])
+def test_short_negative_declines(agent, message):
+    assert agent.interpret(message, PENDING, None).kind == "decline"
+
+@pytest.mark.parametrize("message", [
+    "y'all there?",
+    "ok but first tell me my balance",
+    "yes but only after lunch",
+    "Don't worry, I fixed it, just reset the password",
+    "no idea what that means",
+    "what does that do?",
+])
+def test_anything_else_reasks(agent, message):
+    turn = agent.interpret(message, PENDING, None)
+    assert turn.kind == "reask"
+    assert turn["runbooks"] == ["reset_password"]
+    assert "reset_password" in agent.reask_reply(turn)
+
+def test_yes_without_pending_confirmation_is_not_a_confirmation(agent):
+    assert agent.interpret("yes", {"intent": None}, None) is None
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from backend.config import settings
+from backend.services import directory_service, http_client
+from backend.services.standin_server import app
+
+@pytest.fixture(autouse=True)
+def directory(serve, monkeypatch):
+    monkeypatch.setattr(settings, "DIRECTORY_BACKEND", "http")
+    monkeypatch.setattr(settings, "DIRECTORY_SERVICE_URL", serve(app))
+    yield
+    asyncio.run(http_client.aclose_clients())
+
+def _lookup_async(user_id: str):
+    async def lookup():
+        try:
+            return await directory_service.get_user_profile_async(user_id)
+        finally:
+            await http_client.aclose_clients()  # the async client is bound to this loop
+    return asyncio.run(lookup())
+
+def test_known_user_is_returned():
+    assert directory_service.get_user_profile("u1")["id"] == "u1"
+    assert _lookup_async("u1")["id"] == "u1"
+
+def test_unknown_user_is_none_not_an_error():
+    assert directory_service.get_user_profile("missing-u1") is None
+    assert _lookup_async("missing-u1") is None
+
+def test_user_id_is_quoted_into_the_path():
+    # Unquoted, the query/fragment part would be cut off the id
+    for user_id in ("u1?x=1", "u1#frag", "jo doe", "zoë"):
+        assert directory_service.get_user_profile(user_id)["id"] == user_id
+
+def test_user_id_cannot_reach_another_route():
+    # Unquoted, this is GET /users/bulk (405), which raised
+    assert directory_service.get_user_profile("../users/bulk") is None
+
+def test_bulk_lookup_omits_unknown_users():
+    profiles = directory_service.get_user_profiles(["u1", "missing-u2", "u1"])
+    assert list(profiles) == ["u1"]
@@ -0,0 +1,120 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from backend.agents import runbook_executor_agent
+from backend.agents.runbook_executor_agent import RunbookExecutorAgent
+from backend.models.plan import PlanAction
+from backend.services.job_queue import JobWorkers, SQLiteJobQueue
+
+def _wait_for(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_lease_is_renewed_only_until_the_deadline():
+    queue = SQLiteJobQueue(":memory:", visibility_timeout=0.3)
+    calls = []
+
+    def slow(job):
+        calls.append(job["attempts"])
+        time.sleep(1.2)
+        return {"status": "success"}
+
+    workers = JobWorkers(queue, slow, workers=2, poll_interval=0.05, heartbeat_interval=0.1)
+    job = queue.enqueue("reset_password", {"user_id": "u1"}, max_attempts=1)
+    workers.start()
+    try:
+        _wait_for(lambda: queue.get(job["job_id"])["status"] == "dead")
+    finally:
+        workers.stop()
+    assert calls == [1]
+    assert queue.get(job["job_id"])["error"] == "Visibility timeout expired"
+
+def test_hung_runbook_job_times_out_and_frees_its_worker(monkeypatch):
+    executor = RunbookExecutorAgent()
+    release = threading.Event()
+    monkeypatch.setattr(executor.registry, "get",
+                        lambda runbook_id: (lambda inputs: release.wait(30) and {"status": "success"}))
+    queue = SQLiteJobQueue(":memory:", visibility_timeout=0.5)
+    workers = JobWorkers(queue, executor.run_job, workers=1, poll_interval=0.05, heartbeat_interval=0.1)
+    hung = queue.enqueue("check_account_status", {"user_id": "u1"}, max_attempts=1)
+    workers.start()
+    try:
+        _wait_for(lambda: queue.get(hung["job_id"])["status"] == "dead")
+        release.set()
+        done = queue.enqueue("check_account_status", {"user_id": "u1"}, max_attempts=1)
+        workers.notify()
+        _wait_for(lambda: queue.get(done["job_id"])["status"] == "succeeded")
+    finally:
+        release.set()
+        workers.stop()
+    assert queue.get(hung["job_id"])["error"] == "TimeoutError: Timed out after 0.5s"
+
+def test_worker_survives_a_failed_queue_write(monkeypatch):
+    queue = SQLiteJobQueue(":memory:")
+    complete = queue.complete
+    failures = []
+
+    def locked_once(job, result):
+        if not failures:
+            failures.append(job["job_id"])
+            raise sqlite3.OperationalError("database is locked")
+        return complete(job, result)
+
+    monkeypatch.setattr(queue, "complete", locked_once)
+    workers = JobWorkers(queue, lambda job: {"status": "success"}, workers=1, poll_interval=0.05)
+    first = queue.enqueue("check_account_status", {"user_id": "u1"})
+    workers.start()
+    try:
+        _wait_for(lambda: failures)
+        second = queue.enqueue("check_account_status", {"user_id": "u2"})
+        workers.notify()
+        _wait_for(lambda: queue.get(second["job_id"])["status"] == "succeeded")
+    finally:
+        workers.stop()
+    assert failures == [first["job_id"]]
+
+def test_lease_of_a_dead_worker_still_expires():
+    now = [1000.0]
+    queue = SQLiteJobQueue(":memory:", visibility_timeout=10, retry_backoff=0, clock=lambda: now[0])
+    job = queue.enqueue("check_account_status", {"user_id": "u1"}, max_attempts=2)
+    first = queue.claim()
+    now[0] += 11
+    second = queue.claim()
+    assert second["job_id"] == job["job_id"] and second["attempts"] == 2
+    assert queue.extend_leases([first]) == [first]
+    assert queue.extend_leases([second]) == []
+
+def test_non_idempotent_runbooks_get_one_attempt(monkeypatch):
+    executor = RunbookExecutorAgent()
+    monkeypatch.setattr(executor, "start_job_workers", lambda: JobWorkers(runbook_executor_agent.job_queue, None))
+    queued = executor._enqueue(PlanAction(runbook_id="reset_password", inputs={"user_id": "u1"}))
+    assert runbook_executor_agent.job_queue.get(queued["details"]["job_id"])["max_attempts"] == 1
+
+    monkeypatch.setitem(executor.catalog["reset_password"], "idempotent", True)
+    monkeypatch.setitem(executor.catalog["reset_password"], "max_attempts", 4)
+    queued = executor._enqueue(PlanAction(runbook_id="reset_password", inputs={"user_id": "u1"}))
+    assert runbook_executor_agent.job_queue.get(queued["details"]["job_id"])["max_attempts"] == 4
+
+def test_async_enqueue_runs_off_the_event_loop(monkeypatch):
+    executor = RunbookExecutorAgent()
+    monkeypatch.setattr(executor, "start_job_workers", lambda: JobWorkers(runbook_executor_agent.job_queue, None))
+    enqueue = runbook_executor_agent.job_queue.enqueue
+    threads = []
+
+    def recording(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return enqueue(*args, **kwargs)
+
+    monkeypatch.setattr(runbook_executor_agent.job_queue, "enqueue", recording)
+
+    async def run():
+        result = await executor.execute_async(PlanAction(runbook_id="reset_password", inputs={"user_id": "u1"}), {})
+        return result, threading.current_thread()
+
+    result, loop_thread = asyncio.run(run())
+    assert result["status"] == "queued"
+    assert threads and threads[0] is not loop_thread
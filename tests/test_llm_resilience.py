@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.config import settings
+from backend.utils.llm_resilience import ConcurrencyLimit, Deployment, DeploymentPool, LLMUnavailableError
+from benchmarks import fake_openai_server
+
+MESSAGES = [{"role": "system", "content": "You are a test."}, {"role": "user", "content": "hello"}]
+
+@pytest.fixture
+def endpoint(serve, monkeypatch):
+    monkeypatch.setitem(fake_openai_server.DEFAULTS, "latency_ms", 0)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_BACKOFF_SECONDS", 0.01)
+    fake_openai_server.reset()
+    yield serve(fake_openai_server.app)
+    fake_openai_server.reset()
+
+def _pool(endpoint: str, *names: str, max_retries: int = 3) -> DeploymentPool:
+    deployments = [Deployment(name, name, endpoint=endpoint, api_key="fake-key", api_version="2024-08-01-preview")
+                   for name in names]
+    return DeploymentPool(deployments, max_concurrency=8, max_retries=max_retries)
+
+def _answer(response) -> str:
+    return response.choices[0].message.content
+
+def test_rate_limited_calls_are_retried_without_opening_the_circuit(endpoint):
+    fake_openai_server.configure("primary", rate_429=1.0, retry_after_seconds=0.01)
+    pool = _pool(endpoint, "primary", max_retries=2)
+    with pytest.raises(Exception) as raised:
+        pool.complete(MESSAGES)
+    assert getattr(raised.value, "status_code", None) == 429
+    assert fake_openai_server.counts["primary"]["requests"] == 3
+    assert pool.stats()["retries"] == 2
+    assert pool.deployments[0].breaker.state == "closed"
+
+def test_repeated_server_errors_open_the_circuit(endpoint, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_THRESHOLD", 2)
+    fake_openai_server.configure("primary", rate_500=1.0)
+    pool = _pool(endpoint, "primary", max_retries=1)
+    with pytest.raises(Exception):
+        pool.complete(MESSAGES)
+    assert pool.deployments[0].breaker.state == "open"
+
+    with pytest.raises(LLMUnavailableError):
+        pool.complete(MESSAGES)
+    assert fake_openai_server.counts["primary"]["requests"] == 2  # the open circuit sent nothing
+
+def test_failing_deployment_fails_over_to_a_healthy_one(endpoint):
+    fake_openai_server.configure("primary", rate_500=1.0)
+    pool = _pool(endpoint, "primary", "secondary")
+    pool.deployments[0].weight = 100.0  # picked first whenever it is ready
+
+    async def calls():
+        return [await pool.complete_async(MESSAGES) for _ in range(3)]
+
+    responses = asyncio.run(calls())
+    assert all(_answer(response) for response in responses)
+    assert fake_openai_server.counts["primary"]["500"] >= 1
+    assert fake_openai_server.counts["secondary"]["ok"] == 3
+
+def test_refused_wait_gives_the_reserved_quota_back(monkeypatch):
+    now = [0.0]
+    clock = lambda: now[0]
+    deployment = Deployment("primary", "primary", tpm=6000, client=object(), clock=clock)
+    pool = DeploymentPool([deployment], max_concurrency=0, max_retries=0, clock=clock)
+    deployment.tokens.reserve(6000)  # the whole minute is spoken for
+    before = deployment.quota_wait(3000)
+
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_WAIT_SECONDS", 5)
+    for _ in range(3):
+        with pytest.raises(LLMUnavailableError):
+            pool._acquire(3000)
+    assert deployment.quota_wait(3000) == before
+    assert deployment.breaker.state == "closed"
+
+def test_concurrency_cap_is_shared_by_sync_and_async_callers(endpoint, monkeypatch):
+    monkeypatch.setitem(fake_openai_server.DEFAULTS, "latency_ms", 100)
+    pool = _pool(endpoint, "primary")
+    pool._slots.limit = pool.max_concurrency = 2
+    peak = []
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak.append(pool.stats()["in_flight"])
+            time.sleep(0.005)
+
+    async def calls():
+        await asyncio.gather(*(pool.complete_async(MESSAGES) for _ in range(4)))
+
+    callers = [threading.Thread(target=pool.complete, args=(MESSAGES,)) for _ in range(4)]
+    callers.append(threading.Thread(target=asyncio.run, args=(calls(),)))
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    for thread in callers:
+        thread.start()
+    for thread in callers:
+        thread.join()
+    done.set()
+    sampler.join()
+    assert fake_openai_server.counts["primary"]["ok"] == 8
+    assert max(peak) == 2
+
+def test_cancelled_waiter_passes_its_slot_on():
+    slots = ConcurrencyLimit(1)
+    slots.acquire()
+
+    async def run():
+        waiter = asyncio.ensure_future(slots.acquire_async())
+        await asyncio.sleep(0)
+        slots.release()  # handed to the waiter...
+        waiter.cancel()  # ...which is cancelled before it runs
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(slots.acquire_async(), timeout=1)
+
+    asyncio.run(run())
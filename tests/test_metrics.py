@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+from backend.utils.metrics import Registry, _Metric
+
+def test_metric_base_class_requires_child_hooks():
+    class Incomplete(_Metric):
+        def _new_child(self):
+            return object()
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Missing _render_child")
+
+def test_render_while_new_label_sets_appear():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    def add_routes():
+        for i in range(20000):
+            requests.labels(route=f"/r{i}").inc()
+            latency.labels(route=f"/r{i}").observe(0.5)
+
+    writer = threading.Thread(target=add_routes)
+    writer.start()
+    try:
+        while writer.is_alive():
+            registry.render()  # "dictionary changed size during iteration" without the snapshot
+    finally:
+        writer.join()
+
+    text = registry.render()
+    assert 'requests_total{route="/r0"} 1.0' in text
+    assert 'latency_seconds_bucket{route="/r0",le="1.0"} 1' in text
+    assert 'latency_seconds_count{route="/r0"} 1' in text
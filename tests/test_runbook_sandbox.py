@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.agents.runbook_executor_agent import RunbookExecutorAgent
+from backend.agents.runbook_sandbox import RunbookProcessError, RunbookProcessPool
+from backend.models.plan import PlanAction
+
+@pytest.fixture
+def pool():
+    pool = RunbookProcessPool(workers=1, memory_limit_mb=0, max_tasks_per_child=0)
+    yield pool
+    pool.shutdown()
+
+def test_run_async_timeout_recycles_the_pool(pool):
+    with pytest.raises(RunbookProcessError, match="Timed out"):
+        asyncio.run(pool.run_async("slow_runbooks:hang", {}, timeout=1))
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["recycles"] == 1
+    assert asyncio.run(pool.run_async("math:fabs", -2, timeout=30)) == 2.0
+
+def test_cancelled_run_async_kills_the_running_worker(pool):
+    async def cancel_while_running():
+        task = asyncio.ensure_future(pool.run_async("slow_runbooks:hang", {}, timeout=60))
+        await asyncio.sleep(3)  # long enough for the spawned worker to pick it up
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_while_running())
+    stats = pool.stats()
+    assert stats["cancelled"] == 1 and stats["recycles"] == 1
+    started = time.perf_counter()
+    assert asyncio.run(pool.run_async("math:fabs", -2, timeout=30)) == 2.0
+    assert time.perf_counter() - started < 30
+
+def test_isolated_runbook_is_timed_out_once_by_the_pool(pool, monkeypatch):
+    executor = RunbookExecutorAgent()
+    executor.isolated = {"check_account_status"}
+    executor.process_pool = pool
+    monkeypatch.setattr(executor.registry, "target", lambda runbook_id: "slow_runbooks:hang")
+    monkeypatch.setattr(executor, "_timeout", lambda action: 1.0)
+
+    [result] = asyncio.run(executor.execute_plan_async([PlanAction(runbook_id="check_account_status",
+                                                                   inputs={"user_id": "u1"})], {}))
+    assert result["status"] == "error"
+    assert result["details"]["error"] == "Timed out after 1s in the runbook process pool"
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["recycles"] == 1
+
+def test_isolated_runbook_is_timed_out_once_by_the_pool_in_sync_plans(pool, monkeypatch):
+    executor = RunbookExecutorAgent()
+    executor.isolated = {"check_account_status"}
+    executor.process_pool = pool
+    monkeypatch.setattr(executor.registry, "target", lambda runbook_id: "slow_runbooks:hang")
+    monkeypatch.setattr(executor, "_timeout", lambda action: 1.0)
+
+    [result] = executor.execute_plan([PlanAction(runbook_id="check_account_status", inputs={"user_id": "u1"})], {})
+    assert result["status"] == "error"
+    assert result["details"]["error"] == "Timed out after 1s in the runbook process pool"
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["recycles"] == 1
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.agents.safety_agent import SafetyAgent
+from backend.models.plan import PlanAction, PlanResult
+from backend.services.quota_store import MemoryQuotaStore, SQLiteQuotaStore
+
+def _sqlite_store():
+    return SQLiteQuotaStore(os.path.join(tempfile.mkdtemp(), "quotas.db"), window_seconds=60)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    return MemoryQuotaStore(60) if request.param == "memory" else _sqlite_store()
+
+def test_concurrent_reservations_never_exceed_the_limit(store):
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        tokens = list(pool.map(lambda _: store.reserve("u:reset_password", 3), range(50)))
+    assert sum(token is not None for token in tokens) == 3
+    assert store.count("u:reset_password") == 3
+
+def test_sqlite_reservations_are_shared_between_connections():
+    path = os.path.join(tempfile.mkdtemp(), "quotas.db")
+    first, second = SQLiteQuotaStore(path, 60), SQLiteQuotaStore(path, 60)
+    assert first.reserve("u:r", 2) is not None
+    assert second.reserve("u:r", 2) is not None
+    assert first.reserve("u:r", 2) is None
+
+def test_released_slot_can_be_taken_again(store):
+    token = store.reserve("u:r", 1)
+    assert store.reserve("u:r", 1) is None
+    store.release("u:r", token)
+    assert store.count("u:r") == 0
+    assert store.reserve("u:r", 1) is not None
+
+def test_slots_expire_with_the_window():
+    now = [1000.0]
+    store = MemoryQuotaStore(60, clock=lambda: now[0])
+    assert store.reserve("u:r", 1) is not None
+    now[0] += 61
+    assert store.reserve("u:r", 1) is not None
+
+def _context(user_id: str) -> dict:
+    return {"user": {"id": user_id, "role": "Employee"}, "intent": {"user_id": user_id}}
+
+def _reset_plan(user_id: str, times: int = 1) -> PlanResult:
+    return PlanResult(actions=[PlanAction(runbook_id="reset_password", inputs={"user_id": user_id})] * times)
+
+@pytest.fixture
+def agent():
+    agent = SafetyAgent()
+    agent.quotas = MemoryQuotaStore(60)
+    return agent
+
+def test_evaluate_reserves_and_settle_keeps_only_runs_that_happened(agent):
+    decision = agent.evaluate(_reset_plan("u1"), _context("u1"))
+    assert not decision.block
+    assert agent.quotas.count("u1:reset_password") == 1
+
+    agent.settle(decision, [{"runbook_id": "reset_password", "status": "awaiting_confirmation"}])
+    assert agent.quotas.count("u1:reset_password") == 0
+
+    decision = agent.evaluate(_reset_plan("u1"), _context("u1"))
+    agent.settle(decision, [{"runbook_id": "reset_password", "status": "queued"}])
+    assert agent.quotas.count("u1:reset_password") == 1
+
+def test_concurrent_plans_from_one_user_cannot_overrun_the_daily_limit(agent):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        decisions = list(pool.map(lambda _: agent.evaluate(_reset_plan("u2"), _context("u2")), range(8)))
+    assert sum(not d.block for d in decisions) == 3
+    assert agent.quotas.count("u2:reset_password") == 3
+
+def test_plan_blocked_part_way_gives_back_what_it_reserved(agent):
+    agent.quotas.reserve("u3:reset_password", 3)
+    decision = agent.evaluate(_reset_plan("u3", times=3), _context("u3"))
+    assert decision.block and "Daily limit" in decision.reason
+    assert agent.quotas.count("u3:reset_password") == 1
+
+def test_release_hands_back_every_slot(agent):
+    decision = agent.evaluate(_reset_plan("u4", times=2), _context("u4"))
+    agent.release(decision)
+    assert agent.quotas.count("u4:reset_password") == 0
@@ -0,0 +1,39 @@
+import uuid
+
+import pytest
+
+from backend.services import ticketing_service
+from backend.services.ticket_store import MemoryTicketStore, new_ticket
+
+def _file(user_id: str, message: str) -> dict:
+    return ticketing_service.file_ticket("Escalation", {"message": message}, user_id, "access_request", message)
+
+@pytest.mark.parametrize("first, second", [
+    ("I need access to the finance share", "I need access to the hr share"),
+    ("My laptop screen is broken", "My laptop keyboard is broken"),
+    ("Please reset my VPN token", "Please reset my email password"),
+    ("I need help", "I need help with the printer"),
+])
+def test_different_requests_get_separate_tickets(first, second):
+    user_id = uuid.uuid4().hex
+    assert _file(user_id, first)["follow_up"] is False
+    assert _file(user_id, second)["follow_up"] is False
+
+@pytest.mark.parametrize("first, second", [
+    ("My laptop screen is broken", "my laptop screen is broken!!"),
+    ("My laptop screen is broken", "Laptop screen still broken"),
+    ("I can't log in to my account", "Still can't log into my account"),
+])
+def test_repeats_attach_to_the_open_ticket(first, second):
+    user_id = uuid.uuid4().hex
+    opened = _file(user_id, first)
+    repeat = _file(user_id, second)
+    assert repeat == {"ticket_id": opened["ticket_id"], "follow_up": True}
+
+def test_shared_filler_words_alone_never_match():
+    store = MemoryTicketStore()
+    ticket = new_ticket("Escalation", {}, "u1", intent="it", message="I need to get my thing")
+    store.create(ticket)
+    other = new_ticket("Escalation", {}, "u1", intent="it", message="I need to get my stuff")
+    tokens = frozenset(other["tokens"].split())
+    assert store.find_duplicate("u1", "it", other["fingerprint"], tokens, 0, threshold=0.0, min_overlap=1) is None
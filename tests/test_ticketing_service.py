@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import uuid
+
+from backend.services import ticketing_service
+
+def test_async_escalations_in_one_tick_are_filed_together_off_the_loop(monkeypatch):
+    calls = []
+    file_tickets = ticketing_service._file_tickets
+
+    def recording(items):
+        calls.append((len(items), threading.current_thread()))
+        return file_tickets(items)
+
+    monkeypatch.setattr(ticketing_service, "_file_tickets", recording)
+
+    async def burst():
+        user_id = uuid.uuid4().hex
+        return await asyncio.gather(*(
+            ticketing_service.file_ticket_async("Escalation", {}, user_id, "it", f"printer {i} jammed paper tray")
+            for i in range(5)
+        )), threading.current_thread()
+
+    outcomes, loop_thread = asyncio.run(burst())
+    assert [count for count, _ in calls] == [5]
+    assert calls[0][1] is not loop_thread
+    assert len({outcome["ticket_id"] for outcome in outcomes}) == 5
+    assert all(ticketing_service.get_ticket(outcome["ticket_id"]) for outcome in outcomes)
+
+def test_duplicates_inside_one_burst_collapse_onto_one_ticket():
+    async def burst():
+        user_id = uuid.uuid4().hex
+        return await asyncio.gather(*(
+            ticketing_service.file_ticket_async("Escalation", {}, user_id, "it", "My laptop screen is broken")
+            for _ in range(3)
+        ))
+
+    outcomes = asyncio.run(burst())
+    assert len({outcome["ticket_id"] for outcome in outcomes}) == 1
+    assert [outcome["follow_up"] for outcome in outcomes] == [False, True, True]
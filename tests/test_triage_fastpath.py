@@ -0,0 +1,30 @@
+import pytest
+
+from backend.agents.triage_agent import TriageAgent
+from backend.agents.triage_fastpath import RULE_CONFIDENCE
+from backend.models.intent import IntentResult
+
+@pytest.fixture
+def triage(monkeypatch):
+    agent = TriageAgent()
+    calls = []
+
+    def llm(user_id, message):
+        calls.append(message)
+        return IntentResult(user_id=user_id, raw_message=message, intent="unknown", domain="general",
+                            confidence=0.5, urgency="normal")
+
+    monkeypatch.setattr(agent, "infer_intent_llm", llm)
+    return agent, calls
+
+@pytest.mark.parametrize("message", ["my account", "my password", "password", "account"])
+def test_fragments_fall_through_to_the_llm(triage, message):
+    agent, calls = triage
+    assert agent.infer_intent("u1", message).intent == "unknown"
+    assert calls == [message]
+
+def test_model_scores_stay_below_the_rules(triage):
+    agent, calls = triage
+    intent = agent.infer_intent("u1", "the printer stopped working")
+    assert intent.intent == "device_issue" and intent.confidence < RULE_CONFIDENCE
+    assert calls == []